@@ -22,7 +22,10 @@
 __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
+import atom.http_cache
 import atom.http_core
+import atom.instrumentation
+import atom.rate_limit
 
 
 class Error(Exception):
@@ -38,9 +41,12 @@ class AtomPubClient(object):
   auth_token = None
   ssl = False # Whether to force all requests over https
   xoauth_requestor_id = None
+  response_cache = None
+  rate_limiter = None
 
   def __init__(self, http_client=None, host=None, auth_token=None, source=None,
-               xoauth_requestor_id=None, **kwargs):
+               xoauth_requestor_id=None, response_cache=None,
+               rate_limiter=None, hooks=None, **kwargs):
     """Creates a new AtomPubClient instance.
 
     Args:
@@ -55,6 +61,16 @@ class AtomPubClient(object):
             requested URI.
       auth_token: An object which sets the HTTP Authorization header when its
                   modify_request method is called.
+      response_cache: (optional) An object which stores GET responses by
+                      ETag, such as atom.http_cache.MemoryCache or
+                      atom.http_cache.FileCache. Cached responses are
+                      revalidated with If-None-Match on each request.
+      rate_limiter: (optional) An atom.rate_limit.RateLimiter which paces
+                    the requests. It may be shared by several clients.
+      hooks: (optional) A list of atom.instrumentation.RequestHook objects
+             which observe each request, such as a
+             atom.instrumentation.MetricsCollector. More can be added to
+             the hooks attribute later.
     """
     self.http_client = http_client or atom.http_core.ProxiedHttpClient()
     if host is not None:
@@ -63,6 +79,11 @@ class AtomPubClient(object):
       self.auth_token = auth_token
     self.xoauth_requestor_id = xoauth_requestor_id
     self.source = source
+    if response_cache is not None:
+      self.response_cache = response_cache
+    if rate_limiter is not None:
+      self.rate_limiter = rate_limiter
+    self.hooks = list(hooks or [])
 
   def request(self, method=None, uri=None, auth_token=None,
               http_request=None, **kwargs):
@@ -82,6 +103,60 @@ class AtomPubClient(object):
       The results of calling self.http_client.request. With the default
       http_client, this is an HTTP response object.
     """
+    http_request = self._prepare_request(method, uri, auth_token,
+                                         http_request, **kwargs)
+    # Perform the fully specified request using the http_client instance.
+    # Sends the request to the server and returns the server's response.
+    auth_token = auth_token or self.auth_token
+    if self.rate_limiter is not None:
+      self.rate_limiter.acquire(http_request, auth_token)
+    event = self._start_event(http_request)
+    try:
+      if self.response_cache is not None and http_request.method == 'GET':
+        response = atom.http_cache.cached_request(
+            self.response_cache, self.http_client, http_request, auth_token)
+      else:
+        response = self.http_client.request(http_request)
+    except Exception, error:
+      if event is not None:
+        event.failed(error)
+      raise
+    if self.rate_limiter is not None and response is not None:
+      self.rate_limiter.record(http_request, auth_token, response)
+    if event is not None and response is not None:
+      event.headers_received(response.status)
+      response = atom.instrumentation.InstrumentedResponse(response, event)
+    return response
+
+  Request = request
+
+  def _start_event(self, http_request):
+    """Creates the RequestEvent for the hooks of this client and its
+    http_client, or returns None if there are none.
+
+    The event is attached to the request so that the http_client can add
+    the connection timings instead of firing events of its own.
+    """
+    hooks = list(self.hooks)
+    for hook in getattr(self.http_client, 'hooks', None) or ():
+      if hook not in hooks:
+        hooks.append(hook)
+    if not hooks:
+      http_request.event = None
+      return None
+    http_request.event = atom.instrumentation.RequestEvent(http_request, hooks)
+    http_request.event.start()
+    return http_request.event
+
+  def _prepare_request(self, method=None, uri=None, auth_token=None,
+                       http_request=None, **kwargs):
+    """Builds the complete HTTP request which request sends.
+
+    See request for a description of the arguments.
+
+    Returns:
+      The atom.http_core.HttpRequest, including the Authorization header.
+    """
     # Modify the request based on the AtomPubClient settings and parameters
     # passed in to the request.
     http_request = self.modify_request(http_request)
@@ -117,11 +192,7 @@ class AtomPubClient(object):
     if http_request.uri.host is None:
       raise MissingHost('No host provided in request %s %s' % (
           http_request.method, str(http_request.uri)))
-    # Perform the fully specified request using the http_client instance.
-    # Sends the request to the server and returns the server's response.
-    return self.http_client.request(http_request)
-
-  Request = request
+    return http_request
 
   def get(self, uri=None, auth_token=None, http_request=None, **kwargs):
     """Performs a request using the GET method, returns an HTTP response."""
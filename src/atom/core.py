@@ -22,6 +22,7 @@ __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
 import inspect
+import itertools
 try:
   from xml.etree import cElementTree as ElementTree
 except ImportError:
@@ -40,39 +41,113 @@ except ImportError:
     xmlString = None
 
 STRING_ENCODING = 'utf-8'
+# iter_string yields the XML in pieces of at least this many bytes.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class Error(Exception):
+  pass
+
+
+class UnexpectedRootElement(Error):
+  pass
+
+
+class UnknownMember(Error):
+  pass
+
+
+class _MemberDefault(object):
+  """The class level default for an XML member of an XmlElement class.
+
+  Instances only store the members which have been set. Reading a member
+  which has not been set gives None, or for repeating members a new empty
+  list which is stored in the instance so that it can be appended to.
+  Reading the member from the class gives the member's definition (for
+  example the XmlElement class of the child element).
+  """
+  __slots__ = ('name', 'definition', 'repeating')
+
+  def __init__(self, name, definition):
+    self.name = name
+    self.definition = definition
+    self.repeating = isinstance(definition, list)
+
+  def __get__(self, instance, owner):
+    if instance is None:
+      return self.definition
+    if self.repeating:
+      value = instance.__dict__[self.name] = []
+      return value
+    return None
+
+
+class _ContainerDefault(object):
+  """Creates the _other_elements or _other_attributes when first used."""
+  __slots__ = ('name', 'factory')
+
+  def __init__(self, name, factory):
+    self.name = name
+    self.factory = factory
+
+  def __get__(self, instance, owner):
+    if instance is None:
+      return None
+    value = instance.__dict__[self.name] = self.factory()
+    return value
+
+
+def _get_members(cls):
+  """Returns the XML members of cls, installing their class level defaults.
+
+  Returns:
+    A tuple of (member_name, definition) pairs.
+  """
+  members = cls.__dict__.get('_members')
+  if members is None:
+    members = tuple(cls._list_xml_members())
+    for member_name, definition in members:
+      if not isinstance(cls.__dict__.get(member_name), _MemberDefault):
+        setattr(cls, member_name, _MemberDefault(member_name, definition))
+    cls._members = members
+    cls._member_names = frozenset([pair[0] for pair in members])
+  return members
 
 
 class XmlElement(object):
   """Represents an element node in an XML document.
 
   The text member is a UTF-8 encoded str or unicode.
+
+  Members which have not been set are not stored in the instance, their
+  defaults come from the class (see _MemberDefault).
   """
   _qname = None
-  _other_elements = None
-  _other_attributes = None
+  _other_elements = _ContainerDefault('_other_elements', list)
+  _other_attributes = _ContainerDefault('_other_attributes', dict)
   # The rule set contains mappings for XML qnames to child members and the
   # appropriate member classes.
   _rule_set = None
   _members = None
+  _member_names = None
   text = None
 
   def __init__(self, text=None, *args, **kwargs):
-    if ('_members' not in self.__class__.__dict__
-        or self.__class__._members is None):
-      self.__class__._members = tuple(self.__class__._list_xml_members())
-    for member_name, member_type in self.__class__._members:
-      if member_name in kwargs:
-        setattr(self, member_name, kwargs[member_name])
-      else:
-        if isinstance(member_type, list):
-          setattr(self, member_name, [])
-        else:
-          setattr(self, member_name, None)
-    self._other_elements = []
-    self._other_attributes = {}
+    _get_members(self.__class__)
+    if kwargs:
+      member_names = self.__class__._member_names
+      for member_name, value in kwargs.iteritems():
+        if member_name in member_names:
+          setattr(self, member_name, value)
     if text is not None:
       self.text = text
 
+  def __setstate__(self, state):
+    # Unpickled instances are not created by __init__, so make sure the
+    # class defaults are in place.
+    _get_members(self.__class__)
+    self.__dict__.update(state)
+
   def _list_xml_members(cls):
     """Generator listing all members which are XML elements or attributes.
 
@@ -160,9 +235,7 @@ class XmlElement(object):
       # when given an XML attribute's qname.
       elements = {}
       attributes = {}
-      if ('_members' not in cls.__dict__ or cls._members is None):
-        cls._members = tuple(cls._list_xml_members())
-      for member_name, target in cls._members:
+      for member_name, target in _get_members(cls):
         if isinstance(target, list):
           # This member points to a repeating element.
           elements[_get_qname(target[0], version)] = (member_name, target[0],
@@ -271,31 +344,53 @@ class XmlElement(object):
 
   def _harvest_tree(self, tree, version=1):
     """Populates object members from the data in the tree Element."""
-    qname, elements, attributes = self.__class__._get_rules(version)
+    plan = _get_parse_plan(self.__class__, version)
+    handlers = plan.handlers
     for element in tree:
-      if elements and element.tag in elements:
-        definition = elements[element.tag]
-        # If this is a repeating element, make sure the member is set to a
-        # list.
-        if definition[2]:
-          if getattr(self, definition[0]) is None:
-            setattr(self, definition[0], [])
-          getattr(self, definition[0]).append(_xml_element_from_tree(element,
-              definition[1], version))
-        else:
-          setattr(self, definition[0], _xml_element_from_tree(element,
-              definition[1], version))
-      else:
-        self._other_elements.append(_xml_element_from_tree(element, XmlElement,
-                                                           version))
-    for attrib, value in tree.attrib.iteritems():
-      if attributes and attrib in attributes:
-        setattr(self, attributes[attrib], value)
+      handler = handlers.get(element.tag)
+      if handler is None:
+        self._other_elements.append(_other_element_from_tree(element,
+                                                             version))
       else:
-        self._other_attributes[attrib] = value
+        handler(self, element)
+    if tree.attrib:
+      # Attribute members are plain instance attributes, so they can be
+      # stored directly in the instance __dict__.
+      attributes = plan.attributes
+      values = self.__dict__
+      for attrib, value in tree.attrib.iteritems():
+        member_name = attributes.get(attrib)
+        if member_name is None:
+          self._other_attributes[attrib] = value
+        else:
+          values[member_name] = value
     if tree.text:
       self.text = tree.text
 
+  def _harvest_element(self, element, version=1):
+    """Converts a single child Element and stores it in the matching member.
+
+    Args:
+      element: ElementTree.Element The child element to be converted.
+      version: int
+    """
+    handler = _get_parse_plan(self.__class__, version).handlers.get(
+        element.tag)
+    if handler is None:
+      self._other_elements.append(_other_element_from_tree(element, version))
+    else:
+      handler(self, element)
+
+  def _harvest_attributes(self, tree, version=1):
+    """Copies the XML attributes of the tree Element into object members."""
+    attributes = _get_parse_plan(self.__class__, version).attributes
+    for attrib, value in tree.attrib.iteritems():
+      member_name = attributes.get(attrib)
+      if member_name is None:
+        self._other_attributes[attrib] = value
+      else:
+        setattr(self, member_name, value)
+
   def _to_tree(self, version=1, encoding=None):
     new_tree = ElementTree.Element(_get_qname(self, version))
     self._attach_members(new_tree, version, encoding)
@@ -314,27 +409,28 @@ class XmlElement(object):
       version: int Ingnored in this method but used by VersionedElement.
       encoding: str (optional)
     """
-    qname, elements, attributes = self.__class__._get_rules(version)
+    plan = _get_parse_plan(self.__class__, version)
     encoding = encoding or STRING_ENCODING
+    # Members which were never set are not in the instance dict, reading
+    # them from there avoids creating empty lists.
+    values = self.__dict__
     # Add the expected elements and attributes to the tree.
-    if elements:
-      for tag, element_def in elements.iteritems():
-        member = getattr(self, element_def[0])
-        # If this is a repeating element and there are members in the list.
-        if member and element_def[2]:
-          for instance in member:
-            instance._become_child(tree, version)
-        elif member:
-          member._become_child(tree, version)
-    if attributes:
-      for attribute_tag, member_name in attributes.iteritems():
-        value = getattr(self, member_name)
-        if value:
-          tree.attrib[attribute_tag] = value
+    for member_name, repeating in plan.element_members:
+      member = values.get(member_name)
+      # If this is a repeating element and there are members in the list.
+      if member and repeating:
+        for instance in member:
+          instance._become_child(tree, version)
+      elif member:
+        member._become_child(tree, version)
+    for attribute_tag, member_name in plan.attribute_members:
+      value = values.get(member_name)
+      if value:
+        tree.attrib[attribute_tag] = value
     # Add the unexpected (other) elements and attributes to the tree.
-    for element in self._other_elements:
+    for element in values.get('_other_elements') or ():
       element._become_child(tree, version)
-    for key, value in self._other_attributes.iteritems():
+    for key, value in (values.get('_other_attributes') or {}).iteritems():
       # I'm not sure if unicode can be used in the attribute name, so for now
       # we assume the encoding is correct for the attribute name.
       if not isinstance(value, unicode):
@@ -358,6 +454,29 @@ class XmlElement(object):
  
   ToString = to_string
 
+  def iter_string(self, version=1, encoding=None,
+                  chunk_size=STREAM_CHUNK_SIZE):
+    """Converts this object to XML a piece at a time.
+
+    Unlike to_string, no ElementTree is built for the whole document. The
+    XML is written directly from the members, one child of this element at
+    a time, so only about one entry of a large feed is held in memory while
+    it is being sent.
+
+    Args:
+      version: int (optional) The version of the XML rules to use.
+      encoding: str (optional) The character encoding of str values in the
+                object. Default is 'UTF-8'.
+      chunk_size: int (optional) The XML is yielded once at least this many
+                  bytes are ready.
+
+    Returns:
+      An iterator of UTF-8 encoded strs which together form the XML.
+    """
+    return _iter_xml(self, version, encoding or STRING_ENCODING, chunk_size)
+
+  IterString = iter_string
+
   def __str__(self):
     return self.to_string()
 
@@ -498,7 +617,8 @@ def _qname_matches(tag, namespace, qname):
           and member_namespace is None))
 
 
-def parse(xml_string, target_class=None, version=1, encoding=None):
+def parse(xml_string, target_class=None, version=1, encoding=None,
+          lazy=False, projection=None):
   """Parses the XML string according to the rules for the target_class.
 
   Args:
@@ -509,6 +629,20 @@ def parse(xml_string, target_class=None, version=1, encoding=None):
         converting the XML into an object. The default is 1.
     encoding: str (optional) The character encoding of the bytes in the
         xml_string. Default is 'UTF-8'.
+    lazy: boolean (optional) If True, the entries of a feed are not
+        converted up front. Each entry keeps its XML element and converts a
+        member's child elements when that member is first used, and entries
+        which are never used are serialized from their original XML. The
+        entries are instances of a subclass of the entry class until all of
+        their members have been converted. The default is False.
+    projection: list of str (optional) The member paths to convert, such
+        as ['entry.id', 'entry.title', 'entry.link']. Child elements which
+        are not on one of the paths are skipped, and a path which ends at
+        an element member converts the element completely. XML attributes
+        (such as the etag) and text are always kept. The rules for each
+        projection are compiled once per class and version. Raises
+        UnknownMember if a path names a member the class does not have.
+        If given, lazy is ignored.
   """
   if target_class is None:
     target_class = XmlElement
@@ -518,6 +652,12 @@ def parse(xml_string, target_class=None, version=1, encoding=None):
     else:
       xml_string = xml_string.encode(encoding)
   tree = ElementTree.fromstring(xml_string)
+  if projection is not None:
+    return _xml_element_from_tree(
+        tree, target_class, version,
+        projection=_get_projection(target_class, version, projection))
+  if lazy:
+    return _xml_element_from_tree(tree, target_class, version, LAZY_MEMBER)
   return _xml_element_from_tree(tree, target_class, version)
 
 
@@ -526,20 +666,805 @@ xml_element_from_string = parse
 XmlElementFromString = xml_element_from_string
 
 
-def _xml_element_from_tree(tree, target_class, version=1):
+def _xml_element_from_tree(tree, target_class, version=1, lazy_member=None,
+                           projection=None):
+  plan = _get_parse_plan(target_class, version)
   if target_class._qname is None:
-    instance = target_class()
+    instance = plan.new_instance()
     instance._qname = tree.tag
-    instance._harvest_tree(tree, version)
-    return instance
   # TODO handle the namespace-only case
   # Namespace only will be used with Google Spreadsheets rows and
   # Google Base item attributes.
-  elif tree.tag == _get_qname(target_class, version):
-    instance = target_class()
+  elif tree.tag == plan.qname:
+    instance = plan.new_instance()
+  else:
+    return None
+  if projection is not None:
+    projection.harvest(instance, tree)
+  elif lazy_member is None:
     instance._harvest_tree(tree, version)
+  else:
+    _harvest_lazily(instance, tree, version, lazy_member)
+  return instance
+
+
+def _other_element_from_tree(tree, version=1):
+  """Converts an element which has no member into a generic XmlElement."""
+  instance = _get_parse_plan(XmlElement, version).new_instance()
+  instance._qname = tree.tag
+  instance._harvest_tree(tree, version)
+  return instance
+
+
+# Compiled projections, keyed by (class, version, frozenset of paths).
+_projections = {}
+
+
+def _get_projection(cls, version, paths):
+  """Returns the _Projection of cls for the member paths."""
+  key = (cls, version, frozenset(paths))
+  try:
+    return _projections[key]
+  except KeyError:
+    projection = _Projection(cls, version, key[2])
+    _projections[key] = projection
+    return projection
+
+
+class _Projection(object):
+  """The members of one class which are converted by a projected parse.
+
+  Members:
+    handlers: dict Maps the qname of each child element to convert to a
+        function which converts it and stores it in the member.
+    children: dict Maps the same qnames to the _Projection for the child
+        element, or None if the child is converted completely.
+  """
+
+  def __init__(self, cls, version, paths):
+    plan = _get_parse_plan(cls, version)
+    ignored, elements, attributes = cls._get_rules(version)
+    attribute_members = set((attributes or {}).values())
+    # Maps member names to the paths below them, an empty set means the
+    # whole member.
+    subpaths = {}
+    complete = set()
+    for path in paths:
+      member_name, ignored, rest = path.partition('.')
+      subpaths.setdefault(member_name, set())
+      if rest:
+        subpaths[member_name].add(rest)
+      else:
+        complete.add(member_name)
+    self.plan = plan
+    self.handlers = {}
+    self.children = {}
+    for member_name, rest in subpaths.iteritems():
+      tags = [tag for tag, name in plan.member_tags.iteritems()
+              if name == member_name]
+      if member_name in attribute_members and not rest:
+        # Attributes are always kept.
+        continue
+      if not tags:
+        raise UnknownMember('%s has no element member %s' % (cls.__name__,
+                                                             member_name))
+      for tag in tags:
+        ignored, member_class, repeating = elements[tag]
+        if member_name in complete:
+          self.handlers[tag] = plan.handlers[tag]
+          self.children[tag] = None
+        else:
+          child = _get_projection(member_class, version, rest)
+          self.handlers[tag] = _make_projected_handler(member_name, child,
+                                                       repeating)
+          self.children[tag] = child
+
+  def harvest(self, instance, tree):
+    """Populates instance with the projected members found in tree."""
+    handlers = self.handlers
+    for element in tree:
+      handler = handlers.get(element.tag)
+      if handler is not None:
+        handler(instance, element)
+    if tree.attrib:
+      attributes = self.plan.attributes
+      values = instance.__dict__
+      for attrib, value in tree.attrib.iteritems():
+        member_name = attributes.get(attrib)
+        if member_name is None:
+          instance._other_attributes[attrib] = value
+        else:
+          values[member_name] = value
+    if tree.text:
+      instance.text = tree.text
+
+
+# Marks the elements which a projected iterparse discards.
+_SKIP = object()
+
+
+def _child_projection(projection, tag):
+  """Returns the projection of a child element of an element in a feed.
+
+  Args:
+    projection: The parent's projection, a _Projection, None if the parent
+        is converted completely or _SKIP if it is discarded.
+    tag: str The qname of the child element.
+  """
+  if projection is None or projection is _SKIP:
+    return projection
+  return projection.children.get(tag, _SKIP)
+
+
+def _make_projected_handler(member_name, projection, repeating):
+  """Creates a handler which converts only the projected part of a child."""
+  def new_child(element):
+    child = projection.plan.new_instance()
+    projection.harvest(child, element)
+    return child
+
+  if repeating:
+    def handler(instance, element):
+      members = instance.__dict__.get(member_name)
+      if members is None:
+        members = instance.__dict__[member_name] = []
+      members.append(new_child(element))
+  else:
+    def handler(instance, element):
+      instance.__dict__[member_name] = new_child(element)
+  return handler
+
+
+# The member of the root element which parse(lazy=True) converts lazily.
+LAZY_MEMBER = 'entry'
+
+
+def _harvest_lazily(instance, tree, version, member_name):
+  """Populates instance from tree, with lazy objects for member_name."""
+  plan = _get_parse_plan(instance.__class__, version)
+  lazy_tags = [tag for tag, name in plan.member_tags.iteritems()
+               if name == member_name]
+  if not lazy_tags:
+    instance._harvest_tree(tree, version)
+    return
+  ignored1, elements, ignored2 = instance.__class__._get_rules(version)
+  member_class = elements[lazy_tags[0]][1]
+  repeating = elements[lazy_tags[0]][2]
+  for element in tree:
+    if element.tag in lazy_tags:
+      child = _LazyElement.create(member_class, element, version)
+      if repeating:
+        members = instance.__dict__.get(member_name)
+        if members is None:
+          members = instance.__dict__[member_name] = []
+        members.append(child)
+      else:
+        instance.__dict__[member_name] = child
+    else:
+      instance._harvest_element(element, version)
+  instance._harvest_attributes(tree, version)
+  if tree.text:
+    instance.text = tree.text
+
+
+class _LazyElement(object):
+  """Mixin for XmlElements whose child elements are converted on demand.
+
+  A lazy element is created with its XML attributes and text, and with the
+  child elements grouped by the member which stores them. The first time a
+  member is read, its child elements are converted. Once every member has
+  been converted (or replaced), the instance's class is set back to the
+  plain XmlElement class, so that it has no further overhead.
+
+  As long as no member has been read or set, the original XML element is
+  used when the element is converted back to XML.
+  """
+
+  def create(cls, member_class, tree, version):
+    """Returns a lazy instance of member_class for the tree Element."""
+    instance = _get_parse_plan(member_class, version).new_instance()
+    if member_class._qname is None:
+      instance._qname = tree.tag
+    instance._harvest_attributes(tree, version)
+    if tree.text:
+      instance.text = tree.text
+    member_tags = _get_parse_plan(member_class, version).member_tags
+    pending = {}
+    for element in tree:
+      # Children without a member are kept in _other_elements.
+      member_name = member_tags.get(element.tag, '_other_elements')
+      children = pending.get(member_name)
+      if children is None:
+        pending[member_name] = [element]
+      else:
+        children.append(element)
+    if not pending:
+      return instance
+    # The tree is now owned by the instance, drop the whitespace which
+    # followed it in the parent.
+    tree.tail = None
+    values = instance.__dict__
+    values['_lazy_pending'] = pending
+    values['_lazy_tree'] = tree
+    values['_lazy_version'] = version
+    instance.__class__ = _get_lazy_class(member_class)
     return instance
-  return None
+
+  create = classmethod(create)
+
+  def __getattribute__(self, name):
+    values = object.__getattribute__(self, '__dict__')
+    pending = values.get('_lazy_pending')
+    if pending is not None:
+      if name in pending:
+        values['_lazy_tree'] = None
+        _materialize(self, values, name)
+      elif (values['_lazy_tree'] is not None and name in _get_parse_plan(
+          type(self), values['_lazy_version']).child_members):
+        # The value (such as a new empty list for a repeating member with
+        # no elements) could be changed by the caller, so the original XML
+        # can no longer be used.
+        values['_lazy_tree'] = None
+    return object.__getattribute__(self, name)
+
+  def __setattr__(self, name, value):
+    values = object.__getattribute__(self, '__dict__')
+    values[name] = value
+    pending = values.get('_lazy_pending')
+    if pending is not None:
+      values['_lazy_tree'] = None
+      if name in pending:
+        # The new value replaces the unconverted child elements.
+        del pending[name]
+        if not pending:
+          _finish_lazy(self, values)
+
+  def _to_tree(self, version=1, encoding=None):
+    values = object.__getattribute__(self, '__dict__')
+    tree = values.get('_lazy_tree')
+    if tree is not None and values['_lazy_version'] == version:
+      return tree
+    return XmlElement._to_tree(self, version, encoding)
+
+  def _become_child(self, tree, version=1):
+    values = object.__getattribute__(self, '__dict__')
+    own_tree = values.get('_lazy_tree')
+    if own_tree is not None and values['_lazy_version'] == version:
+      tree.append(own_tree)
+    else:
+      XmlElement._become_child(self, tree, version)
+
+  def _attach_members(self, tree, version=1, encoding=None):
+    # Members are read from the instance dict, so convert them all first.
+    _materialize_all(self)
+    XmlElement._attach_members(self, tree, version, encoding)
+
+  def __reduce_ex__(self, protocol):
+    # The lazy class is created at runtime and can't be pickled or copied,
+    # so convert everything and use the plain class.
+    _materialize_all(self)
+    return object.__getattribute__(self, '__reduce_ex__')(protocol)
+
+
+def _materialize_all(instance):
+  values = object.__getattribute__(instance, '__dict__')
+  while values.get('_lazy_pending'):
+    _materialize(instance, values, values['_lazy_pending'].keys()[0])
+
+
+def _materialize(instance, values, member_name):
+  """Converts the pending child elements for one member of a lazy element."""
+  pending = values['_lazy_pending']
+  elements = pending.pop(member_name)
+  version = values['_lazy_version']
+  if member_name == '_other_elements':
+    others = values.setdefault('_other_elements', [])
+    for element in elements:
+      others.append(_other_element_from_tree(element, version))
+  else:
+    handlers = _get_parse_plan(instance.__class__, version).handlers
+    for element in elements:
+      handlers[element.tag](instance, element)
+  if not pending:
+    _finish_lazy(instance, values)
+
+
+def _finish_lazy(instance, values):
+  """Turns a lazy element with no pending members into a plain instance."""
+  del values['_lazy_pending']
+  del values['_lazy_tree']
+  del values['_lazy_version']
+  object.__setattr__(instance, '__class__', type(instance)._lazy_base)
+
+
+# Maps XmlElement classes to their lazy subclasses.
+_lazy_classes = {}
+
+
+def _get_lazy_class(cls):
+  lazy_class = _lazy_classes.get(cls)
+  if lazy_class is None:
+    lazy_class = type(cls.__name__, (_LazyElement, cls),
+                      {'__module__': cls.__module__, '_lazy_base': cls})
+    _lazy_classes[cls] = lazy_class
+  return lazy_class
+
+
+# Compiled parse plans, keyed by (class, version).
+_parse_plans = {}
+
+
+def _get_parse_plan(cls, version):
+  """Returns the _ParsePlan for the class, compiling it on first use."""
+  try:
+    return _parse_plans[(cls, version)]
+  except KeyError:
+    # Lazy subclasses share the plan of the class they wrap.
+    base = cls.__dict__.get('_lazy_base')
+    if base is not None:
+      plan = _get_parse_plan(base, version)
+    else:
+      plan = _ParsePlan(cls, version)
+    _parse_plans[(cls, version)] = plan
+    return plan
+
+
+class _ParsePlan(object):
+  """The XML rules for one XmlElement class and version, ready for use.
+
+  The rules returned by _get_rules describe members with tuples which must
+  be interpreted each time an element is parsed or serialized. A parse
+  plan is compiled once from those rules so that _harvest_tree and
+  _attach_members only need a single dictionary lookup for each child
+  element or attribute.
+
+  Members:
+    qname: str The qname of the element for this version.
+    handlers: dict Maps the qname of each expected child element to a
+        function which takes the parent instance and the child's
+        ElementTree.Element, converts the child and stores it in the member.
+    attributes: dict Maps XML attribute qnames to member names.
+    member_tags: dict Maps the qname of each expected child element to the
+        name of the member which stores it.
+    element_members: tuple of (member_name, repeating) pairs used when
+        converting an instance back to XML.
+    attribute_members: tuple of (attribute_qname, member_name) pairs.
+    child_members: frozenset The names of the members which hold child
+        elements or attributes (including _other_elements and
+        _other_attributes), whose values could be changed in place.
+  """
+
+  def __init__(self, cls, version):
+    qname, elements, attributes = cls._get_rules(version)
+    self.qname = _get_qname(cls, version)
+    self.handlers = {}
+    self.member_tags = {}
+    element_members = []
+    if elements:
+      for tag, (member_name, member_class, repeating) in elements.iteritems():
+        self.handlers[tag] = _make_member_handler(member_name, member_class,
+                                                  repeating, version)
+        self.member_tags[tag] = member_name
+        element_members.append((member_name, repeating))
+    self.element_members = tuple(element_members)
+    self.attributes = dict(attributes or {})
+    self.attribute_members = tuple(self.attributes.iteritems())
+    self.child_members = frozenset(
+        [name for name, repeating in element_members]
+        + ['_other_elements', '_other_attributes'])
+    self.new_instance = _make_factory(cls)
+
+
+def _make_member_handler(member_name, member_class, repeating, version):
+  """Creates a function which converts a child element into a member.
+
+  Members are plain instance attributes (never descriptors), so the
+  handlers store values directly in the instance __dict__.
+  """
+  # The child's plan is looked up on first use, since classes may refer to
+  # each other (for example a feedLink which contains a feed).
+  child_plan = []
+
+  def new_child(element):
+    if not child_plan:
+      child_plan.append(_get_parse_plan(member_class, version))
+    child = child_plan[0].new_instance()
+    child._harvest_tree(element, version)
+    return child
+
+  if repeating:
+    def handler(instance, element):
+      members = instance.__dict__.get(member_name)
+      # If this is a repeating element, make sure the member is set to a
+      # list.
+      if members is None:
+        members = instance.__dict__[member_name] = []
+      members.append(new_child(element))
+  else:
+    def handler(instance, element):
+      instance.__dict__[member_name] = new_child(element)
+  return handler
+
+
+def _make_factory(cls):
+  """Creates a function which returns a new, empty instance of cls.
+
+  Classes which do not override XmlElement.__init__ are created without
+  calling the constructor, since the member defaults are provided by the
+  class. Classes with their own constructor are called as usual.
+  """
+  if getattr(cls.__init__, 'im_func', None) is not XmlElement.__init__.im_func:
+    return cls
+  _get_members(cls)
+  new = object.__new__
+
+  def factory():
+    return new(cls)
+  return factory
+
+
+def iterparse(source, target_class=None, version=1, member_name='entry',
+              projection=None):
+  """Incrementally parses a feed, yielding each entry as soon as it is read.
+
+  Unlike parse, which requires the whole document as a string and builds
+  the complete object graph, iterparse reads from a file-like object (such
+  as an atom.http_core.HttpResponse) and converts one child element of the
+  root at a time. Each repeating member_name element (the entries) is
+  yielded as soon as its end tag has been read and is then discarded, so
+  only one entry needs to be held in memory at a time. All other children
+  of the root (links, id, openSearch:totalResults, etc.) are stored in the
+  feed member of the returned iterator.
+
+  Args:
+    source: A file-like object with a read method, or a file name.
+    target_class: XmlElement or a subclass describing the root element,
+        for example atom.data.Feed or gdata.data.GDFeed. If None is
+        specified, the XmlElement class is used and every child of the root
+        is treated as an entry.
+    version: int (optional) The version of the schema which should be used
+        when converting the XML into objects. The default is 1.
+    member_name: str (optional) The name of the repeating member in the
+        target_class whose elements should be yielded instead of stored.
+        The default is 'entry'.
+    projection: list of str (optional) The member paths to convert, as for
+        parse. Elements which are not on one of the paths are discarded as
+        soon as they have been read, without being converted. If the
+        projection does not include the member_name, no entries are
+        yielded.
+
+  Returns:
+    A FeedIterator which yields the converted entries.
+  """
+  return FeedIterator(source, target_class, version, member_name, projection)
+
+
+IterParse = iterparse
+
+
+class FeedIterator(object):
+  """Iterates over the entries in an XML feed which is parsed incrementally.
+
+  The feed member is an instance of the target class which holds every
+  member of the root element except for the yielded entries. Members which
+  appear before an entry in the document are available as soon as that
+  entry has been yielded. The feed is complete once iteration has finished.
+  """
+
+  def __init__(self, source, target_class=None, version=1,
+               member_name='entry', projection=None):
+    if target_class is None:
+      target_class = XmlElement
+    self.source = source
+    self.target_class = target_class
+    self.version = version
+    self.member_name = member_name
+    self.projection = None
+    if projection is not None:
+      self.projection = _get_projection(target_class, version, projection)
+    self.feed = None
+    self._started = False
+
+  def __iter__(self):
+    if self._started:
+      raise ValueError('The feed can only be iterated over once.')
+    self._started = True
+    return self._generate_entries()
+
+  def _generate_entries(self):
+    ignored1, elements, ignored2 = self.target_class._get_rules(self.version)
+    # Find the qname and class of the entries to be yielded. If the target
+    # class has no rule for the requested member, every child is yielded.
+    entry_qname = None
+    entry_class = XmlElement
+    if elements:
+      for tag, definition in elements.iteritems():
+        if definition[0] == self.member_name:
+          entry_qname = tag
+          entry_class = definition[1]
+          break
+    root = None
+    depth = 0
+    # The projection of each open element: a _Projection, None if the
+    # element is converted completely or _SKIP if it is discarded.
+    projections = []
+    # The open elements, so that discarded subtrees can be detached from
+    # their parents.
+    open_elements = []
+    for event, element in ElementTree.iterparse(self.source,
+                                                 ('start', 'end')):
+      if event == 'start':
+        depth += 1
+        if self.projection is not None:
+          if depth == 1:
+            projections.append(self.projection)
+          else:
+            projections.append(_child_projection(projections[-1],
+                                                 element.tag))
+          open_elements.append(element)
+        if depth == 1:
+          root = element
+          if (self.target_class._qname is not None
+              and root.tag != _get_qname(self.target_class, self.version)):
+            raise UnexpectedRootElement(
+                'Expected a %s root element but found %s' % (
+                    _get_qname(self.target_class, self.version), root.tag))
+          self.feed = self.target_class()
+          if self.target_class._qname is None:
+            self.feed._qname = root.tag
+          self.feed._harvest_attributes(root, self.version)
+        continue
+      depth -= 1
+      projection = None
+      if self.projection is not None:
+        projection = projections.pop()
+        open_elements.pop()
+        if projection is _SKIP and depth > 1:
+          element.clear()
+          if projections[-1] is not _SKIP:
+            open_elements[-1].remove(element)
+          continue
+      if depth == 0:
+        if root.text:
+          self.feed.text = root.text
+      elif depth == 1:
+        if projection is _SKIP:
+          entry = None
+        elif entry_qname is None or element.tag == entry_qname:
+          entry = _xml_element_from_tree(element, entry_class, self.version,
+                                         projection=projection)
+        elif self.projection is not None:
+          entry = None
+          self.projection.handlers[element.tag](self.feed, element)
+        else:
+          entry = None
+          self.feed._harvest_element(element, self.version)
+        # Free the subtree which has just been converted before handing the
+        # entry to the caller.
+        element.clear()
+        root.remove(element)
+        if entry is not None:
+          yield entry
+
+
+class XmlStream(object):
+  """A request body which serializes an XmlElement as it is sent.
+
+  Can be added to an atom.http_core.HttpRequest with add_body_part, which
+  sends it with chunked transfer encoding. Each iteration serializes the
+  element again, so the request can be retried.
+  """
+
+  def __init__(self, element, version=1, chunk_size=STREAM_CHUNK_SIZE):
+    self.element = element
+    self.version = version
+    self.chunk_size = chunk_size
+
+  def __iter__(self):
+    return self.element.iter_string(self.version, chunk_size=self.chunk_size)
+
+
+XML_NAMESPACE = 'http://www.w3.org/XML/1998/namespace'
+
+
+def _iter_xml(element, version, encoding, chunk_size):
+  """Generates the XML for an element, see XmlElement.iter_string."""
+  writer = _XmlWriter(version, encoding)
+  _materialize_all(element)
+  namespaces = {XML_NAMESPACE: 'xml'}
+  declarations = []
+  for namespace in _class_namespaces(element.__class__, version):
+    namespaces[namespace] = writer.new_prefix()
+    declarations.append((namespaces[namespace], namespace))
+  writer.root_namespaces = namespaces
+  tag, children, namespaces = writer.open(element, namespaces, declarations)
+  if tag is None:
+    yield writer.flush()
+    return
+  for child in children:
+    writer.write(child, namespaces)
+    if writer.get_size() >= chunk_size:
+      yield writer.flush()
+  writer.close(tag)
+  yield writer.flush()
+
+
+class _XmlWriter(object):
+  """Writes XmlElements as XML into a buffer of unicode pieces."""
+
+  def __init__(self, version, encoding):
+    self.version = version
+    self.encoding = encoding
+    self.pieces = []
+    self._prefixes = 0
+    # The total length of the first _counted pieces.
+    self._size = 0
+    self._counted = 0
+    # Prefixed names of qnames in the root namespace scope, which is the
+    # scope of almost every element.
+    self.root_namespaces = None
+    self._root_names = {}
+
+  def new_prefix(self):
+    prefix = 'ns%i' % self._prefixes
+    self._prefixes += 1
+    return prefix
+
+  def get_size(self):
+    """Returns the number of characters written since the last flush."""
+    pieces = self.pieces
+    self._size += sum(map(len, itertools.islice(pieces, self._counted, None)))
+    self._counted = len(pieces)
+    return self._size
+
+  def flush(self):
+    data = u''.join(self.pieces).encode('utf-8')
+    self.pieces = []
+    self._size = 0
+    self._counted = 0
+    return data
+
+  def _text(self, value):
+    if isinstance(value, str):
+      return value.decode(self.encoding)
+    return unicode(value)
+
+  def _name(self, qname, namespaces, declarations):
+    """Returns the prefixed name for a qname, declaring its namespace."""
+    if namespaces is self.root_namespaces:
+      name = self._root_names.get(qname)
+      if name is not None:
+        return name, namespaces
+    if not qname.startswith('{'):
+      return qname, namespaces
+    namespace, local_name = qname[1:].split('}', 1)
+    prefix = namespaces.get(namespace)
+    if prefix is None:
+      prefix = self.new_prefix()
+      namespaces = namespaces.copy()
+      namespaces[namespace] = prefix
+      declarations.append((prefix, namespace))
+    elif namespaces is self.root_namespaces:
+      self._root_names[qname] = '%s:%s' % (prefix, local_name)
+    return '%s:%s' % (prefix, local_name), namespaces
+
+  def open(self, element, namespaces, declarations=None):
+    """Writes the start tag and text of element.
+
+    Returns:
+      A tuple of the tag name (None if the element was written completely),
+      the child elements to write, and the namespaces in scope.
+    """
+    declarations = declarations or []
+    values = element.__dict__
+    plan = _get_parse_plan(element.__class__, self.version)
+    children = []
+    for member_name, repeating in plan.element_members:
+      member = values.get(member_name)
+      if member and repeating:
+        children.extend(member)
+      elif member:
+        children.append(member)
+    children.extend(values.get('_other_elements') or ())
+    attributes = []
+    for attribute_tag, member_name in plan.attribute_members:
+      value = values.get(member_name)
+      if value:
+        attributes.append((attribute_tag, value))
+    attributes.extend((values.get('_other_attributes') or {}).iteritems())
+    tag, namespaces = self._name(_get_qname(element, self.version),
+                                 namespaces, declarations)
+    pieces = ['<', tag]
+    for qname, value in attributes:
+      name, namespaces = self._name(qname, namespaces, declarations)
+      pieces.extend((' ', name, '="', _escape_attribute(self._text(value)),
+                     '"'))
+    for prefix, namespace in declarations:
+      pieces.extend((' xmlns:', prefix, '="', _escape_attribute(namespace),
+                     '"'))
+    text = element.text
+    if not text and not children:
+      pieces.append(' />')
+      tag = None
+    else:
+      pieces.append('>')
+      if text:
+        pieces.append(_escape_text(self._text(text)))
+    self.pieces.extend(pieces)
+    return tag, children, namespaces
+
+  def close(self, tag):
+    self.pieces.extend(('</', tag, '>'))
+
+  def write(self, element, namespaces):
+    """Writes the complete XML for element."""
+    if isinstance(element, _LazyElement):
+      values = object.__getattribute__(element, '__dict__')
+      tree = values.get('_lazy_tree')
+      if tree is not None and values['_lazy_version'] == self.version:
+        self.pieces.append(ElementTree.tostring(tree, 'utf-8').decode('utf-8'))
+        return
+      _materialize_all(element)
+    tag, children, namespaces = self.open(element, namespaces)
+    if tag is not None:
+      for child in children:
+        self.write(child, namespaces)
+      self.close(tag)
+
+
+def _escape_text(text):
+  if '&' in text:
+    text = text.replace('&', '&amp;')
+  if '<' in text:
+    text = text.replace('<', '&lt;')
+  if '>' in text:
+    text = text.replace('>', '&gt;')
+  return text
+
+
+def _escape_attribute(text):
+  text = _escape_text(text)
+  if '"' in text:
+    text = text.replace('"', '&quot;')
+  if '\n' in text:
+    text = text.replace('\n', '&#10;')
+  return text
+
+
+# The namespaces used by each class and the classes of its members, keyed
+# by (class, version).
+_class_namespace_cache = {}
+
+
+def _class_namespaces(cls, version):
+  """Lists the namespaces which may appear in an instance of cls.
+
+  These are declared on the root element by iter_string, so that they are
+  not declared again on every entry of a feed.
+  """
+  key = (cls, version)
+  namespaces = _class_namespace_cache.get(key)
+  if namespaces is not None:
+    return namespaces
+  namespaces = []
+  seen = set()
+  pending = [cls]
+  while pending:
+    current = pending.pop()
+    if current in seen:
+      continue
+    seen.add(current)
+    qname, elements, attributes = current._get_rules(version)
+    qnames = [qname] + (elements or {}).keys() + (attributes or {}).keys()
+    for qname in qnames:
+      if qname and qname.startswith('{'):
+        namespace = qname[1:qname.index('}')]
+        if namespace not in namespaces and namespace != XML_NAMESPACE:
+          namespaces.append(namespace)
+    for member_name, member_class, repeating in (elements or {}).itervalues():
+      pending.append(member_class)
+  _class_namespace_cache[key] = namespaces
+  return namespaces
 
 
 class XmlAttribute(object):
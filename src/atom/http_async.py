@@ -0,0 +1,828 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Non-blocking HTTP client for making many concurrent requests.
+
+AsyncHttpClient sends requests over non-blocking sockets driven by a single
+event loop, so thousands of requests can be in flight from one thread.
+start_request returns a Future right away; the requests make progress while
+the run method (or the result method of any Future) is executing.
+Connections are kept alive and reused for later requests to the same host.
+
+Usage:
+  >>> http_client = atom.http_async.AsyncHttpClient(max_per_host=50)
+  >>> futures = [http_client.start_request(
+  ...     atom.http_core.HttpRequest(uri=url, method='GET')) for url in urls]
+  >>> http_client.run(futures)
+  >>> bodies = [future.result().read() for future in futures]
+
+gdata.client.AsyncGDClient uses this client to provide futures from the
+usual GDClient methods. An AsyncHttpClient and its Futures must only be
+used from one thread. Proxies are not supported. Host names are looked up
+once per host on a worker thread, so a slow DNS server does not hold up
+the requests which are already in flight.
+"""
+
+
+import collections
+import errno
+import select
+import socket
+import sys
+import threading
+import time
+import atom.http_core
+ssl = None
+try:
+  import ssl
+except ImportError:
+  pass
+
+
+class Error(Exception):
+  pass
+
+
+class IncompleteResponse(Error):
+  pass
+
+
+# Socket errors which mean the operation should be tried again later.
+_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN,
+                errno.EALREADY)
+
+
+class Future(object):
+  """The eventual result of an asynchronous operation.
+
+  Calling result waits for the operation by running the client's event
+  loop, so other requests make progress at the same time.
+  """
+
+  def __init__(self, client):
+    self._client = client
+    self._done = False
+    self._result = None
+    self._exc_info = None
+    self._callbacks = []
+
+  def done(self):
+    return self._done
+
+  def result(self, timeout=None):
+    """Returns the result, raising the operation's exception if it failed."""
+    if not self._done:
+      self._client.run([self], timeout=timeout)
+      if not self._done:
+        raise Error('Timed out waiting for the result')
+    if self._exc_info is not None:
+      raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+    return self._result
+
+  def exception(self):
+    """Returns the exception raised by the operation, or None."""
+    if self._exc_info is not None:
+      return self._exc_info[1]
+    return None
+
+  def add_done_callback(self, function):
+    """Calls the function with this future once it is done."""
+    if self._done:
+      function(self)
+    else:
+      self._callbacks.append(function)
+
+  def set_result(self, result):
+    self._result = result
+    self._finish()
+
+  def set_exception(self, exc_info):
+    """Sets the outcome to an exception, given as a sys.exc_info() tuple."""
+    self._exc_info = exc_info
+    self._finish()
+
+  def _finish(self):
+    self._done = True
+    callbacks, self._callbacks = self._callbacks, []
+    for function in callbacks:
+      function(self)
+
+  def then(self, function):
+    """Returns a Future for the result of calling function with the result.
+
+    If the function returns a Future, the returned Future completes when it
+    does. Exceptions, whether raised by this operation or by the function,
+    are passed on to the returned Future.
+    """
+    chained = Future(self._client)
+    def on_done(future):
+      if future._exc_info is not None:
+        chained.set_exception(future._exc_info)
+        return
+      try:
+        result = function(future._result)
+      except Exception:
+        chained.set_exception(sys.exc_info())
+        return
+      if isinstance(result, Future):
+        result.add_done_callback(lambda inner: _copy_outcome(inner, chained))
+      else:
+        chained.set_result(result)
+    self.add_done_callback(on_done)
+    return chained
+
+  Done = done
+  Result = result
+  AddDoneCallback = add_done_callback
+  Then = then
+
+
+def _copy_outcome(source, destination):
+  if source._exc_info is not None:
+    destination.set_exception(source._exc_info)
+  else:
+    destination.set_result(source._result)
+
+
+class AsyncResponse(atom.http_core.HttpResponse):
+  """A complete HTTP response whose header names are case insensitive."""
+
+  def __init__(self, status, reason, headers, body):
+    atom.http_core.HttpResponse.__init__(self, status=status, reason=reason,
+                                         body=body)
+    self._header_list = headers
+    self._headers = dict([(name.lower(), value) for name, value in headers])
+
+  def getheader(self, name, default=None):
+    return self._headers.get(name.lower(), default)
+
+  def getheaders(self):
+    return self._header_list[:]
+
+
+class AsyncHttpClient(object):
+  """Performs HTTP requests concurrently on non-blocking sockets.
+
+  Requests to the same host share at most max_per_host connections. Extra
+  requests wait in a queue until a connection is free. The request method
+  blocks like other HTTP clients, so an AsyncHttpClient can also be used as
+  the http_client of an ordinary AtomPubClient.
+  """
+  # The most connections open at once to one host.
+  max_per_host = 8
+  # Seconds without progress after which a request fails.
+  timeout = 60
+  # Seconds after which an unused keep-alive connection is closed.
+  idle_timeout = 60
+  recv_size = 65536
+
+  def __init__(self, max_per_host=None, timeout=None, idle_timeout=None):
+    if max_per_host is not None:
+      self.max_per_host = max_per_host
+    if timeout is not None:
+      self.timeout = timeout
+    if idle_timeout is not None:
+      self.idle_timeout = idle_timeout
+    # Maps (scheme, host, port) to a deque of waiting _Exchanges.
+    self._queues = {}
+    # Maps (scheme, host, port) to a list of idle _Connections.
+    self._idle = {}
+    # Maps (scheme, host, port) to the number of open connections.
+    self._open = {}
+    # Maps socket file numbers to every open _Connection.
+    self._connections = {}
+    # Maps (host, port) to the (family, address) to connect to.
+    self._addresses = {}
+    # The (host, port) pairs being looked up on worker threads.
+    self._lookups = set()
+    # Created when the first lookup starts.
+    self._waker = None
+
+  def start_request(self, http_request):
+    """Queues the request and returns a Future for its AsyncResponse."""
+    future = Future(self)
+    try:
+      uri = http_request.uri
+      if isinstance(uri, (str, unicode)):
+        uri = atom.http_core.Uri.parse_uri(uri)
+      key = atom.http_core._pool_key(uri)
+      exchange = _Exchange(key, _serialize_request(http_request, uri),
+                           http_request.method, future,
+                           atom.http_core._is_idempotent(
+                               http_request.method, http_request.headers))
+    except Exception:
+      future.set_exception(sys.exc_info())
+      return future
+    self._queues.setdefault(key, collections.deque()).append(exchange)
+    self._dispatch(key)
+    return future
+
+  StartRequest = start_request
+
+  def request(self, http_request):
+    """Performs the request and waits for the response."""
+    return self.start_request(http_request).result()
+
+  Request = request
+
+  def run(self, futures=None, timeout=None):
+    """Runs the event loop.
+
+    Args:
+      futures: (optional) list of Futures. If given, the loop runs until
+               all of them are done, otherwise until no requests remain.
+      timeout: (optional) float The most seconds to run for.
+    """
+    deadline = None
+    if timeout is not None:
+      deadline = time.time() + timeout
+    while True:
+      if futures is None:
+        if not self._busy():
+          return
+      elif not [future for future in futures if not future.done()]:
+        return
+      if not self._busy():
+        raise Error('Waiting for futures but no requests are in progress')
+      wait = 1.0
+      if deadline is not None:
+        wait = min(wait, deadline - time.time())
+        if wait <= 0:
+          return
+      self._poll(wait)
+      self._check_timeouts()
+
+  Run = run
+
+  def close(self):
+    """Closes all idle connections.
+
+    Connections which are in use are kept open until their responses have
+    been received.
+    """
+    for idle in self._idle.values():
+      for connection in idle[:]:
+        self._close(connection)
+    if self._waker is not None and not self._lookups:
+      self._waker.close()
+      self._waker = None
+
+  Close = close
+
+  def _busy(self):
+    for connection in self._connections.itervalues():
+      if connection.exchange is not None:
+        return True
+    for queue in self._queues.itervalues():
+      if queue:
+        return True
+    return False
+
+  def _address(self, host, port):
+    """Returns the (family, address) of the host.
+
+    Returns None if the host name is being looked up on a worker thread, in
+    which case the host's queued requests are dispatched once the lookup
+    has finished.
+    """
+    address = self._addresses.get((host, port))
+    if address is not None:
+      return address
+    try:
+      # Numeric addresses are converted without a lookup.
+      address = _first_address(socket.getaddrinfo(
+          host, port, 0, socket.SOCK_STREAM, 0, socket.AI_NUMERICHOST))
+    except socket.gaierror:
+      self._start_lookup(host, port)
+      return None
+    self._addresses[(host, port)] = address
+    return address
+
+  def _start_lookup(self, host, port):
+    if (host, port) in self._lookups:
+      return
+    if self._waker is None:
+      self._waker = _Waker()
+    self._lookups.add((host, port))
+    thread = threading.Thread(target=self._look_up, args=(host, port))
+    thread.setDaemon(True)
+    thread.start()
+
+  def _look_up(self, host, port):
+    """Resolves the host name, runs on a worker thread."""
+    try:
+      result = _first_address(socket.getaddrinfo(host, port, 0,
+                                                 socket.SOCK_STREAM))
+    except Exception:
+      result = sys.exc_info()
+    self._waker.notify(((host, port), result))
+
+  def _finish_lookups(self):
+    """Stores the addresses found by worker threads and sends requests."""
+    for host_port, result in self._waker.drain():
+      self._lookups.discard(host_port)
+      if len(result) == 2:
+        self._addresses[host_port] = result
+      for key in self._queues.keys():
+        if key[1:] != host_port:
+          continue
+        if len(result) == 3:
+          queue = self._queues[key]
+          while queue:
+            queue.popleft().future.set_exception(result)
+        else:
+          self._dispatch(key)
+
+  def _dispatch(self, key):
+    """Starts queued requests for the host on idle or new connections."""
+    queue = self._queues.get(key)
+    while queue:
+      connection = None
+      idle = self._idle.get(key)
+      if idle:
+        connection = idle.pop()
+      elif not self.max_per_host or self._open.get(key, 0) < self.max_per_host:
+        try:
+          address = self._address(key[1], key[2])
+          if address is None:
+            return
+          connection = _Connection(self, key, address)
+        except Exception:
+          queue.popleft().future.set_exception(sys.exc_info())
+          continue
+        self._connections[connection.fileno] = connection
+        self._open[key] = self._open.get(key, 0) + 1
+      else:
+        return
+      connection.start(queue.popleft())
+
+  def _poll(self, wait):
+    readers = []
+    writers = []
+    for connection in self._connections.values():
+      if connection.wants_write():
+        writers.append(connection.fileno)
+      elif connection.wants_read():
+        readers.append(connection.fileno)
+    waker = None
+    if self._lookups:
+      waker = self._waker.fileno()
+      readers.append(waker)
+    if hasattr(select, 'poll'):
+      poller = select.poll()
+      for fileno in readers:
+        poller.register(fileno, select.POLLIN)
+      for fileno in writers:
+        poller.register(fileno, select.POLLOUT)
+      try:
+        events = poller.poll(wait * 1000)
+      except select.error, error:
+        if error[0] == errno.EINTR:
+          return
+        raise
+      ready = [(fileno, event & select.POLLOUT) for fileno, event in events]
+    else:
+      try:
+        readable, writable, errored = select.select(readers, writers, [],
+                                                    wait)
+      except select.error, error:
+        if error[0] == errno.EINTR:
+          return
+        raise
+      ready = [(fileno, False) for fileno in readable] + [
+          (fileno, True) for fileno in writable]
+    for fileno, writable in ready:
+      if fileno == waker:
+        self._finish_lookups()
+        continue
+      connection = self._connections.get(fileno)
+      if connection is None:
+        continue
+      try:
+        if writable:
+          connection.handle_write()
+        else:
+          connection.handle_read()
+      except (socket.error, IncompleteResponse, ValueError):
+        self._fail(connection, sys.exc_info())
+
+  def _check_timeouts(self):
+    now = time.time()
+    for connection in self._connections.values():
+      if connection.exchange is not None:
+        if now - connection.last_activity > self.timeout:
+          self._fail(connection, (socket.timeout,
+                                  socket.timeout('timed out'), None))
+      elif now - connection.last_activity > self.idle_timeout:
+        self._close(connection)
+
+  def _finished(self, connection, response, keep_alive):
+    exchange = connection.exchange
+    connection.exchange = None
+    if keep_alive:
+      connection.reused = True
+      connection.last_activity = time.time()
+      self._idle.setdefault(connection.key, []).append(connection)
+    else:
+      self._close(connection)
+    self._dispatch(connection.key)
+    exchange.future.set_result(response)
+
+  def _fail(self, connection, exc_info):
+    exchange = connection.exchange
+    connection.exchange = None
+    self._close(connection)
+    if exchange is not None:
+      if (connection.reused and not connection.received
+          and not exchange.retried and exchange.idempotent):
+        # The server closed a kept-alive connection before answering, so
+        # send the request again on a new connection. The server may have
+        # acted on the request, so only idempotent requests are sent again.
+        exchange.retried = True
+        self._queues[connection.key].appendleft(exchange)
+      else:
+        exchange.future.set_exception(exc_info)
+    self._dispatch(connection.key)
+
+  def _close(self, connection):
+    if self._connections.pop(connection.fileno, None) is None:
+      return
+    self._open[connection.key] -= 1
+    idle = self._idle.get(connection.key)
+    if idle and connection in idle:
+      idle.remove(connection)
+    connection.close()
+
+
+class _Exchange(object):
+  """A request waiting for or being sent on a connection."""
+
+  def __init__(self, key, data, method, future, idempotent=True):
+    self.key = key
+    self.data = data
+    self.head = method == 'HEAD'
+    self.future = future
+    self.idempotent = idempotent
+    self.retried = False
+
+
+class _Connection(object):
+  """A non-blocking socket which carries one request at a time."""
+
+  def __init__(self, client, key, address):
+    self.client = client
+    self.key = key
+    family, address = address
+    self.sock = socket.socket(family, socket.SOCK_STREAM)
+    self.sock.setblocking(0)
+    self.fileno = self.sock.fileno()
+    result = self.sock.connect_ex(address)
+    if result and result not in _IN_PROGRESS:
+      self.sock.close()
+      raise socket.error(result, errno.errorcode.get(result, str(result)))
+    self.state = 'connecting'
+    self.handshake_wants_read = False
+    self.exchange = None
+    self.reused = False
+    self.received = False
+    self.last_activity = time.time()
+
+  def start(self, exchange):
+    self.exchange = exchange
+    self.out = exchange.data
+    self.sent = 0
+    self.received = False
+    self.parser = _ResponseParser(exchange.head)
+    self.last_activity = time.time()
+    if self.state == 'idle':
+      self.state = 'sending'
+
+  def wants_write(self):
+    if self.state == 'handshake':
+      return not self.handshake_wants_read
+    return self.state == 'connecting' or (
+        self.state == 'sending' and self.exchange is not None)
+
+  def wants_read(self):
+    if self.state == 'handshake':
+      return self.handshake_wants_read
+    return self.state in ('receiving', 'idle')
+
+  def handle_write(self):
+    self.last_activity = time.time()
+    if self.state == 'connecting':
+      error = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+      if error:
+        raise socket.error(error, errno.errorcode.get(error, str(error)))
+      if self.key[0] == 'https':
+        self._wrap_ssl()
+        self.state = 'handshake'
+      else:
+        self.state = 'sending'
+    if self.state == 'handshake':
+      self._handshake()
+    elif self.state == 'sending':
+      self._send()
+
+  def handle_read(self):
+    self.last_activity = time.time()
+    if self.state == 'handshake':
+      self._handshake()
+      return
+    if self.state == 'idle':
+      # An idle connection is only readable once the server has closed it.
+      self.client._close(self)
+      return
+    while True:
+      try:
+        data = self.sock.recv(self.client.recv_size)
+      except socket.error, error:
+        if _should_wait(error):
+          return
+        raise
+      if not data:
+        if self.parser.eof():
+          self._complete(False)
+          return
+        raise IncompleteResponse('Connection closed before the response '
+                                 'was complete')
+      self.received = True
+      if self.parser.feed(data):
+        self._complete(self.parser.keep_alive)
+        return
+      # Data already decrypted by SSL is not reported by poll.
+      if not (hasattr(self.sock, 'pending') and self.sock.pending()):
+        return
+
+  def _send(self):
+    while self.sent < len(self.out):
+      try:
+        sent = self.sock.send(self.out[self.sent:self.sent + 65536])
+      except socket.error, error:
+        if _should_wait(error):
+          return
+        raise
+      self.sent += sent
+    self.out = None
+    self.state = 'receiving'
+
+  def _complete(self, keep_alive):
+    parser = self.parser
+    self.parser = None
+    self.state = 'idle'
+    response = AsyncResponse(parser.status, parser.reason, parser.headers,
+                             ''.join(parser.body))
+    self.client._finished(self, response, keep_alive)
+
+  def _wrap_ssl(self):
+    if ssl is None:
+      raise Error('The ssl module is required for https requests')
+    host = self.key[1]
+    if hasattr(ssl, 'create_default_context'):
+      context = ssl.create_default_context()
+      self.sock = context.wrap_socket(self.sock, server_hostname=host,
+                                      do_handshake_on_connect=False)
+    else:
+      self.sock = ssl.wrap_socket(self.sock, do_handshake_on_connect=False)
+
+  def _handshake(self):
+    try:
+      self.sock.do_handshake()
+    except ssl.SSLError, error:
+      if error.args[0] == ssl.SSL_ERROR_WANT_READ:
+        self.handshake_wants_read = True
+        return
+      if error.args[0] == ssl.SSL_ERROR_WANT_WRITE:
+        self.handshake_wants_read = False
+        return
+      raise
+    self.state = 'sending'
+
+  def close(self):
+    try:
+      self.sock.close()
+    except socket.error:
+      pass
+
+
+def _first_address(address_info):
+  """Returns the (family, address) of the first getaddrinfo result."""
+  family, socktype, proto, name, address = address_info[0]
+  return (family, address)
+
+
+class _Waker(object):
+  """Lets worker threads pass results to the event loop and wake it up."""
+
+  def __init__(self):
+    self._reader, self._writer = _socket_pair()
+    self._reader.setblocking(0)
+    self._lock = threading.Lock()
+    self._results = []
+
+  def fileno(self):
+    return self._reader.fileno()
+
+  def notify(self, result):
+    self._lock.acquire()
+    try:
+      self._results.append(result)
+    finally:
+      self._lock.release()
+    try:
+      self._writer.send('x')
+    except socket.error:
+      pass
+
+  def drain(self):
+    """Returns the results passed to notify since the last call."""
+    try:
+      while self._reader.recv(1024):
+        pass
+    except socket.error:
+      pass
+    self._lock.acquire()
+    try:
+      results, self._results = self._results, []
+    finally:
+      self._lock.release()
+    return results
+
+  def close(self):
+    self._reader.close()
+    self._writer.close()
+
+
+def _socket_pair():
+  """Returns two connected sockets."""
+  if hasattr(socket, 'socketpair'):
+    return socket.socketpair()
+  listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+  try:
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    writer = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    writer.connect(listener.getsockname())
+    reader, address = listener.accept()
+  finally:
+    listener.close()
+  return reader, writer
+
+
+def _should_wait(error):
+  """Determines whether a socket error means the socket is not ready yet."""
+  if ssl is not None and isinstance(error, ssl.SSLError):
+    return error.args[0] in (ssl.SSL_ERROR_WANT_READ,
+                             ssl.SSL_ERROR_WANT_WRITE)
+  return error.args and error.args[0] in _IN_PROGRESS
+
+
+def _serialize_request(http_request, uri):
+  """Builds the bytes of the request line, headers and body."""
+  parts = []
+  for part in http_request._body_parts:
+    if hasattr(part, 'read'):
+      part = part.read()
+    elif isinstance(part, unicode):
+      part = part.encode('utf-8')
+    elif hasattr(part, '__iter__'):
+      part = ''.join(part)
+    else:
+      part = str(part)
+    parts.append(part)
+  body = ''.join(parts)
+  headers = http_request.headers.copy()
+  # The body is sent in one piece with its length.
+  headers.pop('Transfer-Encoding', None)
+  if 'Host' not in headers:
+    scheme, host, port = atom.http_core._pool_key(uri)
+    if port in (80, 443):
+      headers['Host'] = host
+    else:
+      headers['Host'] = '%s:%i' % (host, port)
+  if body or http_request.method in ('POST', 'PUT'):
+    headers['Content-Length'] = str(len(body))
+  lines = ['%s %s HTTP/1.1' % (http_request.method, uri._get_relative_path())]
+  for name, value in headers.iteritems():
+    lines.append('%s: %s' % (name, value))
+  return '\r\n'.join(lines) + '\r\n\r\n' + body
+
+
+class _ResponseParser(object):
+  """Incrementally parses an HTTP/1.1 response."""
+
+  def __init__(self, head):
+    self.head = head
+    self.status = None
+    self.reason = None
+    self.headers = []
+    self.body = []
+    self.keep_alive = False
+    self._buffer = ''
+    self._mode = 'head'
+    self._remaining = 0
+
+  def feed(self, data):
+    """Parses more of the response, returns True once it is complete."""
+    self._buffer += data
+    while True:
+      if self._mode == 'head':
+        end = self._buffer.find('\r\n\r\n')
+        if end < 0:
+          return False
+        head, self._buffer = self._buffer[:end], self._buffer[end + 4:]
+        self._parse_head(head)
+      elif self._mode == 'length':
+        data = self._buffer[:self._remaining]
+        self._buffer = self._buffer[len(data):]
+        self.body.append(data)
+        self._remaining -= len(data)
+        if self._remaining == 0:
+          self._mode = 'done'
+        return self._mode == 'done'
+      elif self._mode == 'chunk size':
+        end = self._buffer.find('\r\n')
+        if end < 0:
+          return False
+        size = int(self._buffer[:end].split(';')[0].strip(), 16)
+        self._buffer = self._buffer[end + 2:]
+        if size == 0:
+          self._mode = 'trailer'
+        else:
+          self._remaining = size
+          self._mode = 'chunk'
+      elif self._mode == 'chunk':
+        if len(self._buffer) < self._remaining + 2:
+          return False
+        self.body.append(self._buffer[:self._remaining])
+        self._buffer = self._buffer[self._remaining + 2:]
+        self._mode = 'chunk size'
+      elif self._mode == 'trailer':
+        end = self._buffer.find('\r\n')
+        if end < 0:
+          return False
+        line, self._buffer = self._buffer[:end], self._buffer[end + 2:]
+        if not line:
+          self._mode = 'done'
+      elif self._mode == 'close':
+        self.body.append(self._buffer)
+        self._buffer = ''
+        return False
+      if self._mode == 'done':
+        return True
+
+  def eof(self):
+    """Handles the end of the connection, returns True if it ended the body.
+    """
+    return self._mode in ('close', 'done')
+
+  def _parse_head(self, head):
+    lines = head.split('\r\n')
+    version, status, reason = (lines[0].split(' ', 2) + [''])[:3]
+    headers = []
+    for line in lines[1:]:
+      if line[:1] in (' ', '\t') and headers:
+        # A continuation of the previous header.
+        name, value = headers[-1]
+        headers[-1] = (name, value + ' ' + line.strip())
+      elif ':' in line:
+        name, value = line.split(':', 1)
+        headers.append((name.strip(), value.strip()))
+    status = int(status)
+    if 100 <= status < 200:
+      # Skip interim responses such as 100 Continue.
+      return
+    self.status = status
+    self.reason = reason
+    self.headers = headers
+    values = dict([(name.lower(), value) for name, value in headers])
+    connection = values.get('connection', '').lower()
+    if version == 'HTTP/1.1':
+      self.keep_alive = connection != 'close'
+    else:
+      self.keep_alive = connection == 'keep-alive'
+    if self.head or status in (204, 304):
+      self._mode = 'done'
+    elif 'chunked' in values.get('transfer-encoding', '').lower():
+      self._mode = 'chunk size'
+    elif 'content-length' in values:
+      self._remaining = int(values['content-length'])
+      self._mode = 'length'
+      if self._remaining == 0:
+        self._mode = 'done'
+    else:
+      # The body ends when the server closes the connection.
+      self.keep_alive = False
+      self._mode = 'close'
@@ -0,0 +1,411 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""ETag based caches for responses to GET requests.
+
+An AtomPubClient with a response_cache stores the body of each successful
+GET response which carries an ETag. When the same URI is requested again
+with the same credentials, the client sends If-None-Match and, if the server
+answers 304 Not Modified, returns the stored response instead. GDClient also
+keeps the XML tree parsed from the stored body so an unchanged feed is not
+tokenized again.
+
+Usage:
+  >>> client = gdata.client.GDClient(
+  ...     response_cache=atom.http_cache.MemoryCache(max_bytes=5000000))
+"""
+
+
+import collections
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+try:
+  from xml.etree import cElementTree as ElementTree
+except ImportError:
+  try:
+    import cElementTree as ElementTree
+  except ImportError:
+    try:
+      from xml.etree import ElementTree
+    except ImportError:
+      from elementtree import ElementTree
+import atom.core
+import atom.http_core
+
+
+# Only responses with one of these strings in their Content-Type are stored.
+CACHEABLE_CONTENT_TYPES = ('xml', 'json')
+# Token members which identify the credentials used to make a request. A
+# token's secrets are never stored, only a hash of these values.
+IDENTITY_ATTRIBUTES = ('basic_cookie', 'token_string', 'consumer_key',
+                       'token', 'refresh_token', 'client_id', 'requestor_id')
+
+
+class CachedResponse(object):
+  """The parts of a GET response needed to answer a later request."""
+
+  def __init__(self, key, etag, body, status=200, reason='OK', headers=None):
+    self.key = key
+    self.etag = etag
+    self.body = body
+    self.status = status
+    self.reason = reason
+    self.headers = headers or {}
+    # The ElementTree parsed from the body, once it has been needed.
+    self.tree = None
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    # The tree is rebuilt from the body when loaded from disk.
+    state['tree'] = None
+    return state
+
+  def size(self):
+    return len(self.body)
+
+  def to_response(self, cache_hit=True):
+    """Creates an HTTP response object which reads the stored body."""
+    response = atom.http_core.HttpResponse(
+        status=self.status, reason=self.reason, headers=self.headers.copy(),
+        body=self.body)
+    response.cache_entry = self
+    response.cache_hit = cache_hit
+    return response
+
+  def parse(self, target_class, version=1):
+    """Returns a new instance of target_class converted from the body.
+
+    The body's XML is only parsed once. Each call converts the XML tree
+    into new objects, so callers may modify the result without changing
+    what later callers (or other threads) receive.
+    """
+    tree = self.tree
+    if tree is None:
+      tree = self.tree = ElementTree.fromstring(self.body)
+    return atom.core._xml_element_from_tree(tree, target_class, version)
+
+
+class MemoryCache(object):
+  """Keeps responses in memory, discarding the least recently used first.
+
+  Attributes:
+    max_entries: int The largest number of responses kept.
+    max_bytes: int The largest total size of the response bodies kept.
+        Responses larger than this are not stored.
+  """
+  max_entries = 1000
+  max_bytes = 10 * 1024 * 1024
+
+  def __init__(self, max_entries=None, max_bytes=None):
+    if max_entries is not None:
+      self.max_entries = max_entries
+    if max_bytes is not None:
+      self.max_bytes = max_bytes
+    self._entries = collections.OrderedDict()
+    self._size = 0
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    """Returns the CachedResponse stored for the key, or None."""
+    self._lock.acquire()
+    try:
+      entry = self._entries.pop(key, None)
+      if entry is not None:
+        # Move the entry to the most recently used end.
+        self._entries[key] = entry
+      return entry
+    finally:
+      self._lock.release()
+
+  def set(self, key, entry):
+    """Stores the CachedResponse, evicting old responses to make room.
+
+    Returns:
+      True if the entry was stored, False if it is too large to cache.
+    """
+    self._lock.acquire()
+    try:
+      self._remove(key)
+      if entry.size() > self.max_bytes:
+        return False
+      self._entries[key] = entry
+      self._size += entry.size()
+      while (len(self._entries) > self.max_entries
+             or self._size > self.max_bytes):
+        oldest_key, oldest = self._entries.popitem(last=False)
+        self._size -= oldest.size()
+      return True
+    finally:
+      self._lock.release()
+
+  def delete(self, key):
+    self._lock.acquire()
+    try:
+      self._remove(key)
+    finally:
+      self._lock.release()
+
+  def clear(self):
+    self._lock.acquire()
+    try:
+      self._entries.clear()
+      self._size = 0
+    finally:
+      self._lock.release()
+
+  def _remove(self, key):
+    entry = self._entries.pop(key, None)
+    if entry is not None:
+      self._size -= entry.size()
+
+  def __len__(self):
+    return len(self._entries)
+
+  def get_size(self):
+    """Returns the total size in bytes of the stored response bodies."""
+    return self._size
+
+  Get = get
+  Set = set
+  Delete = delete
+  Clear = clear
+  GetSize = get_size
+
+
+class FileCache(object):
+  """Keeps responses in files in a directory so they outlive the process.
+
+  Each response is pickled to its own file. When the directory holds too
+  many responses, the least recently used are deleted.
+
+  Attributes:
+    max_entries: int The largest number of responses kept.
+    max_bytes: int The largest total size of the files kept.
+  """
+  max_entries = 10000
+  max_bytes = 100 * 1024 * 1024
+  suffix = '.cache'
+
+  def __init__(self, directory, max_entries=None, max_bytes=None):
+    if max_entries is not None:
+      self.max_entries = max_entries
+    if max_bytes is not None:
+      self.max_bytes = max_bytes
+    self.directory = directory
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+    self._lock = threading.Lock()
+
+  def _path(self, key):
+    return os.path.join(self.directory,
+                        hashlib.sha1(key).hexdigest() + self.suffix)
+
+  def get(self, key):
+    """Returns the CachedResponse stored for the key, or None."""
+    path = self._path(key)
+    try:
+      cache_file = open(path, 'rb')
+      try:
+        entry = pickle.load(cache_file)
+      finally:
+        cache_file.close()
+      # Record the use so that eviction removes older files first.
+      os.utime(path, None)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError):
+      return None
+    if entry.key != key:
+      return None
+    return entry
+
+  def set(self, key, entry):
+    """Writes the CachedResponse to disk, evicting old files to make room.
+
+    Returns:
+      True if the entry was stored, False if it is too large to cache.
+    """
+    if entry.size() > self.max_bytes:
+      self.delete(key)
+      return False
+    handle, temp_path = tempfile.mkstemp(dir=self.directory)
+    temp_file = os.fdopen(handle, 'wb')
+    try:
+      pickle.dump(entry, temp_file, pickle.HIGHEST_PROTOCOL)
+    finally:
+      temp_file.close()
+    self._lock.acquire()
+    try:
+      os.rename(temp_path, self._path(key))
+      self._evict()
+    finally:
+      self._lock.release()
+    return True
+
+  def delete(self, key):
+    try:
+      os.remove(self._path(key))
+    except OSError:
+      pass
+
+  def clear(self):
+    self._lock.acquire()
+    try:
+      for path, stat in self._files():
+        os.remove(path)
+    finally:
+      self._lock.release()
+
+  def _files(self):
+    files = []
+    for name in os.listdir(self.directory):
+      if name.endswith(self.suffix):
+        path = os.path.join(self.directory, name)
+        try:
+          files.append((path, os.stat(path)))
+        except OSError:
+          pass
+    return files
+
+  def _evict(self):
+    files = self._files()
+    size = sum([stat.st_size for path, stat in files])
+    files.sort(key=lambda item: item[1].st_mtime)
+    while files and (len(files) > self.max_entries or size > self.max_bytes):
+      path, stat = files.pop(0)
+      size -= stat.st_size
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+
+  def __len__(self):
+    return len(self._files())
+
+  def get_size(self):
+    """Returns the total size in bytes of the cache files."""
+    return sum([stat.st_size for path, stat in self._files()])
+
+  Get = get
+  Set = set
+  Delete = delete
+  Clear = clear
+  GetSize = get_size
+
+
+def auth_identity(auth_token):
+  """Returns a string which identifies the credentials in the auth token.
+
+  Requests made with different credentials must not share cached responses.
+  The identity is a hash so that secrets are not written to the cache.
+  """
+  if auth_token is None:
+    return ''
+  parts = [auth_token.__class__.__name__]
+  for name in IDENTITY_ATTRIBUTES:
+    value = getattr(auth_token, name, None)
+    if value is not None:
+      parts.append('%s=%s' % (name, value))
+  # An OAuth 2.0 access token changes each time it is refreshed, so it only
+  # identifies the user when there is no refresh token.
+  if getattr(auth_token, 'refresh_token', None) is None:
+    value = getattr(auth_token, 'access_token', None)
+    if value is not None:
+      parts.append('access_token=%s' % value)
+  if len(parts) == 1:
+    parts.append(str(id(auth_token)))
+  return hashlib.sha1('\n'.join(parts)).hexdigest()
+
+
+AuthIdentity = auth_identity
+
+
+def cache_key(http_request, auth_token=None):
+  """Builds the key for the response to a GET request."""
+  return '%s %s' % (auth_identity(auth_token), str(http_request.uri))
+
+
+CacheKey = cache_key
+
+
+def _get_header(response, name):
+  value = response.getheader(name)
+  if value is None:
+    value = response.getheader(name.lower())
+  return value
+
+
+def _header_dict(response):
+  headers = atom.http_core.get_headers(response)
+  if isinstance(headers, dict):
+    return headers.copy()
+  return dict(headers)
+
+
+def is_cacheable(response):
+  """Determines whether a GET response may be stored in a response cache."""
+  if response.status != 200 or not _get_header(response, 'ETag'):
+    return False
+  if 'no-store' in (_get_header(response, 'Cache-Control') or ''):
+    return False
+  content_type = _get_header(response, 'Content-Type') or ''
+  for cacheable_type in CACHEABLE_CONTENT_TYPES:
+    if cacheable_type in content_type:
+      return True
+  return False
+
+
+IsCacheable = is_cacheable
+
+
+def cached_request(cache, http_client, http_request, auth_token=None):
+  """Performs a GET request, revalidating any cached response.
+
+  Args:
+    cache: A response cache such as MemoryCache or FileCache.
+    http_client: The object whose request method sends the HTTP request.
+    http_request: atom.http_core.HttpRequest The fully prepared GET request.
+    auth_token: The token which authorized the request. Responses are only
+        shared between requests made with the same credentials.
+
+  Returns:
+    The server's response, or if the server responded 304 Not Modified, a
+    response which reads the cached body. Responses which came from or were
+    stored in the cache have a cache_entry member holding the
+    CachedResponse, and cache_hit is True if the server was not asked to
+    send the body.
+  """
+  key = cache_key(http_request, auth_token)
+  entry = None
+  # Leave requests which already ask for revalidation to the caller, who
+  # expects to see the 304 response.
+  if 'If-None-Match' not in http_request.headers:
+    entry = cache.get(key)
+    if entry is not None:
+      http_request.headers['If-None-Match'] = entry.etag
+  response = http_client.request(http_request)
+  if response.status == 304 and entry is not None:
+    return entry.to_response()
+  if is_cacheable(response):
+    entry = CachedResponse(key, _get_header(response, 'ETag'), response.read(),
+                           response.status, response.reason,
+                           _header_dict(response))
+    cache.set(key, entry)
+    return entry.to_response(cache_hit=False)
+  return response
+
+
+CachedRequest = cached_request
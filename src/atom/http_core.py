@@ -27,6 +27,12 @@ import StringIO
 import urlparse
 import urllib
 import httplib
+import select
+import socket
+import threading
+import time
+import zlib
+import atom.instrumentation
 ssl = None
 try:
   import ssl
@@ -83,6 +89,9 @@ class HttpRequest(object):
   """
   method = None
   uri = None
+  # The atom.instrumentation.RequestEvent recording this request, set while
+  # an instrumented client sends it.
+  event = None
 
   def __init__(self, uri=None, method=None, headers=None):
     """Construct an HTTP request.
@@ -110,16 +119,21 @@ class HttpRequest(object):
     in RFC 1341.
 
     Args:
-      data: str or a file-like object containing a part of the request body.
+      data: str, a file-like object, or an iterable of strs (such as an
+            atom.core.XmlStream) containing a part of the request body.
       mime_type: str The MIME type describing the data
       size: int Required if the data is a file like object. If the data is a
-            string, the size is calculated so this parameter is ignored.
+            string, the size is calculated so this parameter is ignored. If
+            the data is an iterable and no size is given, the request is
+            sent with chunked transfer encoding.
     """
     if isinstance(data, str):
       size = len(data)
     if size is None:
-      # TODO: support chunked transfer if some of the body is of unknown size.
-      raise UnknownSize('Each part of the body must have a known size.')
+      if hasattr(data, 'read') or not hasattr(data, '__iter__'):
+        raise UnknownSize('Each part of the body must have a known size.')
+      self.headers['Transfer-Encoding'] = 'chunked'
+      size = 0
     if 'Content-Length' in self.headers:
       content_length = int(self.headers['Content-Length'])
     else:
@@ -169,7 +183,10 @@ class HttpRequest(object):
       self._body_parts.insert(-1, type_string)
       content_length += len(type_string)
       self._body_parts.insert(-1, data)
-    self.headers['Content-Length'] = str(content_length)
+    if self.headers.get('Transfer-Encoding') == 'chunked':
+      self.headers.pop('Content-Length', None)
+    else:
+      self.headers['Content-Length'] = str(content_length)
   # I could add an "append_to_body_part" method as well.
 
   AddBodyPart = add_body_part
@@ -416,12 +433,62 @@ def _dump_response(http_response):
 
 
 class HttpClient(object):
-  """Performs HTTP requests using httplib."""
+  """Performs HTTP requests using httplib.
+
+  Compression is off by default. With accept_gzip set, the client asks the
+  server for gzip encoded responses and decompresses their bodies as they
+  are read. With compress_requests_over set, request bodies of at least
+  that many bytes are sent gzip encoded.
+
+  The hooks list holds atom.instrumentation.RequestHook objects which are
+  told about each request sent through this client, including the time
+  spent connecting.
+  """
   debug = None
+  # Ask for gzip encoded responses. Google's servers only compress responses
+  # if the User-Agent also contains "gzip", so it is added to the header.
+  accept_gzip = False
+  # The size in bytes from which request bodies are compressed, or None to
+  # never compress them. Only bodies made entirely of strings are compressed.
+  compress_requests_over = None
+
+  def __init__(self, accept_gzip=None, compress_requests_over=None,
+               hooks=None):
+    if accept_gzip is not None:
+      self.accept_gzip = accept_gzip
+    if compress_requests_over is not None:
+      self.compress_requests_over = compress_requests_over
+    self.hooks = list(hooks or [])
 
   def request(self, http_request):
-    return self._http_request(http_request.method, http_request.uri,
-                              http_request.headers, http_request._body_parts)
+    headers = http_request.headers
+    body_parts = http_request._body_parts
+    if self.accept_gzip:
+      headers = _accept_gzip_headers(headers)
+    if self.compress_requests_over is not None:
+      headers, body_parts = _compress_body(headers, body_parts,
+                                           self.compress_requests_over)
+    # An event attached by an instrumented AtomPubClient is completed by the
+    # client, otherwise this fires the events for its own hooks.
+    event = http_request.event
+    own_event = False
+    if event is None and getattr(self, 'hooks', None):
+      event = atom.instrumentation.RequestEvent(http_request, self.hooks)
+      own_event = True
+      event.start()
+    try:
+      response = self._http_request(http_request.method, http_request.uri,
+                                    headers, body_parts, event=event)
+    except Exception, error:
+      if own_event:
+        event.failed(error)
+      raise
+    if self.accept_gzip and _is_gzip_encoded(response):
+      response = _GzipResponse(response)
+    if own_event:
+      event.headers_received(response.status)
+      response = atom.instrumentation.InstrumentedResponse(response, event)
+    return response
 
   Request = request
 
@@ -446,7 +513,8 @@ class HttpClient(object):
         connection = httplib.HTTPConnection(uri.host, int(uri.port))
     return connection
 
-  def _http_request(self, method, uri, headers=None, body_parts=None):
+  def _http_request(self, method, uri, headers=None, body_parts=None,
+                    event=None):
     """Makes an HTTP request using httplib.
 
     Args:
@@ -457,15 +525,40 @@ class HttpClient(object):
       body_parts: list of strings, objects with a read method, or objects
                   which can be converted to strings using str. Each of these
                   will be sent in order as the body of the HTTP request.
+      event: (optional) The atom.instrumentation.RequestEvent which records
+             the connection time.
     """
     if isinstance(uri, (str, unicode)):
       uri = Uri.parse_uri(uri)
 
     connection = self._get_connection(uri, headers=headers)
+    return self._send_request(connection, method, uri, headers, body_parts,
+                              event)
 
+  def _send_request(self, connection, method, uri, headers=None,
+                    body_parts=None, event=None):
+    """Sends the request over an open connection and returns the response.
+
+    Args:
+      connection: An httplib.HTTPConnection or HTTPSConnection.
+      method: str example: 'GET', 'POST', 'PUT', 'DELETE', etc.
+      uri: atom.http_core.Uri
+      headers: dict of strings mapping to strings which will be sent as HTTP
+               headers in the request.
+      body_parts: list of strings, objects with a read method, or objects
+                  which can be converted to strings using str.
+      event: (optional) The atom.instrumentation.RequestEvent which records
+             the connection time.
+    """
     if self.debug:
       connection.debuglevel = 1
 
+    # httplib connects when the request is sent, connect first to time it.
+    if event is not None and getattr(connection, 'sock', True) is None:
+      started = time.time()
+      connection.connect()
+      event.connect_time = time.time() - started
+
     if connection.host != uri.host:
       connection.putrequest(method, str(uri))
     else:
@@ -493,7 +586,11 @@ class HttpClient(object):
     connection.endheaders()
 
     # If there is data, send it in the request.
-    if body_parts and filter(lambda x: x != '', body_parts):
+    if headers.get('Transfer-Encoding') == 'chunked':
+      for part in body_parts or ():
+        _send_data_part(part, connection, chunked=True)
+      connection.send('0\r\n\r\n')
+    elif body_parts and filter(lambda x: x != '', body_parts):
       for part in body_parts:
         _send_data_part(part, connection)
 
@@ -501,10 +598,379 @@ class HttpClient(object):
     return connection.getresponse()
 
 
-def _send_data_part(data, connection):
+class PooledHttpClient(HttpClient):
+  """Performs HTTP requests using persistent httplib connections.
+
+  Connections are pooled by scheme, host and port, so consecutive requests
+  to the same server reuse an open socket instead of paying for a new TCP
+  and SSL handshake each time. A connection is handed back to the pool once
+  the response body has been read completely (or the response has been
+  closed), so every response must be read or closed by the caller. The
+  AtomPubClient and GDClient always read the response body.
+
+  An instance may be shared between threads and can be passed as the
+  http_client to an atom.client.AtomPubClient. Proxies are not supported,
+  use a ProxiedHttpClient if the http_proxy or https_proxy environment
+  variables must be honored.
+  """
+  # The maximum number of open connections to a single host. When this many
+  # connections are in use, requests to the same host wait for a connection
+  # to be returned. None or 0 means there is no limit.
+  max_per_host = 8
+  # The maximum number of unused connections kept open for each host.
+  max_idle_per_host = 4
+  # Idle connections older than this many seconds are closed instead of
+  # reused, since servers drop idle keep-alive connections.
+  idle_timeout = 60
+
+  def __init__(self, max_per_host=None, max_idle_per_host=None,
+               idle_timeout=None, accept_gzip=None,
+               compress_requests_over=None, hooks=None):
+    HttpClient.__init__(self, accept_gzip, compress_requests_over, hooks)
+    if max_per_host is not None:
+      self.max_per_host = max_per_host
+    if max_idle_per_host is not None:
+      self.max_idle_per_host = max_idle_per_host
+    if idle_timeout is not None:
+      self.idle_timeout = idle_timeout
+    # Maps (scheme, host, port) to a list of (connection, last_used) pairs.
+    self._idle = {}
+    # Maps (scheme, host, port) to the number of connections in use.
+    self._active = {}
+    self._lock = threading.Condition()
+
+  def _http_request(self, method, uri, headers=None, body_parts=None,
+                    event=None):
+    """Makes an HTTP request using a pooled connection.
+
+    If a reused connection turns out to have been closed by the server, the
+    request is sent once more on a new connection as long as it is safe to
+    send twice (see _is_idempotent) and the body can be sent again (it
+    contains no file-like objects). The server may already have acted on
+    the first request, so POSTs (such as inserts and batches) are never
+    sent again.
+    """
+    if isinstance(uri, (str, unicode)):
+      uri = Uri.parse_uri(uri)
+    key = _pool_key(uri)
+    connection, reused = self._acquire(key, uri, headers)
+    try:
+      response = self._send_request(connection, method, uri, headers,
+                                    body_parts, event)
+    except (socket.error, httplib.HTTPException):
+      connection.close()
+      if (not reused or not _is_idempotent(method, headers)
+          or not _is_replayable(body_parts)):
+        self._release(key, None)
+        raise
+      try:
+        connection = self._get_connection(uri, headers=headers)
+        response = self._send_request(connection, method, uri, headers,
+                                      body_parts, event)
+      except:
+        connection.close()
+        self._release(key, None)
+        raise
+    return _PooledResponse(response, self, key, connection)
+
+  def _acquire(self, key, uri, headers):
+    """Finds an idle connection to the host or opens a new one.
+
+    Returns:
+      A tuple of the connection and a boolean which is True if the
+      connection has been used before.
+    """
+    self._lock.acquire()
+    try:
+      while True:
+        idle = self._idle.get(key)
+        now = time.time()
+        while idle:
+          connection, last_used = idle.pop()
+          if (now - last_used < self.idle_timeout
+              and not _is_stale(connection)):
+            self._active[key] = self._active.get(key, 0) + 1
+            return connection, True
+          connection.close()
+        if (not self.max_per_host
+            or self._active.get(key, 0) < self.max_per_host):
+          self._active[key] = self._active.get(key, 0) + 1
+          break
+        self._lock.wait()
+    finally:
+      self._lock.release()
+    # Open the new connection without holding the lock.
+    try:
+      return self._get_connection(uri, headers=headers), False
+    except:
+      self._release(key, None)
+      raise
+
+  def _release(self, key, connection):
+    """Returns a connection to the pool.
+
+    Args:
+      key: tuple of (scheme, host, port) identifying the pool.
+      connection: The httplib connection which is no longer in use, or None
+          if the connection was closed and should not be reused.
+    """
+    self._lock.acquire()
+    try:
+      self._active[key] -= 1
+      if connection is not None:
+        idle = self._idle.setdefault(key, [])
+        # httplib sets sock to None if the server asked to close the
+        # connection.
+        if connection.sock is not None and len(idle) < self.max_idle_per_host:
+          idle.append((connection, time.time()))
+        else:
+          connection.close()
+      self._lock.notify()
+    finally:
+      self._lock.release()
+
+  def close(self):
+    """Closes all idle connections.
+
+    Connections which are currently in use are closed when their responses
+    have been read instead of being returned to the pool.
+    """
+    self._lock.acquire()
+    try:
+      idle, self._idle = self._idle, {}
+    finally:
+      self._lock.release()
+    for connections in idle.itervalues():
+      for connection, last_used in connections:
+        connection.close()
+
+  Close = close
+
+
+def _pool_key(uri):
+  """Returns the (scheme, host, port) tuple used to pool connections."""
+  scheme = uri.scheme or 'http'
+  port = uri.port
+  if not port:
+    if scheme == 'https':
+      port = 443
+    else:
+      port = 80
+  return (scheme, uri.host, int(port))
+
+
+def _is_stale(connection):
+  """Checks whether an idle connection has been closed by the server.
+
+  An idle keep-alive socket should have nothing to read. If it is readable,
+  the server has either closed it or sent unexpected data, so it can not be
+  reused.
+  """
+  if connection.sock is None:
+    return True
+  try:
+    readable, writable, errored = select.select([connection.sock], [], [], 0)
+  except (select.error, socket.error, ValueError):
+    return True
+  return bool(readable)
+
+
+# Methods which have the same effect when a request is sent more than once.
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'DELETE')
+
+
+def _is_idempotent(method, headers):
+  """Determines if sending the request twice is as safe as sending it once.
+
+  A PUT is only idempotent if it is conditional on an If-Match ETag, since
+  otherwise a repeated update could overwrite a change made in between.
+  """
+  method = (method or 'GET').upper()
+  if method in IDEMPOTENT_METHODS:
+    return True
+  return method == 'PUT' and 'If-Match' in (headers or {})
+
+
+def _is_replayable(body_parts):
+  """Determines if the request body can be sent a second time."""
+  if not body_parts:
+    return True
+  for part in body_parts:
+    # File-like objects and iterators can only be read once.
+    if hasattr(part, 'read') or hasattr(part, 'next'):
+      return False
+  return True
+
+
+class _PooledResponse(object):
+  """Wraps an httplib.HTTPResponse to return its connection to the pool.
+
+  The connection is released once the body has been read to the end. All
+  other attributes are taken from the wrapped response.
+  """
+
+  def __init__(self, response, pool, key, connection):
+    self._response = response
+    self._pool = pool
+    self._key = key
+    self._connection = connection
+    # Responses without a body (HEAD, 204, 304, etc.) can be released right
+    # away.
+    if getattr(response, 'length', None) == 0 or response.isclosed():
+      response.read()
+      self._release(connection)
+
+  def read(self, amt=None):
+    try:
+      if amt is None:
+        data = self._response.read()
+      else:
+        data = self._response.read(amt)
+    except:
+      self._release(None)
+      raise
+    if self._response.isclosed():
+      self._release(self._connection)
+    return data
+
+  def close(self):
+    if self._connection is not None:
+      # The body was not read completely so the connection can not be used
+      # for another request.
+      self._connection.close()
+      self._release(None)
+    self._response.close()
+
+  def _release(self, connection):
+    if self._connection is None:
+      return
+    if connection is None:
+      self._connection.close()
+    self._connection = None
+    self._pool._release(self._key, connection)
+
+  def __getattr__(self, name):
+    return getattr(self._response, name)
+
+
+def _accept_gzip_headers(headers):
+  """Returns a copy of the headers which asks for a gzip encoded response."""
+  headers = headers.copy()
+  if 'Accept-Encoding' not in headers:
+    headers['Accept-Encoding'] = 'gzip'
+  user_agent = headers.get('User-Agent')
+  if user_agent is None:
+    headers['User-Agent'] = 'gzip'
+  elif 'gzip' not in user_agent:
+    headers['User-Agent'] = '%s (gzip)' % user_agent
+  return headers
+
+
+def _compress_body(headers, body_parts, min_size):
+  """Gzip encodes the request body if it is at least min_size bytes long.
+
+  Returns:
+    A tuple of the headers and body parts to send. The originals are
+    returned unchanged if the body is too small, already encoded, or
+    contains parts which are not strings.
+  """
+  if not body_parts or 'Content-Encoding' in headers:
+    return headers, body_parts
+  for part in body_parts:
+    if not isinstance(part, str):
+      return headers, body_parts
+  body = ''.join(body_parts)
+  if len(body) < min_size:
+    return headers, body_parts
+  compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+  body = compressor.compress(body) + compressor.flush()
+  headers = headers.copy()
+  headers['Content-Encoding'] = 'gzip'
+  headers['Content-Length'] = str(len(body))
+  return headers, [body]
+
+
+def _is_gzip_encoded(response):
+  encoding = (response.getheader('Content-Encoding')
+              or response.getheader('content-encoding') or '')
+  return encoding.strip().lower() == 'gzip'
+
+
+class _GzipResponse(object):
+  """Decompresses the body of a gzip encoded response as it is read.
+
+  Reading n bytes reads only as much of the compressed body as is needed, so
+  streaming readers keep their memory use bounded. The Content-Encoding and
+  Content-Length headers, which describe the compressed body, are hidden.
+  All other attributes are taken from the wrapped response.
+  """
+  chunk_size = 65536
+
+  def __init__(self, response):
+    self._response = response
+    self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    self._buffer = ''
+    self._offset = 0
+    self._finished = False
+
+  def _fill(self):
+    data = self._response.read(self.chunk_size)
+    if data:
+      self._buffer = self._buffer[self._offset:] + (
+          self._decompressor.decompress(data))
+    else:
+      self._buffer = self._buffer[self._offset:] + self._decompressor.flush()
+      self._finished = True
+    self._offset = 0
+
+  def read(self, amt=None):
+    if amt is None or amt < 0:
+      data = self._buffer[self._offset:]
+      if not self._finished:
+        data += self._decompressor.decompress(self._response.read())
+        data += self._decompressor.flush()
+        self._finished = True
+      self._buffer = ''
+      self._offset = 0
+      return data
+    while len(self._buffer) - self._offset < amt and not self._finished:
+      self._fill()
+    data = self._buffer[self._offset:self._offset + amt]
+    self._offset += len(data)
+    return data
+
+  def getheader(self, name, default=None):
+    if name.lower() in ('content-encoding', 'content-length'):
+      return default
+    return self._response.getheader(name, default)
+
+  def getheaders(self):
+    headers = get_headers(self._response)
+    if isinstance(headers, dict):
+      return dict([(name, value) for name, value in headers.iteritems()
+                   if name.lower() not in ('content-encoding',
+                                           'content-length')])
+    return [(name, value) for name, value in headers
+            if name.lower() not in ('content-encoding', 'content-length')]
+
+  def __getattr__(self, name):
+    return getattr(self._response, name)
+
+
+def _send_data_part(data, connection, chunked=False):
+  """Sends a body part, framed as HTTP chunks if chunked is True."""
+  if chunked:
+    def send(piece):
+      if isinstance(piece, unicode):
+        piece = piece.encode('utf-8')
+      # An empty chunk would end the body.
+      if piece:
+        connection.send('%x\r\n%s\r\n' % (len(piece), piece))
+  else:
+    send = connection.send
   if isinstance(data, (str, unicode)):
     # I might want to just allow str, not unicode.
-    connection.send(data)
+    send(data)
     return
   # Check to see if data is a file-like object that has a read method.
   elif hasattr(data, 'read'):
@@ -512,12 +978,17 @@ def _send_data_part(data, connection):
     while 1:
       binarydata = data.read(100000)
       if binarydata == '': break
-      connection.send(binarydata)
+      send(binarydata)
+    return
+  elif hasattr(data, '__iter__'):
+    # An iterable which produces the data a piece at a time.
+    for piece in data:
+      send(piece)
     return
   else:
     # The data object was not a file.
     # Try to convert to a string and send the data.
-    connection.send(str(data))
+    send(str(data))
     return
 
 
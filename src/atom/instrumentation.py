@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Hooks for observing the requests made by clients.
+
+Hooks are objects with before_send, after_headers, after_body and
+after_parse methods (see RequestHook) and are added to the hooks list of an
+atom.client.AtomPubClient or an atom.http_core.HttpClient. Each method
+receives the RequestEvent for a request, which is filled in as the request
+progresses:
+
+  before_send: The request is about to be sent.
+  after_headers: The response status and headers have arrived, or the
+      request failed, in which case the event's error is set.
+  after_body: The response body has been read completely.
+  after_parse: The client has converted the body into an object.
+
+MetricsCollector is a hook which keeps latency histograms and error counts
+for each endpoint.
+
+Usage:
+  >>> metrics = atom.instrumentation.MetricsCollector()
+  >>> client = gdata.client.GDClient()
+  >>> client.hooks.append(metrics)
+  >>> ...
+  >>> print metrics.export()
+"""
+
+
+import re
+import threading
+import time
+
+
+# Path segments which look like IDs are replaced with this in path templates.
+ID_PLACEHOLDER = '{id}'
+_ID_SEGMENT = re.compile(r'^(\d+|.*(@|%40).*|(?=.*\d)[\w.%:-]{16,})$')
+
+
+def path_template(path):
+  """Replaces the parts of a URL path which identify a resource.
+
+  Numbers, email addresses and long alphanumeric IDs are replaced, so that
+  requests for different users or entries are counted together. For
+  example '/m8/feeds/contacts/joe@example.com/full/5a1c' becomes
+  '/m8/feeds/contacts/{id}/full/5a1c' and '/feeds/1234' becomes
+  '/feeds/{id}'.
+  """
+  segments = (path or '/').split('?')[0].split('/')
+  for index, segment in enumerate(segments):
+    if _ID_SEGMENT.match(segment):
+      segments[index] = ID_PLACEHOLDER
+  return '/'.join(segments)
+
+
+PathTemplate = path_template
+
+
+class RequestHook(object):
+  """Base class for hooks, which may override any of these methods."""
+
+  def before_send(self, event):
+    pass
+
+  def after_headers(self, event):
+    pass
+
+  def after_body(self, event):
+    pass
+
+  def after_parse(self, event):
+    pass
+
+
+class RequestEvent(object):
+  """Describes one request and its response as it progresses.
+
+  Times are in seconds and are None for the steps which have not happened
+  (connect_time is None when an open connection was reused, parse_time is
+  None when the response was not converted).
+
+  Attributes:
+    method: str The HTTP method.
+    host: str The server's host name.
+    path: str The path of the URL, without the query.
+    path_template: str The path with IDs replaced, see path_template.
+    status: int The response status, or None if there was no response.
+    error: The exception raised while sending the request, or None.
+    bytes_out: int The size of the request body.
+    bytes_in: int The number of response body bytes read.
+    connect_time: Time spent opening the connection.
+    ttfb: Time from sending the request to receiving the response headers.
+    download_time: Time from receiving the headers to the end of the body.
+    parse_time: Time spent converting the body after it was read.
+  """
+
+  def __init__(self, http_request, hooks):
+    uri = http_request.uri
+    self.method = http_request.method
+    self.host = uri.host
+    self.path = (uri.path or '/').split('?')[0]
+    self.path_template = path_template(self.path)
+    self.status = None
+    self.error = None
+    self.bytes_out = _body_size(http_request)
+    self.bytes_in = 0
+    self.connect_time = None
+    self.ttfb = None
+    self.download_time = None
+    self.parse_time = None
+    self.hooks = hooks
+    self.started = time.time()
+    self._headers_received = None
+    self._body_received = None
+
+  def get_endpoint(self):
+    """Returns the method, host and path template identifying the endpoint."""
+    return '%s %s%s' % (self.method, self.host, self.path_template)
+
+  GetEndpoint = get_endpoint
+
+  def fire(self, name):
+    for hook in self.hooks:
+      getattr(hook, name)(self)
+
+  def start(self):
+    self.started = time.time()
+    self.fire('before_send')
+
+  def headers_received(self, status):
+    self._headers_received = time.time()
+    self.status = status
+    self.ttfb = self._headers_received - self.started
+    self.fire('after_headers')
+
+  def failed(self, error):
+    self.error = error
+    self.fire('after_headers')
+
+  def body_received(self):
+    self._body_received = time.time()
+    self.download_time = self._body_received - (self._headers_received
+                                                or self.started)
+    self.fire('after_body')
+
+  def parsed(self, started):
+    """Records the end of converting the response, begun at started.
+
+    Reading the body during the conversion counts as download time.
+    """
+    if self._body_received is not None:
+      started = max(started, self._body_received)
+    self.parse_time = time.time() - started
+    self.fire('after_parse')
+
+
+def _body_size(http_request):
+  if 'Content-Length' in http_request.headers:
+    try:
+      return int(http_request.headers['Content-Length'])
+    except ValueError:
+      pass
+  size = 0
+  for part in http_request._body_parts:
+    if isinstance(part, (str, unicode)):
+      size += len(part)
+  return size
+
+
+class InstrumentedResponse(object):
+  """Wraps a response to report when its body has been read.
+
+  All other attributes are taken from the wrapped response.
+  """
+
+  def __init__(self, response, event):
+    self._response = response
+    self.event = event
+    self._finished = False
+
+  def read(self, amt=None):
+    if amt is None:
+      data = self._response.read()
+    else:
+      data = self._response.read(amt)
+    if data:
+      self.event.bytes_in += len(data)
+    if not self._finished and (amt is None or not data):
+      self._finished = True
+      self.event.body_received()
+    return data
+
+  def __getattr__(self, name):
+    return getattr(self._response, name)
+
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60)
+TIMINGS = ('connect_time', 'ttfb', 'download_time', 'parse_time')
+
+
+class Histogram(object):
+  """Counts values in buckets with fixed upper bounds."""
+
+  def __init__(self, bounds=LATENCY_BUCKETS):
+    self.bounds = bounds
+    # The last count is for values above the largest bound.
+    self.counts = [0] * (len(bounds) + 1)
+    self.count = 0
+    self.sum = 0.0
+
+  def add(self, value):
+    index = 0
+    while index < len(self.bounds) and value > self.bounds[index]:
+      index += 1
+    self.counts[index] += 1
+    self.count += 1
+    self.sum += value
+
+  def percentile(self, fraction):
+    """Returns the bucket bound below which the fraction of values fall.
+
+    Returns None if there are no values and infinity if the percentile is
+    above the largest bound.
+    """
+    if not self.count:
+      return None
+    needed = fraction * self.count
+    seen = 0
+    for index, count in enumerate(self.counts):
+      seen += count
+      if seen >= needed and count:
+        if index < len(self.bounds):
+          return self.bounds[index]
+        return float('inf')
+    return float('inf')
+
+  Add = add
+  Percentile = percentile
+
+
+class EndpointStats(object):
+  """Request counts and timing histograms for one endpoint."""
+
+  def __init__(self):
+    self.requests = 0
+    self.errors = 0
+    self.bytes_in = 0
+    self.bytes_out = 0
+    self.timings = dict([(name, Histogram()) for name in TIMINGS])
+
+  def get_error_rate(self):
+    if not self.requests:
+      return 0.0
+    return float(self.errors) / self.requests
+
+  GetErrorRate = get_error_rate
+
+
+class MetricsCollector(RequestHook):
+  """Aggregates timings and error rates per endpoint.
+
+  An endpoint is the method, host and path template of a request. A request
+  counts as an error if it failed without a response or its status is
+  error_status (400) or above. A collector can be shared by several clients
+  and threads.
+  """
+
+  def __init__(self, error_status=400):
+    self.error_status = error_status
+    self.endpoints = {}
+    self._lock = threading.Lock()
+
+  def _stats(self, event):
+    endpoint = event.get_endpoint()
+    stats = self.endpoints.get(endpoint)
+    if stats is None:
+      stats = self.endpoints.setdefault(endpoint, EndpointStats())
+    return stats
+
+  def after_headers(self, event):
+    self._lock.acquire()
+    try:
+      stats = self._stats(event)
+      stats.requests += 1
+      stats.bytes_out += event.bytes_out
+      if event.error is not None or event.status >= self.error_status:
+        stats.errors += 1
+      if event.ttfb is not None:
+        stats.timings['ttfb'].add(event.ttfb)
+      if event.connect_time is not None:
+        stats.timings['connect_time'].add(event.connect_time)
+    finally:
+      self._lock.release()
+
+  def after_body(self, event):
+    self._lock.acquire()
+    try:
+      stats = self._stats(event)
+      stats.bytes_in += event.bytes_in
+      stats.timings['download_time'].add(event.download_time)
+    finally:
+      self._lock.release()
+
+  def after_parse(self, event):
+    self._lock.acquire()
+    try:
+      self._stats(event).timings['parse_time'].add(event.parse_time)
+    finally:
+      self._lock.release()
+
+  def reset(self):
+    self._lock.acquire()
+    try:
+      self.endpoints = {}
+    finally:
+      self._lock.release()
+
+  def export(self):
+    """Returns the metrics in the Prometheus text exposition format.
+
+    For example:
+      gdata_requests_total{endpoint="GET example.com/feeds/{id}"} 12
+      gdata_request_errors_total{endpoint="GET example.com/feeds/{id}"} 1
+      gdata_ttfb_seconds_bucket{endpoint="...",le="0.1"} 9
+      gdata_ttfb_seconds_sum{endpoint="..."} 0.84
+      gdata_ttfb_seconds_count{endpoint="..."} 12
+    """
+    lines = []
+    self._lock.acquire()
+    try:
+      for endpoint in sorted(self.endpoints):
+        stats = self.endpoints[endpoint]
+        label = 'endpoint="%s"' % endpoint.replace('"', '\\"')
+        lines.append('gdata_requests_total{%s} %i' % (label, stats.requests))
+        lines.append('gdata_request_errors_total{%s} %i' % (label,
+                                                             stats.errors))
+        lines.append('gdata_bytes_in_total{%s} %i' % (label, stats.bytes_in))
+        lines.append('gdata_bytes_out_total{%s} %i' % (label,
+                                                        stats.bytes_out))
+        for name in TIMINGS:
+          histogram = stats.timings[name]
+          if not histogram.count:
+            continue
+          metric = 'gdata_%s_seconds' % name.replace('_time', '')
+          cumulative = 0
+          for bound, count in zip(histogram.bounds + ('+Inf',),
+                                  histogram.counts):
+            cumulative += count
+            lines.append('%s_bucket{%s,le="%s"} %i' % (metric, label, bound,
+                                                       cumulative))
+          lines.append('%s_sum{%s} %.6f' % (metric, label, histogram.sum))
+          lines.append('%s_count{%s} %i' % (metric, label, histogram.count))
+    finally:
+      self._lock.release()
+    return '\n'.join(lines) + '\n'
+
+  Reset = reset
+  Export = export
@@ -318,6 +318,13 @@ class MockHttpResponse(atom.http_core.HttpResponse):
         self._body = body.read()
       else:
         self._body = body
-
-  def read(self):
-    return self._body
+    self._offset = 0
+
+  def read(self, amt=None):
+    # Reading the whole body can be repeated. Reads of amt bytes move
+    # through the body the way they would for a real response.
+    if self._body is None or amt is None:
+      return self._body
+    data = self._body[self._offset:self._offset + amt]
+    self._offset += len(data)
+    return data
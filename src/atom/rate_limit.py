@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Client side rate limiting to stay under per-user and per-project quotas.
+
+A RateLimiter can be given to any number of AtomPubClients, which may be
+used from several threads. Requests wait until their token bucket, chosen by
+the host, the credentials and whether the request reads or writes, has a
+token. When the server answers that a quota was exceeded, the rate of that
+bucket is cut and then recovers gradually as requests succeed, so clients
+settle just under the quota.
+
+Usage:
+  >>> limiter = atom.rate_limit.RateLimiter(read_rate=10, write_rate=2)
+  >>> client = gdata.client.GDClient(rate_limiter=limiter)
+"""
+
+
+import threading
+import time
+import atom.http_cache
+
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class TokenBucket(object):
+  """Allows on average rate events per second, in bursts of up to burst."""
+
+  def __init__(self, rate, burst=None):
+    self.rate = float(rate)
+    self.burst = burst or max(1, rate)
+    self._tokens = float(self.burst)
+    self._updated = time.time()
+    self._lock = threading.Lock()
+
+  def _refill(self, now):
+    self._tokens = min(self.burst,
+                       self._tokens + (now - self._updated) * self.rate)
+    self._updated = now
+
+  def acquire(self):
+    """Takes a token, sleeping until one is available.
+
+    Tokens are reserved in the order callers arrive, so waiting threads do
+    not compete for the next token.
+
+    Returns:
+      The number of seconds spent waiting.
+    """
+    self._lock.acquire()
+    try:
+      self._refill(time.time())
+      self._tokens -= 1
+      wait = 0
+      if self._tokens < 0:
+        wait = -self._tokens / self.rate
+    finally:
+      self._lock.release()
+    if wait > 0:
+      time.sleep(wait)
+    return wait
+
+  def set_rate(self, rate):
+    self._lock.acquire()
+    try:
+      # Tokens accumulated so far were earned at the old rate.
+      self._refill(time.time())
+      self.rate = float(rate)
+    finally:
+      self._lock.release()
+
+  Acquire = acquire
+  SetRate = set_rate
+
+
+class RateLimiter(object):
+  """Paces requests per host and credentials, with separate write budget.
+
+  Attributes:
+    read_rate: float Requests per second allowed for GET, HEAD and OPTIONS.
+    write_rate: float Requests per second allowed for other methods. If
+        None, the read_rate is used.
+    burst: int The most requests which may be sent at once after a pause.
+        If None, one second's worth of requests.
+    quota_statuses: HTTP status codes which indicate that a quota was
+        exceeded.
+    decrease_factor: float The rate is multiplied by this after a quota
+        error, at most once per decrease_interval seconds.
+    increase_fraction: float After each successful request, the rate grows
+        by this fraction of the configured rate until it is reached again.
+    min_rate_fraction: float The rate is never cut below this fraction of
+        the configured rate.
+  """
+  read_rate = 10
+  write_rate = None
+  burst = None
+  quota_statuses = (403, 429, 503)
+  decrease_factor = 0.5
+  decrease_interval = 1
+  increase_fraction = 0.02
+  min_rate_fraction = 0.05
+
+  def __init__(self, read_rate=None, write_rate=None, burst=None,
+               quota_statuses=None):
+    if read_rate is not None:
+      self.read_rate = read_rate
+    if write_rate is not None:
+      self.write_rate = write_rate
+    if burst is not None:
+      self.burst = burst
+    if quota_statuses is not None:
+      self.quota_statuses = quota_statuses
+    # Maps (host, auth identity, is write) to a _Budget.
+    self._budgets = {}
+    self._lock = threading.Lock()
+
+  def _budget(self, http_request, auth_token):
+    write = (http_request.method or 'GET').upper() not in READ_METHODS
+    key = (http_request.uri.host, atom.http_cache.auth_identity(auth_token),
+           write)
+    self._lock.acquire()
+    try:
+      budget = self._budgets.get(key)
+      if budget is None:
+        rate = self.read_rate
+        if write and self.write_rate is not None:
+          rate = self.write_rate
+        budget = _Budget(TokenBucket(rate, self.burst), rate)
+        self._budgets[key] = budget
+      return budget
+    finally:
+      self._lock.release()
+
+  def acquire(self, http_request, auth_token=None):
+    """Waits until the request may be sent.
+
+    Returns:
+      The number of seconds spent waiting.
+    """
+    return self._budget(http_request, auth_token).bucket.acquire()
+
+  def record(self, http_request, auth_token, response):
+    """Adjusts the rate for the request's budget based on the response."""
+    budget = self._budget(http_request, auth_token)
+    bucket = budget.bucket
+    if response.status in self.quota_statuses:
+      now = time.time()
+      self._lock.acquire()
+      try:
+        if now - budget.decreased < self.decrease_interval:
+          # The requests sent before the first error are likely to fail too.
+          return
+        budget.decreased = now
+      finally:
+        self._lock.release()
+      bucket.set_rate(max(budget.rate * self.min_rate_fraction,
+                          bucket.rate * self.decrease_factor))
+    elif response.status < 400 and bucket.rate < budget.rate:
+      bucket.set_rate(min(budget.rate,
+                          bucket.rate + budget.rate * self.increase_fraction))
+
+  def get_rate(self, http_request, auth_token=None):
+    """Returns the current requests per second allowed for the request."""
+    return self._budget(http_request, auth_token).bucket.rate
+
+  Acquire = acquire
+  Record = record
+  GetRate = get_rate
+
+
+class _Budget(object):
+
+  def __init__(self, bucket, rate):
+    self.bucket = bucket
+    # The configured rate which the bucket recovers to.
+    self.rate = rate
+    self.decreased = 0
@@ -28,6 +28,7 @@ it will not be used in future requests.
 __author__ = 'api.jscudder (Jeff Scudder)'
 
 
+import threading
 import atom.http_interface
 import atom.url
 
@@ -36,9 +37,76 @@ SCOPE_ALL = 'http'
 
 
 class TokenStore(object):
-  """Manages Authorization tokens which will be sent in HTTP headers."""
+  """Manages Authorization tokens which will be sent in HTTP headers.
+
+  Scopes are indexed by host and then by a character trie over the path, so
+  finding the token for a URL takes time proportional to the length of the
+  URL's path rather than to the number of stored scopes. The store may be
+  shared between threads.
+  """
   def __init__(self, scoped_tokens=None):
     self._tokens = scoped_tokens or {}
+    self._lock = threading.Lock()
+    self._build_index()
+
+  def _build_index(self):
+    # Maps a scope's host to the root _ScopeNode of the paths on that host.
+    self._index = {}
+    # Scopes which match every URL.
+    self._all_scopes = set()
+    for scope in self._tokens:
+      self._index_scope(scope)
+
+  def _index_scope(self, scope):
+    if scope == SCOPE_ALL:
+      self._all_scopes.add(scope)
+      return
+    url = atom.url.parse_url(scope)
+    node = self._index.setdefault(url.host, _ScopeNode())
+    for char in url.path or '':
+      node = node.children.setdefault(char, _ScopeNode())
+    node.scopes.add(scope)
+
+  def _unindex_scope(self, scope):
+    if scope == SCOPE_ALL:
+      self._all_scopes.discard(scope)
+      return
+    url = atom.url.parse_url(scope)
+    node = self._index.get(url.host)
+    path = []
+    for char in url.path or '':
+      if node is None:
+        return
+      path.append((node, char))
+      node = node.children.get(char)
+    if node is None:
+      return
+    node.scopes.discard(scope)
+    # Prune the branch if it no longer leads to any scopes.
+    while path and not node.scopes and not node.children:
+      parent, char = path.pop()
+      del parent.children[char]
+      node = parent
+    if not path and not node.scopes and not node.children:
+      del self._index[url.host]
+
+  def _candidate_scopes(self, url):
+    """Lists the scopes which may match the URL, most specific first."""
+    matches = []
+    node = self._index.get(url.host)
+    if node is not None:
+      matches.append(node.scopes)
+      # A scope with a path never matches a URL without one.
+      for char in url.path or '':
+        node = node.children.get(char)
+        if node is None:
+          break
+        matches.append(node.scopes)
+    candidates = []
+    for scopes in reversed(matches):
+      candidates.extend(scopes)
+    candidates.extend(self._all_scopes)
+    return candidates
 
   def add_token(self, token):
     """Adds a new token to the store (replaces tokens with the same scope).
@@ -56,8 +124,15 @@ class TokenStore(object):
     if not hasattr(token, 'scopes') or not token.scopes:
       return False
 
-    for scope in token.scopes:
-      self._tokens[str(scope)] = token
+    self._lock.acquire()
+    try:
+      for scope in token.scopes:
+        scope = str(scope)
+        if scope not in self._tokens:
+          self._index_scope(scope)
+        self._tokens[scope] = token
+    finally:
+      self._lock.release()
     return True  
 
   def find_token(self, url):
@@ -65,9 +140,9 @@ class TokenStore(object):
 
     Args:
       url: str or atom.url.Url or a list containing the same.
-          The URL which is going to be requested. All
-          tokens are examined to see if any scopes begin match the beginning
-          of the URL. The first match found is returned.
+          The URL which is going to be requested. The token with the most
+          specific scope which matches the beginning of the URL is
+          returned.
 
     Returns:
       The token object which should execute the HTTP request. If there was
@@ -80,13 +155,20 @@ class TokenStore(object):
       return None
     if isinstance(url, (str, unicode)):
       url = atom.url.parse_url(url)
-    if url in self._tokens:
-      token = self._tokens[url]
-      if token.valid_for_scope(url):
-        return token
-      else:
-        del self._tokens[url]
-    for scope, token in self._tokens.iteritems():
+    self._lock.acquire()
+    try:
+      # A token stored for exactly this URL which is no longer valid for it
+      # is removed from the store.
+      exact_scope = str(url)
+      token = self._tokens.get(exact_scope)
+      if token is not None and not token.valid_for_scope(url):
+        del self._tokens[exact_scope]
+        self._unindex_scope(exact_scope)
+      candidates = [(scope, self._tokens[scope])
+                    for scope in self._candidate_scopes(url)]
+    finally:
+      self._lock.release()
+    for scope, token in candidates:
       if token.valid_for_scope(url):
         return token
     return atom.http_interface.GenericToken()
@@ -103,15 +185,30 @@ class TokenStore(object):
       True if a token was found and then removed from the token
       store. False if the token was not in the TokenStore.
     """
-    token_found = False
-    scopes_to_delete = []
-    for scope, stored_token in self._tokens.iteritems():
-      if stored_token == token:
-        scopes_to_delete.append(scope)
-        token_found = True
-    for scope in scopes_to_delete:
-      del self._tokens[scope]
-    return token_found
+    self._lock.acquire()
+    try:
+      scopes_to_delete = [scope for scope, stored_token
+                          in self._tokens.iteritems() if stored_token == token]
+      for scope in scopes_to_delete:
+        del self._tokens[scope]
+        self._unindex_scope(scope)
+    finally:
+      self._lock.release()
+    return bool(scopes_to_delete)
 
   def remove_all_tokens(self):
-    self._tokens = {} 
+    self._lock.acquire()
+    try:
+      self._tokens = {}
+      self._build_index()
+    finally:
+      self._lock.release()
+
+
+class _ScopeNode(object):
+  """A node in the path trie of a TokenStore."""
+  __slots__ = ('children', 'scopes')
+
+  def __init__(self):
+    self.children = {}
+    self.scopes = set()
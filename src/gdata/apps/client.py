@@ -67,12 +67,7 @@ class AppsClient(gdata.client.GDClient):
       desired_class: subclass of gdata.data.GDFeed. 
     """
 
-    next = feed.GetNextLink()
-    while next is not None:
-      next_feed = self.GetFeed(next.href, desired_class=desired_class)
-      for a_entry in next_feed.entry:
-        feed.entry.append(a_entry)
-      next = next_feed.GetNextLink()
+    feed.entry = list(self.iter_entries(feed, desired_class=desired_class))
     return feed
 
   def CreateUser(self, user_name, family_name, given_name, password,
@@ -119,12 +119,7 @@ class GroupsProvisioningClient(gdata.client.GDClient):
       desired_class: subclass of gdata.data.GDFeed. 
     """
 
-    next = feed.GetNextLink()
-    while next is not None:
-      next_feed = self.GetFeed(next.href, desired_class=desired_class)
-      for a_entry in next_feed.entry:
-        feed.entry.append(a_entry)
-      next = next_feed.GetNextLink()
+    feed.entry = list(self.iter_entries(feed, desired_class=desired_class))
     return feed
 
   def retrieve_page_of_groups(self, **kwargs):
@@ -148,12 +148,18 @@ class MultiDomainProvisioningClient(gdata.client.GDClient):
 
   MakeMultidomainAliasProvisioningUri = make_multidomain_alias_provisioning_uri
 
-  def retrieve_all_pages(self, uri, desired_class=gdata.data.GDFeed, **kwargs):
+  def retrieve_all_pages(self, uri, desired_class=gdata.data.GDFeed,
+                         prefetch=0, **kwargs):
     """Retrieves all pages from uri.
 
     Args:
       uri: The uri where the first page is.
       desired_class: Type of feed that is retrieved.
+      prefetch: The number of pages to fetch and parse in the background
+          ahead of the page being collected. The default is 0, which
+          fetches each page in the calling thread. Only set it if the
+          client's http_client may be used from another thread. See
+          gdata.client.GDClient.iter_entries.
       kwargs: The other parameters to pass to gdata.client.GDClient.GetFeed()
 
     Returns:
@@ -163,13 +169,8 @@ class MultiDomainProvisioningClient(gdata.client.GDClient):
         uri,
         desired_class=desired_class,
         **kwargs)
-    next_link = feed.GetNextLink()
-    while next_link is not None:
-      uri = next_link.href                    
-      temp_feed = self.GetFeed(
-          uri, desired_class=desired_class, **kwargs)
-      feed.entry = feed.entry + temp_feed.entry
-      next_link = temp_feed.GetNextLink()
+    feed.entry = list(self.iter_entries(
+        feed, desired_class=desired_class, prefetch=prefetch, **kwargs))
     return feed
 
   RetrieveAllPages = retrieve_all_pages
@@ -307,16 +307,9 @@ class OrganizationUnitProvisioningClient(gdata.client.GDClient):
       gdata.apps.organisation.data.OrgUnitFeed object
     """
     orgunit_feed = gdata.apps.organization.data.OrgUnitFeed()
-    temp_feed = self.RetrieveFeedFromUri(
-        uri, gdata.apps.organization.data.OrgUnitFeed)
-    orgunit_feed.entry = temp_feed.entry
-    next_link = temp_feed.GetNextLink()
-    while next_link is not None:
-      uri = next_link.GetAttributes()[0].value
-      temp_feed = self.GetFeed(
-          uri, desired_class=gdata.apps.organization.data.OrgUnitFeed, **kwargs)
-      orgunit_feed.entry[0:0] = temp_feed.entry
-      next_link = temp_feed.GetNextLink()
+    orgunit_feed.entry = list(self.iter_entries(
+        uri, desired_class=gdata.apps.organization.data.OrgUnitFeed,
+        **kwargs))
     return orgunit_feed
 
   RetrieveAllOrgUnitsFromUri = retrieve_all_org_units_from_uri
@@ -448,16 +441,9 @@ class OrganizationUnitProvisioningClient(gdata.client.GDClient):
       gdata.apps.organisation.data.OrgUserFeed object
     """
     orguser_feed = gdata.apps.organization.data.OrgUserFeed()
-    temp_feed = self.RetrieveFeedFromUri(
-        uri, gdata.apps.organization.data.OrgUserFeed)
-    orguser_feed.entry = temp_feed.entry
-    next_link = temp_feed.GetNextLink()
-    while next_link is not None:
-      uri = next_link.GetAttributes()[0].value
-      temp_feed = self.GetFeed(
-          uri, desired_class=gdata.apps.organization.data.OrgUserFeed, **kwargs)
-      orguser_feed.entry[0:0] = temp_feed.entry
-      next_link = temp_feed.GetNextLink()
+    orguser_feed.entry = list(self.iter_entries(
+        uri, desired_class=gdata.apps.organization.data.OrgUserFeed,
+        **kwargs))
     return orguser_feed
 
   RetrieveAllOrgUsersFromUri = retrieve_all_org_users_from_uri
@@ -108,12 +108,8 @@ class AppsService(gdata.service.GDataService):
 
   def AddAllElementsFromAllPages(self, link_finder, func):
     """retrieve all pages and add all elements"""
-    next = link_finder.GetNextLink()
-    while next is not None:
-      next_feed = self.Get(next.href, converter=func)
-      for a_entry in next_feed.entry:
-        link_finder.entry.append(a_entry)
-      next = next_feed.GetNextLink()
+    link_finder.entry = list(
+        self._GetElementGeneratorFromLinkFinder(link_finder, func))
     return link_finder
 
   def RetrievePageOfEmailLists(self, start_email_list_name=None,
@@ -476,12 +472,8 @@ class PropertyService(gdata.service.GDataService):
 
   def AddAllElementsFromAllPages(self, link_finder, func):
     """retrieve all pages and add all elements"""
-    next = link_finder.GetNextLink()
-    while next is not None:
-      next_feed = self.Get(next.href, converter=func)
-      for a_entry in next_feed.entry:
-        link_finder.entry.append(a_entry)
-      next = next_feed.GetNextLink()
+    link_finder.entry = list(
+        self._GetElementGeneratorFromLinkFinder(link_finder, func))
     return link_finder
 
   def _GetPropertyEntry(self, properties):
@@ -31,14 +31,33 @@ in this module is GDClient.
 __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
+import copy
+import email.utils
+import httplib
+import os
+import pickle
+import Queue
+import random
 import re
+import socket
+import sys
+import threading
+import time
+import weakref
 import atom.client
 import atom.core
+import atom.data
+import atom.http_async
 import atom.http_core
+import gdata.core
 import gdata.gauth
 import gdata.data
 
 
+# The number of bytes read at a time when a download is streamed.
+DOWNLOAD_CHUNK_SIZE = 65536
+
+
 class Error(Exception):
   pass
 
@@ -133,6 +152,162 @@ def get_xml_version(version):
   return int(version.split('.')[0])
 
 
+class RetryPolicy(object):
+  """Decides which failed requests are sent again and how long to wait.
+
+  A GDClient with a retry_policy sends a request again when the server
+  responds with one of the retry_statuses or the connection fails with one
+  of the retry_exceptions, as long as the request is idempotent (or
+  retry_all_methods is set) and the request body can be sent again. A PUT
+  is only idempotent if it carries an If-Match header, the same rule which
+  atom.http_core uses to replay requests on a reused connection. The
+  wait before each retry grows exponentially with some random jitter, and
+  a Retry-After header from the server is honored.
+
+  Attributes:
+    max_attempts: int The most times a request is sent, including the first.
+    initial_delay: float Seconds to wait before the first retry.
+    backoff: float The factor by which the delay grows after each retry.
+    max_delay: float The longest computed delay in seconds.
+    jitter: float Between 0 and 1, the largest fraction by which a delay is
+        randomly shortened so that many clients do not retry in lockstep.
+    deadline: float (optional) Seconds since the first attempt after which
+        no retry is started.
+    retry_statuses: HTTP status codes which are retried.
+    retry_exceptions: Exception classes which are retried.
+    idempotent_methods: HTTP methods which are safe to send more than once,
+        in addition to the requests which atom.http_core considers
+        idempotent.
+    retry_all_methods: bool Also retry methods which are not idempotent.
+    on_retry: (optional) A function called before waiting to retry, with the
+        method, URI, attempt number which failed, delay in seconds and the
+        cause, which is either an HTTP status code or an exception.
+  """
+  max_attempts = 4
+  initial_delay = 1
+  backoff = 2
+  max_delay = 60
+  jitter = 0.5
+  deadline = None
+  retry_statuses = (500, 502, 503, 504)
+  retry_exceptions = (socket.error, httplib.HTTPException)
+  idempotent_methods = atom.http_core.IDEMPOTENT_METHODS
+  retry_all_methods = False
+  on_retry = None
+
+  def __init__(self, max_attempts=None, initial_delay=None, backoff=None,
+               max_delay=None, jitter=None, deadline=None,
+               retry_statuses=None, retry_exceptions=None,
+               idempotent_methods=None, retry_all_methods=None,
+               on_retry=None):
+    for name, value in (
+        ('max_attempts', max_attempts), ('initial_delay', initial_delay),
+        ('backoff', backoff), ('max_delay', max_delay), ('jitter', jitter),
+        ('deadline', deadline), ('retry_statuses', retry_statuses),
+        ('retry_exceptions', retry_exceptions),
+        ('idempotent_methods', idempotent_methods),
+        ('retry_all_methods', retry_all_methods), ('on_retry', on_retry)):
+      if value is not None:
+        setattr(self, name, value)
+
+  def is_retryable(self, method, cause, request_headers=None,
+                   idempotent=None):
+    """Determines whether a request which failed may be sent again.
+
+    Args:
+      method: str The HTTP method of the request.
+      cause: int HTTP status code, or the exception raised by the request.
+      request_headers: dict (optional) The headers of the request.
+      idempotent: bool (optional) Whether sending the request again is safe,
+          for callers which make it safe themselves. Decided from the method
+          and request_headers if None.
+    """
+    if idempotent is None:
+      idempotent = self.is_idempotent(method, request_headers)
+    if not self.retry_all_methods and not idempotent:
+      return False
+    if isinstance(cause, RequestError):
+      cause = cause.status
+    if isinstance(cause, Exception):
+      return isinstance(cause, self.retry_exceptions)
+    return cause in self.retry_statuses
+
+  IsRetryable = is_retryable
+
+  def is_idempotent(self, method, request_headers=None):
+    """Determines whether sending the request twice is as safe as once."""
+    return ((method or 'GET').upper() in self.idempotent_methods
+            or atom.http_core._is_idempotent(method, request_headers))
+
+  IsIdempotent = is_idempotent
+
+  def get_delay(self, method, attempt, started, cause, headers=None,
+                request_headers=None, idempotent=None):
+    """Returns the seconds to wait before retrying, or None to give up.
+
+    Args:
+      method: str The HTTP method of the request.
+      attempt: int The number of the attempt which failed, starting at 1.
+      started: float The time.time() at which the first attempt was made.
+      cause: int HTTP status code, or the exception raised by the request.
+      headers: (optional) The headers of the server's response.
+      request_headers: dict (optional) The headers of the request.
+      idempotent: bool (optional) See is_retryable.
+    """
+    if attempt >= self.max_attempts or not self.is_retryable(
+        method, cause, request_headers, idempotent):
+      return None
+    delay = _retry_after(headers)
+    if delay is None:
+      delay = min(self.max_delay,
+                  self.initial_delay * self.backoff ** (attempt - 1))
+      delay *= 1 - self.jitter * random.random()
+    if (self.deadline is not None
+        and time.time() + delay - started > self.deadline):
+      return None
+    return delay
+
+  GetDelay = get_delay
+
+  def wait(self, method, uri, attempt, delay, cause):
+    """Reports a retry to the on_retry hook and sleeps for the delay."""
+    if self.on_retry is not None:
+      self.on_retry(method, uri, attempt, delay, cause)
+    time.sleep(delay)
+
+  Wait = wait
+
+
+# Pass as the retry_policy of a request to send it only once.
+NO_RETRIES = RetryPolicy(max_attempts=1)
+
+
+def _retry_after(headers):
+  """Reads the seconds to wait from a Retry-After header, if there is one."""
+  if hasattr(headers, 'items'):
+    headers = headers.items()
+  for name, value in headers or ():
+    if name.lower() == 'retry-after':
+      value = value.strip()
+      if value.isdigit():
+        return int(value)
+      date = email.utils.parsedate_tz(value)
+      if date is not None:
+        return max(0, email.utils.mktime_tz(date) - time.time())
+  return None
+
+
+def _is_replayable(http_request):
+  """Determines whether the request body can be sent more than once."""
+  if http_request is None:
+    return True
+  for part in http_request._body_parts:
+    # File-like objects and iterators can only be read once.
+    if hasattr(part, 'read') or hasattr(part, 'next'):
+      return False
+  return True
+
+
 class GDClient(atom.client.AtomPubClient):
   """Communicates with Google Data servers to perform CRUD operations.
 
@@ -183,10 +358,17 @@ class GDClient(atom.client.AtomPubClient):
   auth_scopes = None
   # Name of alternate auth service to use in certain cases
   alt_auth_service = None
+  # A RetryPolicy which decides when failed requests are sent again. If
+  # None, each request is sent once.
+  retry_policy = None
+  # If True, post, update and batch send the XML with chunked transfer
+  # encoding while it is being serialized, instead of building the whole
+  # document in memory first.
+  stream_xml = False
 
   def request(self, method=None, uri=None, auth_token=None,
               http_request=None, converter=None, desired_class=None,
-              redirects_remaining=4, **kwargs):
+              redirects_remaining=4, retry_policy=None, **kwargs):
     """Make an HTTP request to the server.
 
     See also documentation for atom.client.AtomPubClient.request.
@@ -227,6 +409,9 @@ class GDClient(atom.client.AtomPubClient):
                            server sends a 302 redirect, the request method
                            will raise an exception. This parameter is used in
                            recursive request calls to avoid an infinite loop.
+      retry_policy: (optional) RetryPolicy to use for this request instead
+                    of the client's retry_policy. Use NO_RETRIES to send the
+                    request only once.
 
     Any additional arguments are passed through to
     atom.client.AtomPubClient.request.
@@ -240,6 +425,50 @@ class GDClient(atom.client.AtomPubClient):
       body will be converted to the class using
       atom.core.parse.
     """
+    uri = self._apply_gsessionid(uri, http_request)
+    response = self._send_with_retries(
+        retry_policy or self.retry_policy, method, uri, auth_token,
+        http_request, kwargs)
+    return self._handle_response(response, method, uri, auth_token,
+                                 http_request, converter, desired_class,
+                                 redirects_remaining, retry_policy, kwargs)
+
+  Request = request
+
+  def _convert_response(self, response, converter, desired_class):
+    """Converts a successful response with converter or into desired_class."""
+    if converter is not None:
+      return converter(response)
+    # Reuse the XML parsed from a cached response body.
+    cache_entry = getattr(response, 'cache_entry', None)
+    if cache_entry is not None:
+      if self.api_version is not None:
+        return cache_entry.parse(desired_class,
+                                 get_xml_version(self.api_version))
+      return cache_entry.parse(desired_class)
+    if self.api_version is not None:
+      return atom.core.parse(response.read(), desired_class,
+                             version=get_xml_version(self.api_version))
+    else:
+      # No API version was specified, so allow parse to
+      # use the default version.
+      return atom.core.parse(response.read(), desired_class)
+
+  def _parse_converter(self, desired_class, lazy=False, projection=None):
+    """Returns a converter which parses the response with the options.
+
+    See atom.core.parse for the lazy and projection options.
+    """
+    version = 1
+    if self.api_version is not None:
+      version = get_xml_version(self.api_version)
+    def converter(response):
+      return atom.core.parse(response.read(), desired_class, version=version,
+                             lazy=lazy, projection=projection)
+    return converter
+
+  def _apply_gsessionid(self, uri, http_request):
+    """Parses the URI and adds or remembers the Calendar gsession ID."""
     if isinstance(uri, (str, unicode)):
       uri = atom.http_core.Uri.parse_uri(uri)
 
@@ -258,30 +487,29 @@ class GDClient(atom.client.AtomPubClient):
     # URI then add it to the URI.
     elif self.__gsessionid is not None:
       uri.query['gsessionid'] = self.__gsessionid
+    return uri
 
-    # The AtomPubClient should call this class' modify_request before
-    # performing the HTTP request.
-    #http_request = self.modify_request(http_request)
+  def _handle_response(self, response, method, uri, auth_token, http_request,
+                       converter, desired_class, redirects_remaining,
+                       retry_policy, kwargs):
+    """Converts the server's response or raises the matching error.
 
-    response = atom.client.AtomPubClient.request(self, method=method,
-        uri=uri, auth_token=auth_token, http_request=http_request, **kwargs)
+    See request for a description of the arguments.
+    """
     # On success, convert the response body using the desired converter
     # function if present.
     if response is None:
       return None
     if response.status == 200 or response.status == 201:
-      if converter is not None:
-        return converter(response)
-      elif desired_class is not None:
-        if self.api_version is not None:
-          return atom.core.parse(response.read(), desired_class,
-                                 version=get_xml_version(self.api_version))
-        else:
-          # No API version was specified, so allow parse to
-          # use the default version.
-          return atom.core.parse(response.read(), desired_class)
-      else:
+      if converter is None and desired_class is None:
         return response
+      event = getattr(response, 'event', None)
+      if event is None:
+        return self._convert_response(response, converter, desired_class)
+      started = time.time()
+      result = self._convert_response(response, converter, desired_class)
+      event.parsed(started)
+      return result
     # TODO: move the redirect logic into the Google Calendar client once it
     # exists since the redirects are only used in the calendar API.
     elif response.status == 302:
@@ -295,7 +523,7 @@ class GDClient(atom.client.AtomPubClient):
                               auth_token=auth_token, http_request=http_request,
                               converter=converter, desired_class=desired_class,
                               redirects_remaining=redirects_remaining-1,
-                              **kwargs)
+                              retry_policy=retry_policy, **kwargs)
         else:
           raise error_from_response('302 received without Location header',
                                     response, RedirectError)
@@ -318,7 +546,53 @@ class GDClient(atom.client.AtomPubClient):
       raise error_from_response('Server responded with', response,
                                 RequestError)
 
-  Request = request
+  def _send_with_retries(self, policy, method, uri, auth_token, http_request,
+                         kwargs):
+    """Sends the request, retrying failures allowed by the retry policy.
+
+    Returns:
+      The server's response. A response with an error status is returned
+      once no more retries are allowed so that request can raise the
+      appropriate error.
+    """
+    if policy is None or not _is_replayable(http_request):
+      return atom.client.AtomPubClient.request(self, method=method,
+          uri=uri, auth_token=auth_token, http_request=http_request, **kwargs)
+    request_headers = None
+    if http_request is not None:
+      if method is None:
+        method = http_request.method
+      request_headers = http_request.headers
+    started = time.time()
+    attempt = 0
+    while True:
+      attempt += 1
+      # Each attempt is prepared from an unmodified copy of the request.
+      attempt_request = http_request
+      if http_request is not None:
+        attempt_request = http_request._copy()
+      try:
+        response = atom.client.AtomPubClient.request(self, method=method,
+            uri=uri, auth_token=auth_token, http_request=attempt_request,
+            **kwargs)
+      except Exception, error:
+        delay = policy.get_delay(method, attempt, started, error,
+                                 request_headers=request_headers)
+        if delay is None:
+          raise
+        cause = error
+      else:
+        if response is None:
+          return response
+        headers = atom.http_core.get_headers(response)
+        delay = policy.get_delay(method, attempt, started, response.status,
+                                 headers, request_headers)
+        if delay is None:
+          return response
+        cause = response.status
+        # Read the body so the connection can be reused.
+        response.read()
+      policy.wait(method, str(uri or http_request.uri), attempt, delay, cause)
 
   def request_client_login_token(
       self, email, password, source, service=None,
@@ -634,13 +908,53 @@ class GDClient(atom.client.AtomPubClient):
   ModifyRequest = modify_request
 
   def get_feed(self, uri, auth_token=None, converter=None,
-               desired_class=gdata.data.GDFeed, **kwargs):
+               desired_class=gdata.data.GDFeed, lazy=False, projection=None,
+               **kwargs):
+    """Retrieves a feed and converts it into desired_class.
+
+    Args:
+      lazy: boolean (optional) If True, the entries are converted when
+            their members are first used instead of while parsing the feed
+            (see atom.core.parse). Saves time and memory for large feeds of
+            which only a few members are read. Ignored if a converter is
+            given.
+      projection: list of str (optional) The member paths to convert, for
+                  example ['entry.id', 'entry.title', 'entry.link']. All
+                  other elements are skipped (see atom.core.parse). Ignored
+                  if a converter is given.
+    """
+    if ((lazy or projection is not None) and converter is None
+        and desired_class is not None):
+      converter = self._parse_converter(desired_class, lazy, projection)
     return self.request(method='GET', uri=uri, auth_token=auth_token,
                         converter=converter, desired_class=desired_class,
                         **kwargs)
 
   GetFeed = get_feed
 
+  def get_jsonc(self, uri, auth_token=None, **kwargs):
+    """Retrieves a feed or entry as JSON-C instead of XML.
+
+    Adds alt=jsonc to the request and parses the response body directly
+    into a gdata.core.Jsonc object, so no XML is parsed. Only some services
+    (such as YouTube) can send JSON-C.
+
+    Args:
+      uri: str or atom.http_core.Uri The feed or entry to retrieve.
+      auth_token: (optional) An object which sets the Authorization HTTP
+                  header in its modify_request method.
+
+    Any additional arguments are passed through to the request method.
+
+    Returns:
+      A gdata.core.Jsonc object.
+    """
+    return self.request(method='GET', uri=uri, auth_token=auth_token,
+                        converter=_parse_jsonc_response, alt='jsonc',
+                        **kwargs)
+
+  GetJsonc = get_jsonc
+
   def get_entry(self, uri, auth_token=None, converter=None,
                 desired_class=gdata.data.GDEntry, etag=None, **kwargs):
     http_request = atom.http_core.HttpRequest()
@@ -674,6 +988,151 @@ class GDClient(atom.client.AtomPubClient):
 
   GetNext = get_next
 
+  def iter_entries(self, uri_or_feed, desired_class=gdata.data.GDFeed,
+                   auth_token=None, limit=None, resume_token=None,
+                   prefetch=0, **kwargs):
+    """Iterates over the entries in every page of a feed.
+
+    Pages are requested one at a time by following each page's next link
+    (see get_next) when the entries in the previous page have been used up,
+    so only one page of the feed is held in memory no matter how many
+    entries the feed contains.
+
+    If prefetch is set, the following pages are requested and parsed on a
+    worker thread as soon as their URLs are known, so the network round
+    trips overlap with the caller's processing of the current page. The
+    http_client and auth token of this client must then be safe to use
+    from more than one thread (the default clients are).
+
+    Args:
+      uri_or_feed: str, atom.http_core.Uri or a feed object. If a feed is
+          given, iteration begins with the entries already in the feed and
+          continues with the pages which follow it.
+      desired_class: class descended from atom.core.XmlElement used to parse
+          each page of the feed. Defaults to gdata.data.GDFeed.
+      auth_token: (optional) An object which sets the Authorization HTTP
+          header in its modify_request method.
+      limit: int (optional) The maximum number of entries to return.
+      resume_token: (optional) The resume_token from a previous
+          FeedEntryIterator. Iteration continues with the entry that would
+          have been returned next, and uri_or_feed is ignored.
+      prefetch: int (optional) The number of pages which may be fetched
+          ahead of the page being read. The default of 0 fetches each page
+          only when it is needed.
+      kwargs: Other parameters to pass to self.get_feed().
+
+    Returns:
+      A FeedEntryIterator which yields the entries.
+    """
+    return FeedEntryIterator(self, uri_or_feed, desired_class=desired_class,
+                             auth_token=auth_token, limit=limit,
+                             resume_token=resume_token, prefetch=prefetch,
+                             **kwargs)
+
+  IterEntries = iter_entries
+
+  def iter_sharded_entries(self, uri, desired_class=gdata.data.GDFeed,
+                           auth_token=None, workers=4, ordered=True,
+                           **kwargs):
+    """Fetches the pages of a feed concurrently using start-index ranges.
+
+    The first page is requested as usual. If it reports
+    openSearch:totalResults, the remaining results are split into
+    start-index windows of openSearch:itemsPerPage entries and the windows
+    are requested at the same time on a pool of worker threads. Feeds which
+    do not report totalResults are read page by page using iter_entries.
+
+    As with any start-index query, the service does not guarantee that the
+    windows are consistent with each other if the feed changes while it is
+    being read.
+
+    Args:
+      uri: str or atom.http_core.Uri The URL of the feed. Query parameters
+          may be given in the URL or as gdata.client.Query objects in
+          kwargs.
+      desired_class: class descended from atom.core.XmlElement used to parse
+          each page of the feed. Defaults to gdata.data.GDFeed.
+      auth_token: (optional) An object which sets the Authorization HTTP
+          header in its modify_request method.
+      workers: int The largest number of pages to request at once.
+      ordered: bool If True (the default) the entries are returned in feed
+          order. If False the entries in each page are returned as soon as
+          the page arrives.
+      kwargs: Other parameters to pass to self.get_feed().
+
+    Returns:
+      A generator which yields the entries. An error fetching any page is
+      raised from the generator.
+    """
+    first = self.get_feed(uri, auth_token=auth_token,
+                          desired_class=desired_class, **kwargs)
+    windows = _start_index_windows(first)
+    if windows is None:
+      return iter(self.iter_entries(first, desired_class=desired_class,
+                                    auth_token=auth_token, **kwargs))
+    def fetch_window(window):
+      start_index, max_results = window
+      shard_uri, shard_kwargs = _with_start_index(uri, kwargs, start_index,
+                                                  max_results)
+      return self.get_feed(shard_uri, auth_token=auth_token,
+                           desired_class=desired_class, **shard_kwargs)
+    return _iter_sharded_entries(first, fetch_window, windows, workers,
+                                 ordered)
+
+  IterShardedEntries = iter_sharded_entries
+
+  def open_stream(self, uri, auth_token=None, chunk_size=None, progress=None,
+                  **kwargs):
+    """Requests a URL and returns its response body as a file-like object.
+
+    The body is not read until the caller reads from the returned object,
+    so large downloads can be passed on in pieces without holding all of
+    the content in memory.
+
+    Args:
+      uri: str or atom.http_core.Uri The URL to download.
+      auth_token: (optional) An object which sets the Authorization HTTP
+          header in its modify_request method.
+      chunk_size: int (optional) The number of bytes read at a time when
+          iterating over the stream. Defaults to DOWNLOAD_CHUNK_SIZE.
+      progress: function (optional) Called as progress(bytes_read,
+          total_bytes) after each read. total_bytes is None if the server
+          did not send a Content-Length.
+      kwargs: Other parameters to pass to self.request().
+
+    Returns:
+      A DownloadStream. The caller should close it if the body is not read
+      to the end.
+
+    Raises:
+      RequestError if the server's response is not a 200.
+    """
+    response = self.request('GET', uri, auth_token=auth_token, **kwargs)
+    if response.status != 200:
+      raise error_from_response('Download failed', response, RequestError)
+    return DownloadStream(response, chunk_size=chunk_size, progress=progress)
+
+  OpenStream = open_stream
+
+  def download_to_file(self, uri, file_path, auth_token=None,
+                       chunk_size=None, progress=None, **kwargs):
+    """Saves the body of a URL to a file, one chunk at a time.
+
+    Args:
+      uri: str or atom.http_core.Uri The URL to download.
+      file_path: str The path of the file to write.
+      See open_stream for the other arguments.
+
+    Returns:
+      The number of bytes written.
+    """
+    stream = self.open_stream(uri, auth_token=auth_token,
+                              chunk_size=chunk_size, progress=progress,
+                              **kwargs)
+    return stream.save(file_path)
+
+  DownloadToFile = download_to_file
+
   # TODO: add a refresh method to re-fetch the entry/feed from the server
   # if it has been updated.
 
@@ -682,15 +1141,23 @@ class GDClient(atom.client.AtomPubClient):
     if converter is None and desired_class is None:
       desired_class = entry.__class__
     http_request = atom.http_core.HttpRequest()
-    http_request.add_body_part(
-        entry.to_string(get_xml_version(self.api_version)),
-        'application/atom+xml')
+    self._add_xml_body(http_request, entry)
     return self.request(method='POST', uri=uri, auth_token=auth_token,
                         http_request=http_request, converter=converter,
                         desired_class=desired_class, **kwargs)
 
   Post = post
 
+  def _add_xml_body(self, http_request, element):
+    """Adds the XML for element as the body of the request."""
+    version = get_xml_version(self.api_version)
+    if self.stream_xml:
+      http_request.add_body_part(atom.core.XmlStream(element, version),
+                                 'application/atom+xml')
+    else:
+      http_request.add_body_part(element.to_string(version),
+                                 'application/atom+xml')
+
   def update(self, entry, auth_token=None, force=False, uri=None, **kwargs):
     """Edits the entry on the server by sending the XML for this entry.
 
@@ -713,9 +1180,7 @@ class GDClient(atom.client.AtomPubClient):
       A new Entry object of a matching type to the entry which was passed in.
     """
     http_request = atom.http_core.HttpRequest()
-    http_request.add_body_part(
-        entry.to_string(get_xml_version(self.api_version)),
-        'application/atom+xml')
+    self._add_xml_body(http_request, entry)
     # Include the ETag in the request if present.
     if force:
       http_request.headers['If-Match'] = '*'
@@ -771,9 +1236,7 @@ class GDClient(atom.client.AtomPubClient):
           among others.
     """
     http_request = atom.http_core.HttpRequest()
-    http_request.add_body_part(
-        feed.to_string(get_xml_version(self.api_version)),
-        'application/atom+xml')
+    self._add_xml_body(http_request, feed)
     if force:
       http_request.headers['If-Match'] = '*'
     elif hasattr(feed, 'etag') and feed.etag:
@@ -792,6 +1255,701 @@ class GDClient(atom.client.AtomPubClient):
   # or feed.
 
 
+class AsyncGDClient(GDClient):
+  """A GDClient whose requests run concurrently on a single thread.
+
+  The request method, and so get_feed, get_entry, post, update, delete,
+  batch and the other methods which return its result, return an
+  atom.http_async.Future instead of waiting for the server. The future's
+  result is what GDClient would have returned, and result raises the same
+  errors. Requests are sent by an atom.http_async.AsyncHttpClient, which
+  must be passed as the http_client keyword argument if a non-default one
+  is wanted.
+
+  Usage:
+    >>> client = gdata.client.AsyncGDClient(
+    ...     http_client=atom.http_async.AsyncHttpClient(max_per_host=50),
+    ...     auth_token=token)
+    >>> futures = [client.get_feed(uri) for uri in uris]
+    >>> client.http_client.run(futures)
+    >>> feeds = [future.result() for future in futures]
+
+  Service clients can be made asynchronous by listing this class first:
+    class AsyncContactsClient(gdata.client.AsyncGDClient,
+                              gdata.contacts.client.ContactsClient):
+      pass
+
+  An OAuth2Token auth token with a refresh token is refreshed before it
+  expires and after a 401 response, as OAuth2Token.authorize does for
+  other clients, with the refresh request sent on the event loop. Only one
+  refresh is made at a time for each token. Tokens which refresh in some
+  other way (such as OAuth2TokenFromCredentials) are not refreshed.
+
+  The retry_policy, response_cache and rate_limiter of the client are not
+  used, since they would block the event loop.
+  """
+
+  def __init__(self, *args, **kwargs):
+    if kwargs.get('http_client') is None:
+      kwargs['http_client'] = atom.http_async.AsyncHttpClient()
+    super(AsyncGDClient, self).__init__(*args, **kwargs)
+    # Maps id(token) to the Future of the token's refresh in progress.
+    self._refreshes = {}
+
+  def request(self, method=None, uri=None, auth_token=None,
+              http_request=None, converter=None, desired_class=None,
+              redirects_remaining=4, retry_policy=None, **kwargs):
+    """Starts the request, see GDClient.request.
+
+    Returns:
+      An atom.http_async.Future for the result of GDClient.request.
+    """
+    try:
+      uri = self._apply_gsessionid(uri, http_request)
+      prepared = self._prepare_request(method, uri, auth_token, http_request,
+                                       **kwargs)
+    except Exception:
+      future = atom.http_async.Future(self.http_client)
+      future.set_exception(sys.exc_info())
+      return future
+    def handle_response(response):
+      return self._handle_response(response, method, uri, auth_token,
+                                   http_request, converter, desired_class,
+                                   redirects_remaining, retry_policy, kwargs)
+    return self._send_authorized(prepared, auth_token or self.auth_token).then(
+        handle_response)
+
+  Request = request
+
+  def _send_authorized(self, http_request, token):
+    """Starts the request, refreshing an OAuth2Token when it is needed.
+
+    Returns:
+      An atom.http_async.Future for the response.
+    """
+    if (not _refreshes_on_loop(token)
+        or gdata.gauth._bearer_token(http_request) is None):
+      return self.http_client.start_request(http_request)
+
+    def send(ignored=None):
+      if gdata.gauth._bearer_token(http_request) != token.access_token:
+        token.modify_request(http_request)
+      return self.http_client.start_request(http_request)
+
+    def refresh_after_401(response):
+      if response.status != 401 or token.invalid:
+        return response
+      def resend(ignored):
+        if token.invalid:
+          return response
+        return send()
+      return self._refresh(
+          token, gdata.gauth._bearer_token(http_request)).then(resend)
+
+    if token._expires_soon() and not token.invalid:
+      sent = self._refresh(token, token.access_token).then(send)
+    else:
+      sent = send()
+    return sent.then(refresh_after_401)
+
+  def _refresh(self, token, stale_access_token):
+    """Starts refreshing the token unless it has changed or is refreshing.
+
+    Returns:
+      An atom.http_async.Future which is done once the token is refreshed.
+    """
+    pending = self._refreshes.get(id(token))
+    if pending is not None:
+      return pending
+    if token.access_token != stale_access_token:
+      done = atom.http_async.Future(self.http_client)
+      done.set_result(None)
+      return done
+    pending = self.http_client.start_request(
+        token._make_refresh_request()).then(token._handle_refresh_response)
+    self._refreshes[id(token)] = pending
+    pending.add_done_callback(
+        lambda future: self._refreshes.pop(id(token), None))
+    return pending
+
+
+def _refreshes_on_loop(token):
+  """Determines if AsyncGDClient can refresh the token on its event loop."""
+  return (isinstance(token, gdata.gauth.OAuth2Token)
+          and bool(token.refresh_token)
+          and type(token)._refresh.im_func
+              is gdata.gauth.OAuth2Token._refresh.im_func)
+
+
+def _parse_jsonc_response(response):
+  return gdata.core.parse_json(response.read())
+
+
+class FeedEntryIterator(object):
+  """Yields the entries of a feed, requesting each page only when needed.
+
+  Created by GDClient.iter_entries.
+
+  Members:
+    feed: The page of the feed which contains the most recently returned
+        entry.
+    resume_token: A tuple of (page URI, offset) which identifies the next
+        entry to be returned, or None if there are no more entries. The
+        token can be stored and later passed to GDClient.iter_entries to
+        continue where this iterator stopped. If iteration began with a
+        feed object which has no self link, the token is None until the
+        following page has been requested.
+  """
+
+  def __init__(self, client, uri_or_feed, desired_class=gdata.data.GDFeed,
+               auth_token=None, limit=None, resume_token=None, prefetch=0,
+               **kwargs):
+    self.client = client
+    self.desired_class = desired_class
+    self.auth_token = auth_token
+    self.limit = limit
+    self.prefetch = prefetch
+    self.kwargs = kwargs
+    self.feed = None
+    self.count = 0
+    self._offset = 0
+    self._prefetcher = None
+    if resume_token is not None:
+      self._page_uri, self._offset = resume_token
+    elif isinstance(uri_or_feed, (str, unicode, atom.http_core.Uri)):
+      self._page_uri = str(uri_or_feed)
+    else:
+      self.feed = uri_or_feed
+      self._page_uri = uri_or_feed.find_self_link()
+
+  def __iter__(self):
+    return self
+
+  def next(self):
+    if self.limit is not None and self.count >= self.limit:
+      self.close()
+      raise StopIteration
+    while True:
+      if self.feed is None:
+        if self._page_uri is None:
+          raise StopIteration
+        if self._prefetcher is not None:
+          self._page_uri, self.feed = self._prefetcher.get()
+          if self.feed is None:
+            raise StopIteration
+        else:
+          self.feed = self._fetch_page(self._page_uri)
+      if self.prefetch and self._prefetcher is None:
+        next_uri = self.feed.find_next_link()
+        if next_uri is not None:
+          self._prefetcher = _PagePrefetcher(self, next_uri, self.prefetch)
+      if self._offset < len(self.feed.entry):
+        entry = self.feed.entry[self._offset]
+        self._offset += 1
+        self.count += 1
+        return entry
+      # This page has been used up, move on to the next one.
+      self._page_uri = self.feed.find_next_link()
+      self._offset = 0
+      self.feed = None
+
+  def _get_resume_token(self):
+    if (self.feed is not None and self._offset >= len(self.feed.entry)):
+      next_uri = self.feed.find_next_link()
+      if next_uri is None:
+        return None
+      return (next_uri, 0)
+    if self._page_uri is None:
+      return None
+    return (self._page_uri, self._offset)
+
+  resume_token = property(_get_resume_token)
+
+  def _fetch_page(self, uri):
+    return self.client.get_feed(uri, auth_token=self.auth_token,
+                                desired_class=self.desired_class,
+                                **self.kwargs)
+
+  def close(self):
+    """Stops fetching pages in the background.
+
+    Pages are also no longer fetched once the iterator has been garbage
+    collected, so this only makes the worker thread stop sooner.
+    """
+    if self._prefetcher is not None:
+      self._prefetcher.stop()
+
+
+class _PagePrefetcher(object):
+  """Fetches the pages of a feed on a worker thread ahead of the reader.
+
+  Pages are fetched in order by following each page's next link. At most
+  depth pages are fetched, or being fetched, before the reader has taken
+  them with get.
+
+  The worker thread only holds a weak reference to the FeedEntryIterator,
+  so an iterator which is abandoned without being closed can be garbage
+  collected, which stops the worker.
+  """
+
+  def __init__(self, iterator, uri, depth):
+    self._pages = Queue.Queue()
+    # Each page which has been fetched but not read holds one slot.
+    self._slots = Queue.Queue(max(depth, 1))
+    self._stopped = threading.Event()
+    # The callback must not refer to self, or the iterator would keep the
+    # prefetcher alive through it.
+    stopped = self._stopped
+    self._iterator = weakref.ref(iterator, lambda ref: stopped.set())
+    self._finished = False
+    self._thread = threading.Thread(target=self._run, args=(uri,))
+    self._thread.setDaemon(True)
+    self._thread.start()
+
+  def _run(self, uri):
+    while uri is not None:
+      if not self._wait_for_slot():
+        return
+      iterator = self._iterator()
+      if iterator is None:
+        return
+      try:
+        feed = iterator._fetch_page(uri)
+      except Exception:
+        self._pages.put((uri, None, sys.exc_info()))
+        return
+      del iterator
+      self._pages.put((uri, feed, None))
+      uri = feed.find_next_link()
+    self._pages.put((None, None, None))
+
+  def _wait_for_slot(self):
+    while not self._stopped.isSet():
+      try:
+        self._slots.put(None, True, 0.5)
+        return True
+      except Queue.Full:
+        pass
+    return False
+
+  def get(self):
+    """Returns the next (uri, feed) pair, or (None, None) at the end.
+
+    Raises the exception from the worker thread if fetching a page failed.
+    """
+    if self._finished:
+      return None, None
+    uri, feed, error = self._pages.get()
+    self._slots.get()
+    if feed is None:
+      self._finished = True
+    if error is not None:
+      raise error[0], error[1], error[2]
+    return uri, feed
+
+  def stop(self):
+    self._stopped.set()
+
+
+class BatchExecutor(object):
+  """Runs any number of batch operations as concurrent batch requests.
+
+  Operations are added with add_insert, add_update, add_delete and add_query
+  and are sent when execute is called. They are split into batch feeds of at
+  most max_entries entries and about max_bytes bytes, and the feeds are
+  POSTed by up to workers threads at once. Operations which fail with one
+  of the retry_codes, or which the server did not get to because the batch
+  was interrupted, are sent again in a later round.
+
+  Usage:
+
+    executor = gdata.client.BatchExecutor(client, batch_url)
+    for product in products:
+      executor.add_insert(product)
+    for result in executor.execute():
+      if result is None or result.batch_status.code != '201':
+        ...
+  """
+  max_entries = 100
+  max_bytes = 1000000
+  workers = 4
+  max_attempts = 3
+  retry_codes = (500, 502, 503, 504)
+  retry_delay = 1
+
+  def __init__(self, client, uri, feed_class=gdata.data.BatchFeed,
+               auth_token=None, max_entries=None, max_bytes=None,
+               workers=None, max_attempts=None, **kwargs):
+    """Creates an executor which sends batch requests using client.
+
+    Args:
+      client: gdata.client.GDClient The client used to send the requests.
+      uri: str or atom.http_core.Uri The batch URL of the feed.
+      feed_class: The gdata.data.BatchFeed subclass used for the request
+          and response feeds.
+      auth_token: (optional) An object which sets the Authorization HTTP
+          header in its modify_request method.
+      max_entries: int (optional) The most operations to send in one request.
+      max_bytes: int (optional) The approximate size limit of each request.
+          A single operation larger than this is sent on its own.
+      workers: int (optional) The most requests to send at the same time.
+      max_attempts: int (optional) The number of times an operation is sent
+          before its failure is returned.
+      kwargs: Other parameters to pass to client.post().
+    """
+    self.client = client
+    self.uri = uri
+    self.feed_class = feed_class
+    self.auth_token = auth_token
+    if max_entries is not None:
+      self.max_entries = max_entries
+    if max_bytes is not None:
+      self.max_bytes = max_bytes
+    if workers is not None:
+      self.workers = workers
+    if max_attempts is not None:
+      self.max_attempts = max_attempts
+    self.kwargs = kwargs
+    self.operations = []
+
+  def add(self, entry, operation):
+    """Adds an operation and returns its position in the results."""
+    self.operations.append((entry, operation))
+    return len(self.operations) - 1
+
+  Add = add
+
+  def add_insert(self, entry):
+    return self.add(entry, gdata.data.BATCH_INSERT)
+
+  AddInsert = add_insert
+
+  def add_update(self, entry):
+    return self.add(entry, gdata.data.BATCH_UPDATE)
+
+  AddUpdate = add_update
+
+  def add_delete(self, url_string=None, entry=None):
+    return self.add(_batch_entry(url_string, entry), gdata.data.BATCH_DELETE)
+
+  AddDelete = add_delete
+
+  def add_query(self, url_string=None, entry=None):
+    return self.add(_batch_entry(url_string, entry), gdata.data.BATCH_QUERY)
+
+  AddQuery = add_query
+
+  def execute(self):
+    """Sends every operation which has been added.
+
+    Returns:
+      A list with the response entry for each operation, in the order in
+      which the operations were added. The batch_status of each entry holds
+      the outcome of its operation and its batch_id is the one given to the
+      operation by the caller, if any. An operation which the server never
+      answered has None in its place.
+
+    Raises:
+      RequestError if a batch request fails with a status which is not
+      retried.
+    """
+    version = get_xml_version(self.client.api_version)
+    results = [None] * len(self.operations)
+    pending = range(len(self.operations))
+    caller_ids = [entry.batch_id for entry, operation in self.operations]
+    # The XML of each operation, which is only created once since the
+    # entries are not changed while they are being sent.
+    serialized = {}
+    for attempt in xrange(self.max_attempts):
+      if not pending:
+        break
+      if attempt:
+        time.sleep(self.retry_delay * 2 ** (attempt - 1))
+      last_attempt = attempt == self.max_attempts - 1
+      retry = []
+      chunks = self._split(pending, version, serialized)
+      send = lambda positions: self._send(positions, version, serialized)
+      for index, response, error in _run_concurrently(send, chunks,
+                                                      self.workers):
+        if error is not None:
+          if (getattr(error[1], 'status', None) in self.retry_codes
+              and not last_attempt):
+            retry.extend(chunks[index])
+            continue
+          raise error[0], error[1], error[2]
+        for position, result in self._match(chunks[index], response):
+          if result is not None:
+            results[position] = result
+          if not last_attempt and (result is None
+                                   or self._should_retry(result)):
+            retry.append(position)
+      pending = sorted(retry)
+    for result, batch_id in zip(results, caller_ids):
+      if result is not None:
+        result.batch_id = batch_id
+    return results
+
+  Execute = execute
+
+  def _split(self, positions, version, serialized):
+    """Groups operations into lists which each fit in one batch request.
+
+    Args:
+      positions: list of int The operations to send.
+      version: int The XML version of the requests.
+      serialized: dict Maps positions to the XML of their entries, which is
+          added to for operations which have not been serialized before.
+
+    Returns:
+      A list of lists of positions.
+    """
+    overhead = len(self.feed_class().to_string(version))
+    chunks = []
+    chunk = []
+    size = overhead
+    for position in positions:
+      if position not in serialized:
+        serialized[position] = self._serialize(position, version)
+      entry_size = len(serialized[position])
+      if chunk and (len(chunk) >= self.max_entries
+                    or size + entry_size > self.max_bytes):
+        chunks.append(chunk)
+        chunk = []
+        size = overhead
+      chunk.append(position)
+      size += entry_size
+    if chunk:
+      chunks.append(chunk)
+    return chunks
+
+  def _serialize(self, position, version):
+    """Returns the XML for an operation without changing the caller's entry.
+
+    The batch id and operation are only set on the entry while it is
+    converted to XML.
+    """
+    entry, operation = self.operations[position]
+    caller_id = entry.batch_id
+    caller_operation = entry.batch_operation
+    entry.batch_id = gdata.data.BatchId(text=str(position))
+    entry.batch_operation = gdata.data.BatchOperation(type=operation)
+    try:
+      return entry.to_string(version)
+    finally:
+      entry.batch_id = caller_id
+      entry.batch_operation = caller_operation
+
+  def _send(self, positions, version, serialized):
+    # The entry XML is placed between the start and end tags of an empty
+    # feed. Each entry declares the namespaces it uses.
+    feed = self.feed_class(text=_ENTRIES_MARKER)
+    start, end = feed.to_string(version).split(_ENTRIES_MARKER)
+    parts = [start] + [serialized[position] for position in positions] + [end]
+    http_request = atom.http_core.HttpRequest()
+    if self.client.stream_xml:
+      http_request.add_body_part(parts, 'application/atom+xml')
+    else:
+      http_request.add_body_part(''.join(parts), 'application/atom+xml')
+    return self.client.request(method='POST', uri=self.uri,
+                               auth_token=self.auth_token,
+                               http_request=http_request,
+                               desired_class=self.feed_class, **self.kwargs)
+
+  def _match(self, positions, response):
+    """Pairs each position in a request with its response entry or None."""
+    by_id = {}
+    for entry in response.entry:
+      if entry.batch_id is not None and entry.batch_id.text:
+        by_id[entry.batch_id.text.strip()] = entry
+    return [(position, by_id.get(str(position))) for position in positions]
+
+  def _should_retry(self, result):
+    if result.batch_status is None or not result.batch_status.code:
+      return False
+    try:
+      return int(result.batch_status.code) in self.retry_codes
+    except ValueError:
+      return False
+
+
+# Stands in for the entries in a batch feed until they are added.
+_ENTRIES_MARKER = '\x00entries\x00'
+
+
+def _batch_entry(url_string, entry):
+  if entry is None and url_string is None:
+    raise gdata.data.MissingRequiredParameters(
+        'supply either an entry or URL string')
+  if entry is None:
+    entry = gdata.data.BatchEntry(id=atom.data.Id(text=url_string))
+  return entry
+
+
+class DownloadStream(object):
+  """A file-like view of an HTTP response body which is read in chunks.
+
+  Iterating over a DownloadStream yields the body chunk_size bytes at a
+  time.
+  """
+
+  def __init__(self, response, chunk_size=None, progress=None):
+    self.response = response
+    self.chunk_size = chunk_size or DOWNLOAD_CHUNK_SIZE
+    self.progress = progress
+    self.bytes_read = 0
+    self.total_bytes = None
+    length = (response.getheader('content-length', None)
+              or response.getheader('Content-Length', None))
+    if length:
+      self.total_bytes = int(length)
+
+  def read(self, size=None):
+    """Reads size bytes, or the rest of the body if size is None."""
+    if size is None or size < 0:
+      data = self.response.read()
+    else:
+      data = self.response.read(size)
+    if data:
+      self.bytes_read += len(data)
+      if self.progress is not None:
+        self.progress(self.bytes_read, self.total_bytes)
+    return data
+
+  def __iter__(self):
+    while True:
+      chunk = self.read(self.chunk_size)
+      if not chunk:
+        return
+      yield chunk
+
+  def save(self, file_path):
+    """Writes the rest of the body to a file and closes the stream.
+
+    Returns:
+      The number of bytes written.
+    """
+    start = self.bytes_read
+    try:
+      f = open(file_path, 'wb')
+      try:
+        for chunk in self:
+          f.write(chunk)
+      finally:
+        f.close()
+    finally:
+      self.close()
+    return self.bytes_read - start
+
+  def close(self):
+    if hasattr(self.response, 'close'):
+      self.response.close()
+
+  def getheader(self, name, default=None):
+    return self.response.getheader(name, default)
+
+  status = property(lambda self: self.response.status)
+  reason = property(lambda self: self.response.reason)
+
+
+def _start_index_windows(feed):
+  """Lists the (start_index, max_results) windows which follow a feed page.
+
+  Returns None if the feed does not say how many results it contains.
+  """
+  if feed.total_results is None or not feed.total_results.text:
+    return None
+  total = int(feed.total_results.text)
+  if feed.items_per_page is not None and feed.items_per_page.text:
+    per_page = int(feed.items_per_page.text)
+  else:
+    per_page = len(feed.entry)
+  if per_page < 1:
+    return []
+  first_index = 1
+  if feed.start_index is not None and feed.start_index.text:
+    first_index = int(feed.start_index.text)
+  return [(start, per_page)
+          for start in xrange(first_index + per_page, total + 1, per_page)]
+
+
+def _with_start_index(uri, kwargs, start_index, max_results):
+  """Copies request parameters, changing the requested range of results."""
+  if isinstance(uri, (str, unicode)):
+    uri = atom.http_core.Uri.parse_uri(uri)
+  else:
+    uri = atom.http_core.Uri(uri.scheme, uri.host, uri.port, uri.path,
+                             uri.query.copy())
+  uri.query['start-index'] = str(start_index)
+  uri.query['max-results'] = str(max_results)
+  shard_kwargs = {}
+  for name, value in kwargs.iteritems():
+    # A Query would replace the range in the URL, so it gets a copy with
+    # the new range instead.
+    if isinstance(value, Query):
+      value = copy.copy(value)
+      value.start_index = start_index
+      value.max_results = max_results
+    shard_kwargs[name] = value
+  return uri, shard_kwargs
+
+
+def _iter_sharded_entries(first, fetch_window, windows, workers, ordered):
+  for entry in first.entry:
+    yield entry
+  pending = {}
+  next_index = 0
+  for index, feed, error in _run_concurrently(fetch_window, windows,
+                                              workers):
+    if error is not None:
+      raise error[0], error[1], error[2]
+    if not ordered:
+      for entry in feed.entry:
+        yield entry
+      continue
+    pending[index] = feed
+    while next_index in pending:
+      for entry in pending.pop(next_index).entry:
+        yield entry
+      next_index += 1
+
+
+def _run_concurrently(function, items, workers):
+  """Calls function on each item using a pool of worker threads.
+
+  Yields (index, result, exc_info) tuples in the order in which the calls
+  finish, where index is the position of the item in items and exc_info is
+  None unless the call raised an exception. Once the generator is closed
+  the workers do not start any more calls.
+  """
+  tasks = Queue.Queue()
+  for task in enumerate(items):
+    tasks.put(task)
+  count = tasks.qsize()
+  results = Queue.Queue()
+  stopped = threading.Event()
+
+  def work():
+    while not stopped.isSet():
+      try:
+        index, item = tasks.get_nowait()
+      except Queue.Empty:
+        return
+      try:
+        results.put((index, function(item), None))
+      except Exception:
+        results.put((index, None, sys.exc_info()))
+
+  for i in xrange(min(max(workers, 1), count)):
+    worker = threading.Thread(target=work)
+    worker.setDaemon(True)
+    worker.start()
+  try:
+    for i in xrange(count):
+      yield results.get()
+  finally:
+    stopped.set()
+
+
 def _add_query_param(param_string, value, http_request):
   if value:
     http_request.uri.query[param_string] = value
@@ -913,7 +2071,7 @@ class ResumableUploader(object):
   MIN_CHUNK_SIZE = 262144 # 256KB
 
   def __init__(self, client, file_handle, content_type, total_file_size,
-               chunk_size=None, desired_class=None):
+               chunk_size=None, desired_class=None, retry_policy=None):
     """Starts a resumable upload to a service that supports the protocol.
 
     Args:
@@ -925,6 +2083,10 @@ class ResumableUploader(object):
           DEFAULT_CHUNK_SIZE will be used.
       desired_class: object (optional) The type of gdata.data.GDEntry to parse
           the completed entry as. This should be specific to the API.
+      retry_policy: RetryPolicy (optional) Decides when a chunk which failed
+          is sent again. upload_file then resumes from the last byte the
+          server received, which requires a seekable file_handle. Defaults
+          to the client's retry_policy.
     """
     self.client = client
     self.file_handle = file_handle
@@ -935,6 +2097,7 @@ class ResumableUploader(object):
       self.chunk_size = self.MIN_CHUNK_SIZE
     self.desired_class = desired_class or gdata.data.GDEntry
     self.upload_uri = None
+    self.retry_policy = retry_policy or getattr(client, 'retry_policy', None)
 
     # Send the entire file if the chunk size is less than fize's total size.
     if self.total_file_size <= self.chunk_size:
@@ -1016,6 +2179,17 @@ class ResumableUploader(object):
       server returns something other than an HTTP 308 when the upload is
       incomplete.
     """
+    return self._send_chunk(start_byte, content_bytes)[0]
+
+  UploadChunk = upload_chunk
+
+  def _send_chunk(self, start_byte, content_bytes):
+    """Uploads a chunk, see upload_chunk.
+
+    Returns:
+      A tuple of the final entry, or None if the upload is incomplete, and
+      the offset of the next byte which the server expects.
+    """
     if self.upload_uri is None:
       raise RequestError('Resumable upload request not initialized.')
 
@@ -1033,18 +2207,20 @@ class ResumableUploader(object):
                                                 self.total_file_size))
 
     try:
+      # Chunks are retried by upload_file, which first asks the server how
+      # much of the chunk it received.
       response = self.client.request(method='PUT', uri=self.upload_uri,
                                      http_request=http_request,
-                                     desired_class=self.desired_class)
-      return response
+                                     desired_class=self.desired_class,
+                                     retry_policy=NO_RETRIES)
+      return response, start_byte + len(content_bytes)
     except RequestError, error:
       if error.status == 308:
-        return None
+        # The Range header says how much of the chunk the server kept.
+        return None, _next_byte_from_headers(error.headers)
       else:
         raise error
 
-  UploadChunk = upload_chunk
-
   def upload_file(self, resumable_media_link, entry=None, headers=None,
                   auth_token=None, **kwargs):
     """Uploads an entire file in chunks using the resumable upload protocol.
@@ -1076,19 +2252,58 @@ class ResumableUploader(object):
     """
     self._init_session(resumable_media_link, headers=headers,
                        auth_token=auth_token, entry=entry, **kwargs)
+    return self._upload_chunks(0)
 
-    start_byte = 0
+  UploadFile = upload_file
+
+  def _upload_chunks(self, start_byte, throttle=None):
+    """Uploads the rest of the file, retrying chunks which fail.
+
+    Args:
+      start_byte: int The offset to start from, which file_handle must be
+          positioned at.
+      throttle: (optional) A function which is called with the size of each
+          chunk before the chunk is sent.
+
+    Returns:
+      The final Atom entry created on the server.
+    """
     entry = None
+    attempt = 0
+    started = time.time()
 
     while not entry:
-      entry = self.upload_chunk(
-          start_byte, self.file_handle.read(self.chunk_size))
-      start_byte += self.chunk_size
+      data = self.file_handle.read(self.chunk_size)
+      if throttle is not None:
+        throttle(len(data))
+      try:
+        entry, next_byte = self._send_chunk(start_byte, data)
+      except (socket.error, httplib.HTTPException, RequestError), error:
+        attempt += 1
+        delay = None
+        if self.retry_policy is not None:
+          # The chunk is only sent again from the byte which the server
+          # reports, so the PUT is safe to repeat.
+          delay = self.retry_policy.get_delay('PUT', attempt, started, error,
+                                              getattr(error, 'headers', None),
+                                              idempotent=True)
+        if delay is None:
+          raise
+        self.retry_policy.wait('PUT', self.upload_uri, attempt, delay, error)
+        next_byte = self.query_upload_status()
+        if next_byte is True:
+          raise RequestError('Upload completed but the entry was not received')
+      else:
+        if entry is None and not data:
+          raise RequestError('The server did not accept the last chunk')
+        attempt = 0
+        started = time.time()
+      if next_byte != start_byte + len(data):
+        self.file_handle.seek(next_byte)
+      start_byte = next_byte
 
     return entry
 
-  UploadFile = upload_file
-
   def update_file(self, entry_or_resumable_edit_link, headers=None, force=False,
                   auth_token=None, update_metadata=False, uri_params=None):
     """Updates the contents of an existing file using the resumable protocol.
@@ -1185,10 +2400,480 @@ class ResumableUploader(object):
             '%s returned by server' % response.status, response, RequestError)
     except RequestError, error:
       if error.status == 308:
-        for pair in error.headers:
-          if pair[0].capitalize() == 'Range':
-            return int(pair[1].split('-')[1]) + 1
+        return _next_byte_from_headers(error.headers)
       else:
         raise error
 
   QueryUploadStatus = query_upload_status
+
+
+class PipelinedResumableUploader(ResumableUploader):
+  """Resumable uploader which keeps the connection busy between chunks.
+
+  The protocol requires each chunk to be acknowledged before the next one
+  is sent, so the time spent reading the file is taken out of the loop
+  instead: a worker thread reads the next chunk while the current one is
+  being sent. The chunks of one upload are sent over a single persistent
+  connection, the chunk size is adjusted so that each chunk takes about
+  target_chunk_seconds to send, and after a network error or a 5xx
+  response the upload continues from the byte the server reports having
+  received, using the bytes already read from the file.
+  """
+  # Adaptive chunk sizes are kept between MIN_CHUNK_SIZE and this.
+  MAX_CHUNK_SIZE = 67108864  # 64MB
+  target_chunk_seconds = 10
+  adaptive = True
+  max_retries = 5
+  retry_delay = 1
+  retry_codes = (500, 502, 503, 504)
+
+  def __init__(self, client, file_handle, content_type, total_file_size,
+               chunk_size=None, desired_class=None, http_client=None,
+               retry_policy=None):
+    """Starts a pipelined resumable upload.
+
+    Args:
+      http_client: (optional) The HTTP client used for the requests in this
+          upload session. If None and the client uses the default
+          HttpClient without a proxy, a PooledHttpClient which holds a
+          single connection is used.
+      See ResumableUploader for the other arguments.
+    """
+    ResumableUploader.__init__(self, client, file_handle, content_type,
+                               total_file_size, chunk_size=chunk_size,
+                               desired_class=desired_class,
+                               retry_policy=retry_policy)
+    if http_client is None and _uses_default_http_client(client):
+      http_client = atom.http_core.PooledHttpClient(max_per_host=1)
+    if http_client is not None:
+      # The requests of this session use their own copy of the client so
+      # that the connection is not shared with other requests.
+      self.client = copy.copy(client)
+      self.client.http_client = http_client
+
+  def upload_file(self, resumable_media_link, entry=None, headers=None,
+                  auth_token=None, **kwargs):
+    """Uploads an entire file using the resumable upload protocol.
+
+    See ResumableUploader.upload_file.
+    """
+    self._init_session(resumable_media_link, headers=headers,
+                       auth_token=auth_token, entry=entry, **kwargs)
+    reader = _ReadAhead(self.file_handle, self.MIN_CHUNK_SIZE,
+                        self.chunk_size)
+    try:
+      return self._upload_from(reader, 0)
+    finally:
+      reader.stop()
+      if hasattr(self.client.http_client, 'close'):
+        self.client.http_client.close()
+
+  UploadFile = upload_file
+
+  def _upload_from(self, reader, start_byte):
+    data = ''
+    retries = 0
+    # The time of the first attempt since the last chunk was accepted, which
+    # the retry policy's deadline is measured from.
+    first_failure = None
+    # After a failure the server is asked how much it has received before
+    # the rest of the chunk is sent again.
+    query = False
+    while True:
+      if len(data) < self.chunk_size:
+        data += reader.read(self.chunk_size - len(data))
+      sent = 0
+      chunk_started = time.time()
+      try:
+        if query:
+          entry, next_byte = self._query_status()
+          query = False
+        else:
+          entry, next_byte = self._put_chunk(start_byte, data)
+          sent = len(data)
+          retries = 0
+          first_failure = None
+      except (socket.error, httplib.HTTPException, RequestError), error:
+        retries += 1
+        if first_failure is None:
+          first_failure = chunk_started
+        if self.retry_policy is not None:
+          delay = self.retry_policy.get_delay(
+              'PUT', retries, first_failure, error,
+              getattr(error, 'headers', None), idempotent=True)
+          if delay is None:
+            raise
+          self.retry_policy.wait('PUT', self.upload_uri, retries, delay,
+                                 error)
+        else:
+          if (isinstance(error, RequestError)
+              and error.status not in self.retry_codes):
+            raise
+          if retries > self.max_retries:
+            raise
+          time.sleep(self.retry_delay * 2 ** (retries - 1))
+        query = True
+        continue
+      if entry is not None:
+        return entry
+      received = next_byte - start_byte
+      if received < 0 or received > len(data):
+        raise RequestError(
+            'Server reported %i bytes received, expected %i to %i' % (
+                next_byte, start_byte, start_byte + len(data)))
+      if sent and received == sent == self.chunk_size:
+        self._adapt_chunk_size(time.time() - chunk_started)
+        reader.limit = self.chunk_size
+      data = data[received:]
+      start_byte = next_byte
+
+  def _put_chunk(self, start_byte, data):
+    """Sends a chunk and returns (entry, next_byte).
+
+    entry is the uploaded entry once the last chunk has been received,
+    otherwise entry is None and next_byte is the offset of the first byte
+    which the server has not received.
+    """
+    http_request = atom.http_core.HttpRequest()
+    http_request.add_body_part(data, self.content_type, size=len(data))
+    http_request.headers['Content-Range'] = 'bytes %i-%i/%i' % (
+        start_byte, start_byte + len(data) - 1, self.total_file_size)
+    return self._send(http_request, 'PUT')
+
+  def _query_status(self):
+    """Asks the server how much of the file it has, see _put_chunk."""
+    http_request = atom.http_core.HttpRequest()
+    http_request.headers['Content-Length'] = '0'
+    http_request.headers['Content-Range'] = 'bytes */%i' % (
+        self.total_file_size)
+    return self._send(http_request, 'PUT')
+
+  def _send(self, http_request, method):
+    try:
+      return self.client.request(method=method, uri=self.upload_uri,
+                                 http_request=http_request,
+                                 desired_class=self.desired_class,
+                                 retry_policy=NO_RETRIES), None
+    except RequestError, error:
+      if error.status != 308:
+        raise
+      return None, _next_byte_from_headers(error.headers)
+
+  def _adapt_chunk_size(self, elapsed):
+    if not self.adaptive or elapsed <= 0:
+      return
+    size = int(self.chunk_size * self.target_chunk_seconds / elapsed)
+    # Change gradually, and keep chunks a multiple of the minimum size as
+    # the protocol requires.
+    size = max(self.chunk_size // 2, min(self.chunk_size * 2, size))
+    size -= size % self.MIN_CHUNK_SIZE
+    self.chunk_size = max(self.MIN_CHUNK_SIZE,
+                          min(self.MAX_CHUNK_SIZE, size))
+
+
+def _uses_default_http_client(client):
+  if type(client.http_client) not in (atom.http_core.HttpClient,
+                                      atom.http_core.ProxiedHttpClient):
+    return False
+  return not (os.environ.get('http_proxy') or os.environ.get('https_proxy'))
+
+
+def _next_byte_from_headers(headers):
+  """Reads the offset to resume from in the Range header of a 308.
+
+  A 308 without a Range header means that no bytes have been received.
+  """
+  if hasattr(headers, 'items'):
+    headers = headers.items()
+  for name, value in headers or ():
+    if name.capitalize() == 'Range':
+      return int(value.split('-')[1]) + 1
+  return 0
+
+
+class _ReadAhead(object):
+  """Reads a file on a worker thread ahead of the caller.
+
+  Up to limit bytes are read in blocks of block_size before the caller asks
+  for them.
+  """
+
+  def __init__(self, file_handle, block_size, limit):
+    self.file_handle = file_handle
+    self.block_size = block_size
+    self.limit = limit
+    self._blocks = []
+    self._buffered = 0
+    self._finished = False
+    self._error = None
+    self._stopped = False
+    self._condition = threading.Condition()
+    thread = threading.Thread(target=self._run)
+    thread.setDaemon(True)
+    thread.start()
+
+  def _run(self):
+    while True:
+      self._condition.acquire()
+      try:
+        while not self._stopped and self._buffered >= self.limit:
+          self._condition.wait(0.5)
+        if self._stopped:
+          return
+      finally:
+        self._condition.release()
+      try:
+        block = self.file_handle.read(self.block_size)
+      except Exception:
+        block = None
+        error = sys.exc_info()
+      self._condition.acquire()
+      try:
+        if block:
+          self._blocks.append(block)
+          self._buffered += len(block)
+        elif block is None:
+          self._error = error
+        else:
+          self._finished = True
+        self._condition.notifyAll()
+      finally:
+        self._condition.release()
+      if not block:
+        return
+
+  def read(self, size):
+    """Returns the next size bytes, fewer only at the end of the file."""
+    parts = []
+    self._condition.acquire()
+    try:
+      while size > 0:
+        while not (self._blocks or self._finished or self._error):
+          self._condition.wait()
+        if not self._blocks:
+          if self._error is not None:
+            raise self._error[0], self._error[1], self._error[2]
+          break
+        block = self._blocks.pop(0)
+        if len(block) > size:
+          self._blocks.insert(0, block[size:])
+          block = block[:size]
+        parts.append(block)
+        size -= len(block)
+        self._buffered -= len(block)
+      self._condition.notifyAll()
+    finally:
+      self._condition.release()
+    return ''.join(parts)
+
+  def stop(self):
+    self._condition.acquire()
+    try:
+      self._stopped = True
+      self._condition.notifyAll()
+    finally:
+      self._condition.release()
+
+
+class UploadScheduler(object):
+  """Uploads many files at once using resumable upload sessions.
+
+  Jobs are added with add and run together by run, which keeps up to
+  workers upload sessions going at the same time. The combined upload rate
+  can be capped with max_bytes_per_second.
+
+  If a state_path is given, the upload URI of every session is saved there
+  as soon as the session starts and the job is marked as done once it
+  finishes. Running a scheduler with the same jobs and state_path after a
+  crash skips the finished jobs and continues each partial upload from the
+  byte which the server last received. Sessions are saved for a job_id and
+  file size, so a file whose size has changed is uploaded from the start.
+
+  Chunks which fail are retried according to the client's retry_policy.
+
+  Usage:
+
+    scheduler = gdata.client.UploadScheduler(client, 'uploads.state')
+    for path in paths:
+      scheduler.add(path, upload_link, path, 'application/pdf')
+    entries = scheduler.run()
+  """
+  workers = 4
+  chunk_size = ResumableUploader.DEFAULT_CHUNK_SIZE
+
+  def __init__(self, client, state_path=None, workers=None,
+               max_bytes_per_second=None, chunk_size=None):
+    """Creates a scheduler which uploads files using client.
+
+    Args:
+      client: gdata.client.GDClient The client used for every upload. Its
+          http_client and auth token are used from several threads.
+      state_path: str (optional) The file in which upload sessions are
+          recorded so that they can be resumed.
+      workers: int (optional) The most uploads to run at the same time.
+      max_bytes_per_second: int (optional) The most bytes per second to
+          send, across all of the uploads.
+      chunk_size: int (optional) The size of each upload chunk.
+    """
+    self.client = client
+    self.state_path = state_path
+    if workers is not None:
+      self.workers = workers
+    if chunk_size is not None:
+      self.chunk_size = chunk_size
+    self.limiter = None
+    if max_bytes_per_second:
+      self.limiter = _BandwidthLimiter(max_bytes_per_second)
+    self.jobs = []
+    self.errors = {}
+    self._state = {}
+    self._state_lock = threading.Lock()
+    if state_path is not None and os.path.exists(state_path):
+      state_file = open(state_path, 'rb')
+      try:
+        self._state = pickle.load(state_file)
+      finally:
+        state_file.close()
+
+  def add(self, job_id, resumable_media_link, file_path, content_type,
+          entry=None, headers=None, desired_class=None):
+    """Adds a file to upload.
+
+    Args:
+      job_id: str A name for the job which stays the same if the job is run
+          again, used to find its saved session.
+      resumable_media_link: str The URL of the #resumable-create-media link
+          to start the upload session with.
+      file_path: str The path of the file to upload.
+      content_type: str The mimetype of the file.
+      entry: (optional) A gdata.data.GDEntry with metadata for the new entry.
+      headers: dict (optional) Additional headers to send when the session
+          is started.
+      desired_class: (optional) The class to parse the uploaded entry as.
+    """
+    self.jobs.append((job_id, resumable_media_link, file_path, content_type,
+                      entry, headers, desired_class))
+
+  Add = add
+
+  def run(self):
+    """Uploads every job which has not already been completed.
+
+    Returns:
+      A dict mapping the job_id of each job uploaded in this run to the entry
+      returned by the server, or None if the job had already finished
+      before its result could be recorded. Jobs which failed are left out
+      and their exceptions are stored in self.errors, so that running again
+      resumes them.
+    """
+    results = {}
+    self.errors = {}
+    jobs = [job for job in self.jobs if not self._is_done(job)]
+    for index, entry, error in _run_concurrently(self._upload, jobs,
+                                                 self.workers):
+      job_id = jobs[index][0]
+      if error is None:
+        results[job_id] = entry
+      else:
+        self.errors[job_id] = error[1]
+    return results
+
+  Run = run
+
+  def _is_done(self, job):
+    try:
+      key = (job[0], os.path.getsize(job[2]))
+    except OSError:
+      # Uploading the job reports the error.
+      return False
+    return self._state.get(key, {}).get('done', False)
+
+  def _upload(self, job):
+    (job_id, resumable_media_link, file_path, content_type, entry, headers,
+     desired_class) = job
+    size = os.path.getsize(file_path)
+    key = (job_id, size)
+    file_handle = open(file_path, 'rb')
+    try:
+      uploader = ResumableUploader(self.client, file_handle, content_type,
+                                   size, chunk_size=self.chunk_size,
+                                   desired_class=desired_class)
+      start_byte = self._resume(key, uploader)
+      if start_byte is True:
+        self._save(key, done=True)
+        return None
+      if start_byte is None:
+        uploader._init_session(resumable_media_link, entry=entry,
+                               headers=headers)
+        self._save(key, upload_uri=uploader.upload_uri)
+        start_byte = 0
+      file_handle.seek(start_byte)
+      throttle = None
+      if self.limiter is not None:
+        throttle = self.limiter.consume
+      result = uploader._upload_chunks(start_byte, throttle)
+    finally:
+      file_handle.close()
+    self._save(key, done=True)
+    return result
+
+  def _resume(self, key, uploader):
+    """Returns the byte to continue a saved session from.
+
+    Args:
+      key: tuple The job_id and file size which the session is saved for.
+      uploader: ResumableUploader The uploader for the job.
+
+    Returns:
+      None if there is no session to continue, and True if the saved
+      session has already finished.
+    """
+    upload_uri = self._state.get(key, {}).get('upload_uri')
+    if upload_uri is None:
+      return None
+    uploader.upload_uri = upload_uri
+    try:
+      status = uploader.query_upload_status()
+    except RequestError:
+      # The session has expired or is unknown to the server.
+      return None
+    return status or 0
+
+  def _save(self, key, **values):
+    self._state_lock.acquire()
+    try:
+      self._state.setdefault(key, {}).update(values)
+      if self.state_path is None:
+        return
+      temp_path = self.state_path + '.tmp'
+      state_file = open(temp_path, 'wb')
+      try:
+        pickle.dump(self._state, state_file)
+      finally:
+        state_file.close()
+      if os.name == 'nt' and os.path.exists(self.state_path):
+        os.remove(self.state_path)
+      os.rename(temp_path, self.state_path)
+    finally:
+      self._state_lock.release()
+
+
+class _BandwidthLimiter(object):
+  """Spaces out the data sent by several threads to an average rate."""
+
+  def __init__(self, bytes_per_second):
+    self.bytes_per_second = float(bytes_per_second)
+    self._next_free = 0
+    self._lock = threading.Lock()
+
+  def consume(self, byte_count):
+    """Waits until byte_count bytes may be sent."""
+    self._lock.acquire()
+    try:
+      now = time.time()
+      start = max(now, self._next_free)
+      self._next_free = start + byte_count / self.bytes_per_second
+    finally:
+      self._lock.release()
+    if start > now:
+      time.sleep(start - now)
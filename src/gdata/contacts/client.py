@@ -202,6 +202,32 @@ class ContactsClient(gdata.client.GDClient):
 
   GetContacts = get_contacts
 
+  def iter_contacts(self, uri=None,
+                    desired_class=gdata.contacts.data.ContactsFeed,
+                    auth_token=None, prefetch=0, **kwargs):
+    """Iterates over the contacts in every page of the contacts feed.
+
+    Args:
+      uri: The URL of the first page. Defaults to the feed URI of the
+           current user.
+      desired_class: The class of each page of the feed.
+      auth_token: See get_contacts.
+      prefetch: The number of pages to fetch and parse in the background
+                while the caller processes the current page. The default
+                is 0, which fetches each page in the calling thread. Only
+                set it if the client's http_client may be used from another
+                thread. See gdata.client.GDClient.iter_entries.
+
+    Returns:
+      A gdata.client.FeedEntryIterator which yields ContactEntry objects.
+    """
+    uri = uri or self.GetFeedUri()
+    return self.iter_entries(uri, desired_class=desired_class,
+                             auth_token=auth_token, prefetch=prefetch,
+                             **kwargs)
+
+  IterContacts = iter_contacts
+
   def get_group(self, uri=None, desired_class=gdata.contacts.data.GroupEntry,
                 auth_token=None, **kwargs):
     """ Get a single groups details
@@ -318,6 +318,30 @@ class ContentForShoppingClient(gdata.client.GDClient):
 
   DeleteProducts = delete_products
 
+  def products_batch_executor(self, account_id=None, auth_token=None,
+                              dry_run=False, warnings=False, **kwargs):
+    """Create an executor for any number of product batch operations.
+
+    The operations added to the executor are sent in as many concurrent
+    batch requests as needed. See :class:`gdata.client.BatchExecutor`.
+
+    :param account_id: The Merchant Center Account ID. If ommitted the default
+                       Account ID will be used for this client
+    :param auth_token: An object which sets the Authorization HTTP header in its
+                       modify_request method.
+    :param dry_run: Flag to run all requests that modify persistent data in
+                    dry-run mode. False by default.
+    :param warnings: Flag to include warnings in response. False by default.
+    :param **kwargs: Pass all additional keywords to the BatchExecutor
+                     constructor, such as workers or max_entries.
+    """
+    uri = self._create_uri(account_id, 'items/products', path=['batch'],
+                           dry_run=dry_run, warnings=warnings)
+    return gdata.client.BatchExecutor(self, uri, feed_class=ProductFeed,
+                                      auth_token=auth_token, **kwargs)
+
+  ProductsBatchExecutor = products_batch_executor
+
   # Operations on datafeeds
 
   def get_datafeeds(self, account_id=None):
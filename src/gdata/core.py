@@ -43,6 +43,63 @@ except ImportError:
     import json as simplejson
 
 
+class _JsoncDict(dict):
+  """A dict from parsed JSON which wraps its members on first access.
+
+  Parsing does not build a Jsonc object for every object in the JSON.
+  Instead, when a member which is a JSON object or array is first read with
+  [] or get, it is replaced with a Jsonc object or a list of wrapped
+  members, so only the parts of a large feed which are used get converted.
+  Iterating over the items or values returns the members as stored.
+  """
+
+  def __getitem__(self, key):
+    value = dict.__getitem__(self, key)
+    value_type = type(value)
+    if value_type is _JsoncDict or value_type is list:
+      value = _wrap_parsed(value)
+      dict.__setitem__(self, key, value)
+    return value
+
+  def get(self, key, default=None):
+    if key in self:
+      return self[key]
+    return default
+
+
+class _JsoncList(list):
+  """A list whose parsed members have already been wrapped."""
+  pass
+
+
+def _wrap_parsed(x):
+  """Wraps one level of parsed JSON, leaving deeper members for later."""
+  if type(x) is _JsoncDict:
+    return Jsonc(_dict=x)
+  elif type(x) is list:
+    return _JsoncList([_wrap_parsed(item) for item in x])
+  return x
+
+
+def _object_hook_args():
+  """Returns the argument which makes the JSON parser build _JsoncDicts.
+
+  The json module in Python 2.6 and older versions of simplejson do not
+  have object_pairs_hook, so object_hook is used instead, which copies
+  each parsed dict into a _JsoncDict.
+  """
+  try:
+    parsed = simplejson.loads('{}', object_pairs_hook=_JsoncDict)
+  except TypeError:
+    parsed = None
+  if type(parsed) is _JsoncDict:
+    return {'object_pairs_hook': _JsoncDict}
+  return {'object_hook': _JsoncDict}
+
+
+_OBJECT_HOOK_ARGS = _object_hook_args()
+
+
 def _convert_to_jsonc(x):
   """Builds a Jsonc objects which wraps the argument's members."""
 
@@ -75,11 +132,11 @@ def parse_json(json_string):
     A new Jsonc object.
   """
 
-  return _convert_to_jsonc(simplejson.loads(json_string))
+  return _wrap_parsed(simplejson.loads(json_string, **_OBJECT_HOOK_ARGS))
 
 
 def parse_json_file(json_file):
-  return _convert_to_jsonc(simplejson.load(json_file))
+  return _wrap_parsed(simplejson.load(json_file, **_OBJECT_HOOK_ARGS))
 
 
 def jsonc_to_string(jsonc_obj):
@@ -111,8 +168,11 @@ def _convert_to_object(jsonc_obj):
   """
 
   if isinstance(jsonc_obj, Jsonc):
+    jsonc_obj = jsonc_obj._dict
+  if isinstance(jsonc_obj, dict):
+    # Members of parsed JSON which were never accessed are still dicts.
     plain = {}
-    for key, value in jsonc_obj._dict.iteritems():
+    for key, value in jsonc_obj.iteritems():
       plain[key] = _convert_to_object(value)
     return plain
   elif isinstance(jsonc_obj, list):
@@ -124,6 +184,14 @@ def _convert_to_object(jsonc_obj):
     return jsonc_obj
 
 
+# Maps Python style member names to JSON-C names which have already been
+# converted, since the same few names are looked up over and over. It is
+# emptied once it holds _MAX_JSONC_NAMES, so that looking up many distinct
+# names does not grow it without limit.
+_jsonc_names = {}
+_MAX_JSONC_NAMES = 1000
+
+
 def _to_jsonc_name(member_name):
   """Converts a Python style member name to a JSON-C style name.
   
@@ -141,6 +209,10 @@ def _to_jsonc_name(member_name):
     The JSON-C style name as a str or unicode.
   """
 
+  try:
+    return _jsonc_names[member_name]
+  except KeyError:
+    pass
   characters = []
   uppercase_next = False
   for character in member_name:
@@ -151,7 +223,11 @@ def _to_jsonc_name(member_name):
       uppercase_next = False
     else:
       characters.append(character)
-  return ''.join(characters)
+  jsonc_name = ''.join(characters)
+  if len(_jsonc_names) >= _MAX_JSONC_NAMES:
+    _jsonc_names.clear()
+  _jsonc_names[member_name] = jsonc_name
+  return jsonc_name
 
 
 class Jsonc(object):
@@ -214,6 +290,8 @@ class Jsonc(object):
   x.data.total_items is equivalent to x['data']['totalItems']
   (Not all dict methods are supported so if you need something other than
   the item operations, then you will want to use the ._dict member).
+  For objects returned by parse_json, nested JSON objects and arrays are only
+  converted to Jsonc objects when they are first accessed (see _JsoncDict).
 
   You may need to use getitem or the _dict member to access certain
   properties in cases where the JSON-C syntax does not map neatly to Python
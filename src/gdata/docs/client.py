@@ -160,7 +160,8 @@ class DocsClient(gdata.client.GDClient):
     generate such a URI.
 
     This method makes multiple HTTP requests (by following the feed's next
-    links) in order to fetch the user's entire document list.
+    links) in order to fetch the user's entire document list. Use
+    iter_entries to process very large document lists one page at a time.
 
     Args:
       uri: (optional) URI to query the doclist feed with. If None, then use
@@ -184,13 +185,11 @@ class DocsClient(gdata.client.GDClient):
       uri.query['showroot'] = str(show_root).lower()
 
     feed = self.GetResources(uri=uri, **kwargs)
-    entries = feed.entry
-
-    while feed.GetNextLink() is not None:
-      feed = self.GetResources(feed.GetNextLink().href, **kwargs)
-      entries.extend(feed.entry)
-
-    return entries
+    # The limit only applies to the first request, later pages are found
+    # using the feed's next links.
+    kwargs.pop('limit', None)
+    return list(self.iter_entries(
+        feed, desired_class=gdata.docs.data.ResourceFeed, **kwargs))
 
   GetAllResources = get_all_resources
 
@@ -394,6 +393,35 @@ class DocsClient(gdata.client.GDClient):
 
   DownloadResourceToMemory = download_resource_to_memory
 
+  def open_resource(self, entry, extra_params=None, **kwargs):
+    """Opens the contents of the given entry for reading.
+
+    The contents are not downloaded until they are read from the returned
+    object, which can also be iterated over to get the contents in chunks.
+
+    Args:
+      entry: gdata.docs.data.Resource whose contents to fetch.
+      extra_params: dict (optional) A map of any further parameters to control
+          how the document is downloaded/exported. For example, exporting a
+          spreadsheet as a .csv: extra_params={'gid': 0, 'exportFormat': 'csv'}
+      kwargs: Other parameters to pass to self._open_content(), such as
+          chunk_size and progress.
+
+    Returns:
+      A gdata.client.DownloadStream, which should be closed if it is not read
+      to the end.
+
+    Raises:
+      gdata.client.RequestError if the download URL is malformed or the server's
+      response was not successful.
+    """
+    self._check_entry_is_not_collection(entry)
+    self._check_entry_has_content(entry)
+    uri = self._get_download_uri(entry.content.src, extra_params)
+    return self._open_content(uri, **kwargs)
+
+  OpenResource = open_resource
+
   def _get_download_uri(self, base_uri, extra_params=None):
     uri = base_uri.replace('&amp;', '&')
     if extra_params is not None:
@@ -415,12 +443,8 @@ class DocsClient(gdata.client.GDClient):
     the file to a local disk.
 
     Be warned, this method will use as much memory as needed to store the
-    fetched content.  This could cause issues in your environment or app. This
-    is only different from Download() in that you will probably retain an
-    open reference to the data returned from this method, where as the data
-    from Download() will be immediately written to disk and the memory
-    freed.  This client library currently doesn't support reading server
-    responses into a buffer or yielding an open file pointer to responses.
+    fetched content.  This could cause issues in your environment or app. To
+    read the content a piece at a time, use _open_content() instead.
 
     Args:
       entry: Resource to fetch.
@@ -437,7 +461,28 @@ class DocsClient(gdata.client.GDClient):
     Raises:
       gdata.client.RequestError: on error response from server.
     """
-    server_response = None
+    return self._open_content(uri, auth_token=auth_token, **kwargs).read()
+
+  def _open_content(self, uri, auth_token=None, chunk_size=None,
+                    progress=None, **kwargs):
+    """Requests the given resource's content without reading it.
+
+    Args:
+      uri: str The full URL to download the content from.
+      auth_token: (optional) gdata.gauth.ClientLoginToken, AuthSubToken, or
+          OAuthToken which authorizes this client to edit the user's data.
+      chunk_size: int (optional) The number of bytes to read at a time when
+          iterating over the content.
+      progress: function (optional) Called as progress(bytes_read,
+          total_bytes) as the content is read.
+      kwargs: Other parameters to pass to self.request().
+
+    Returns:
+      A gdata.client.DownloadStream from which the content can be read.
+
+    Raises:
+      gdata.client.RequestError: on error response from server.
+    """
     token = auth_token
     if 'spreadsheets' in uri and token is None \
         and self.alt_auth_token is not None:
@@ -448,29 +493,29 @@ class DocsClient(gdata.client.GDClient):
       raise gdata.client.RequestError, {'status': server_response.status,
                                         'reason': server_response.reason,
                                         'body': server_response.read()}
-    return server_response.read()
+    return gdata.client.DownloadStream(server_response, chunk_size=chunk_size,
+                                       progress=progress)
 
   def _download_file(self, uri, file_path, **kwargs):
     """Downloads a file to disk from the specified URI.
 
-    Note: to download a file in memory, use the GetContent() method.
+    The content is written as it arrives, chunk_size bytes at a time, so the
+    file is never held in memory. Note: to download a file in memory, use
+    the GetContent() method.
 
     Args:
       uri: str The full URL to download the file from.
       file_path: str The full path to save the file to.
-      kwargs: Other parameters to pass to self.get_content().
+      kwargs: Other parameters to pass to self._open_content(), such as
+          chunk_size and progress.
+
+    Returns:
+      The number of bytes written.
 
     Raises:
       gdata.client.RequestError: on error response from server.
     """
-    f = open(file_path, 'wb')
-    try:
-      f.write(self._get_content(uri, **kwargs))
-    except gdata.client.RequestError, e:
-      f.close()
-      raise e
-    f.flush()
-    f.close()
+    return self._open_content(uri, **kwargs).save(file_path)
 
   _DownloadFile = _download_file
 
@@ -832,6 +877,31 @@ class DocsClient(gdata.client.GDClient):
 
   DownloadRevisionToMemory = download_revision_to_memory
 
+  def open_revision(self, entry, extra_params=None, **kwargs):
+    """Opens the contents of the given revision for reading.
+
+    Args:
+      entry: gdata.docs.data.Revision whose contents to fetch.
+      extra_params: dict (optional) A map of any further parameters to control
+          how the document is downloaded/exported.
+      kwargs: Other parameters to pass to self._open_content(), such as
+          chunk_size and progress.
+
+    Returns:
+      A gdata.client.DownloadStream, which should be closed if it is not read
+      to the end.
+
+    Raises:
+      gdata.client.RequestError if the download URL is malformed or the server's
+      response was not successful.
+    """
+    self._check_entry_is_not_collection(entry)
+    self._check_entry_has_content(entry)
+    uri = self._get_download_uri(entry.content.src, extra_params)
+    return self._open_content(uri, **kwargs)
+
+  OpenRevision = open_revision
+
   def publish_revision(self, entry, publish_auto=None,
                        publish_outside_domain=False, **kwargs):
     """Publishes the given revision.
@@ -985,6 +1055,41 @@ class DocsClient(gdata.client.GDClient):
   DeleteArchive = delete_archive
 
 
+class ResourceUploadScheduler(gdata.client.UploadScheduler):
+  """Creates many Google Docs resources at once from files on disk.
+
+  See gdata.client.UploadScheduler for how the uploads are run and resumed.
+  """
+
+  def add_resource(self, file_path, entry, collection=None,
+                   content_type=None, create_uri=None, job_id=None):
+    """Adds a file to upload as a new resource.
+
+    Args:
+      file_path: str The path of the file to upload.
+      entry: gdata.docs.data.Resource with the metadata of the new resource.
+      collection: (optional) gdata.docs.data.Resource representing the
+          collection in which to create the resource.
+      content_type: str (optional) The mimetype of the file. Guessed from
+          the file name if not given.
+      create_uri: (optional) String URI at which to create the resource,
+          chosen as in DocsClient.create_resource if not given.
+      job_id: str (optional) The name of the job, which defaults to
+          file_path.
+    """
+    if create_uri is None and collection is not None:
+      create_uri = collection.GetResumableCreateMediaLink().href
+    elif create_uri is None:
+      create_uri = RESOURCE_UPLOAD_URI
+    if content_type is None:
+      content_type = (mimetypes.guess_type(file_path)[0]
+                      or 'application/octet-stream')
+    self.add(job_id or file_path, create_uri, file_path, content_type,
+             entry=entry, desired_class=gdata.docs.data.Resource)
+
+  AddResource = add_resource
+
+
 class DocsQuery(gdata.client.Query):
 
   def __init__(self, title=None, title_exact=None, opened_min=None,
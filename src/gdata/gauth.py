@@ -47,6 +47,7 @@ ae_save
 
 
 import datetime
+import threading
 import time
 import random
 import urllib
@@ -78,6 +79,9 @@ PROGRAMMATIC_AUTH_LABEL = 'GoogleLogin auth='
 AUTHSUB_AUTH_LABEL = 'AuthSub token='
 OAUTH2_AUTH_LABEL = 'Bearer '
 
+# Guards the creation of each OAuth2Token's refresh lock.
+_refresh_lock_guard = threading.Lock()
+
 
 # This dict provides the AuthSub and OAuth scopes for all services by service
 # name. The service name (key) is used in ClientLogin requests.
@@ -497,12 +501,71 @@ def build_auth_sub_data(http_request, timestamp, nonce):
                           str(timestamp), nonce)
 
 
+# The number of parsed RSA private keys kept by parse_rsa_private_key.
+RSA_KEY_CACHE_SIZE = 16
+# Maps the fingerprint of a PEM private key to its parsed key object. The
+# fingerprints are also listed from least to most recently used.
+_rsa_key_cache = {}
+_rsa_key_cache_order = []
+_rsa_key_cache_lock = threading.Lock()
+
+
+def parse_rsa_private_key(rsa_key):
+  """Parses a PEM RSA private key, reusing the result for keys seen before.
+
+  Parsing the key costs far more than signing with it, so the parsed keys
+  are cached by a fingerprint of the PEM string. The RSA_KEY_CACHE_SIZE
+  most recently used keys are kept.
+
+  Args:
+    rsa_key: str The private key in PEM format.
+
+  Returns:
+    A tlslite RSAKey, which signs data with its hashAndSign method.
+  """
+  fingerprint = _rsa_key_fingerprint(rsa_key)
+  _rsa_key_cache_lock.acquire()
+  try:
+    private_key = _rsa_key_cache.get(fingerprint)
+    if private_key is not None:
+      _rsa_key_cache_order.remove(fingerprint)
+      _rsa_key_cache_order.append(fingerprint)
+      return private_key
+  finally:
+    _rsa_key_cache_lock.release()
+  from tlslite.utils import keyfactory
+  private_key = keyfactory.parsePrivateKey(rsa_key)
+  _rsa_key_cache_lock.acquire()
+  try:
+    if fingerprint not in _rsa_key_cache:
+      _rsa_key_cache_order.append(fingerprint)
+    _rsa_key_cache[fingerprint] = private_key
+    while len(_rsa_key_cache_order) > RSA_KEY_CACHE_SIZE:
+      del _rsa_key_cache[_rsa_key_cache_order.pop(0)]
+  finally:
+    _rsa_key_cache_lock.release()
+  return private_key
+
+
+ParseRsaPrivateKey = parse_rsa_private_key
+
+
+def _rsa_key_fingerprint(rsa_key):
+  if isinstance(rsa_key, unicode):
+    rsa_key = rsa_key.encode('utf-8')
+  try:
+    import hashlib
+    return hashlib.sha1(rsa_key).hexdigest()
+  except ImportError:
+    import sha
+    return sha.new(rsa_key).hexdigest()
+
+
 def generate_signature(data, rsa_key):
   """Signs the data string for a secure AuthSub request."""
   import base64
-  from tlslite.utils import keyfactory
 
-  private_key = keyfactory.parsePrivateKey(rsa_key)
+  private_key = parse_rsa_private_key(rsa_key)
   signed = private_key.hashAndSign(data)
   # Python2.3 and lower does not have the base64.b64encode function.
   if hasattr(base64, 'b64encode'):
@@ -684,11 +747,10 @@ def generate_rsa_signature(http_request, consumer_key, rsa_key,
                            timestamp, nonce, version, next='oob',
                            token=None, token_secret=None, verifier=None):
   import base64
-  from tlslite.utils import keyfactory
   base_string = build_oauth_base_string(
       http_request, consumer_key, nonce, RSA_SHA1, timestamp, version,
       next, token, verifier=verifier)
-  private_key = keyfactory.parsePrivateKey(rsa_key)
+  private_key = parse_rsa_private_key(rsa_key)
   # Sign using the key
   signed = private_key.hashAndSign(base_string)
   # Python2.3 does not have base64.b64encode.
@@ -1143,7 +1205,14 @@ class OAuth2Token(object):
     Native applications flow: call generate_authorize_url as it is. You will have
       to ask the user to go to the generated url and pass in the authorization
       code to your application.
+
+  A client authorized with the token refreshes the access token when it is
+  within refresh_margin seconds of its token_expiry, and again if a request
+  is rejected with a 401. Only one refresh is made at a time: requests from
+  other threads wait for it and then use the new access token.
   """
+  # Refresh this many seconds before the access token expires.
+  refresh_margin = 60
 
   def __init__(self, client_id, client_secret, scope, user_agent,
       auth_uri='https://accounts.google.com/o/oauth2/auth',
@@ -1185,6 +1254,52 @@ class OAuth2Token(object):
     """True if the credentials are invalid, such as being revoked."""
     return getattr(self, '_invalid', False)
 
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state.pop('_refresh_lock', None)
+    return state
+
+  def _get_refresh_lock(self):
+    # Created on demand since subclasses and unpickled tokens do not run
+    # __init__.
+    _refresh_lock_guard.acquire()
+    try:
+      return self.__dict__.setdefault('_refresh_lock', threading.Lock())
+    finally:
+      _refresh_lock_guard.release()
+
+  def _now(self):
+    """The current time in the same time zone as token_expiry."""
+    return datetime.datetime.now()
+
+  def _expires_soon(self):
+    expiry = getattr(self, 'token_expiry', None)
+    if not isinstance(expiry, datetime.datetime) or not self.refresh_token:
+      return False
+    margin = datetime.timedelta(seconds=self.refresh_margin)
+    return expiry - margin <= self._now()
+
+  def _refresh_once(self, request, stale_access_token):
+    """Refreshes the access token unless another thread already has.
+
+    Args:
+      request: The function used to send the refresh request.
+      stale_access_token: The access token which needs to be replaced. If
+          the token has changed by the time the refresh lock is acquired,
+          no refresh is made.
+
+    Returns:
+      The response to the refresh request, or None if no refresh was made.
+    """
+    lock = self._get_refresh_lock()
+    lock.acquire()
+    try:
+      if self.access_token != stale_access_token:
+        return None
+      return self._refresh(request)
+    finally:
+      lock.release()
+
   def _refresh(self, request):
     """Refresh the access_token using the refresh_token.
 
@@ -1192,6 +1307,11 @@ class OAuth2Token(object):
       request: The atom.http_core.HttpRequest which contains all of the
           information needed to send a request to the remote server.
     """
+    return self._handle_refresh_response(
+        request(self._make_refresh_request()))
+
+  def _make_refresh_request(self):
+    """Creates the HTTP request which exchanges the refresh token."""
     body = urllib.urlencode({
       'grant_type': 'refresh_token',
       'client_id': self.client_id,
@@ -1206,7 +1326,10 @@ class OAuth2Token(object):
         uri=self.token_uri, method='POST', headers=headers)
     http_request.add_body_part(
         body, mime_type='application/x-www-form-urlencoded')
-    response = request(http_request)
+    return http_request
+
+  def _handle_refresh_response(self, response):
+    """Stores the new access token, or marks the token as invalid."""
     body = response.read()
     if response.status == 200:
       self._extract_tokens(body)
@@ -1327,11 +1450,27 @@ class OAuth2Token(object):
     request_orig = client.http_client.request
 
     def new_request(http_request):
+      # The access token which modify_request put in the request, which
+      # may be older than self.access_token if another thread refreshed it.
+      sent_token = _bearer_token(http_request)
+      if sent_token is not None and not self._issued(sent_token):
+        # The request was authorized by another token, such as an
+        # auth_token passed for this request alone.
+        return request_orig(http_request)
+      if sent_token is None:
+        sent_token = self.access_token
+      if self._expires_soon() and not self._invalid:
+        self._refresh_once(request_orig, sent_token)
+      # Only replace a bearer token header which this token set.
+      if (sent_token != self.access_token
+          and _bearer_token(http_request) is not None):
+        self.modify_request(http_request)
+        sent_token = self.access_token
       response = request_orig(http_request)
       if response.status == 401:
-        refresh_response = self._refresh(request_orig)
+        refresh_response = self._refresh_once(request_orig, sent_token)
         if self._invalid:
-          return refresh_response
+          return refresh_response or response
         else:
           self.modify_request(http_request)
           return request_orig(http_request)
@@ -1375,12 +1514,39 @@ class OAuth2Token(object):
     Returns:
       The same HTTP request object which was passed in.
     """
+    access_token = self.access_token
+    self._record_issued(access_token)
     http_request.headers['Authorization'] = '%s%s' % (OAUTH2_AUTH_LABEL,
-                                                      self.access_token)
+                                                      access_token)
     return http_request
 
   ModifyRequest = modify_request
 
+  def _record_issued(self, access_token):
+    """Remembers an access token which was put in a request."""
+    issued = self.__dict__.setdefault('_issued_tokens', [])
+    if access_token not in issued:
+      issued.append(access_token)
+      del issued[:-_MAX_ISSUED_TOKENS]
+
+  def _issued(self, access_token):
+    """True if this token put the access token in a request."""
+    return (access_token == self.access_token
+            or access_token in self.__dict__.get('_issued_tokens', ()))
+
+
+# The number of access tokens, current and replaced, which an OAuth2Token
+# recognizes in requests it has authorized.
+_MAX_ISSUED_TOKENS = 10
+
+
+def _bearer_token(http_request):
+  """Returns the OAuth 2.0 access token in the request's headers, or None."""
+  header = http_request.headers.get('Authorization')
+  if header is not None and header.startswith(OAUTH2_AUTH_LABEL):
+    return header[len(OAUTH2_AUTH_LABEL):]
+  return None
+
 
 def _make_credentials_property(name):
   """Helper method which generates properties.
@@ -1457,6 +1623,10 @@ class OAuth2TokenFromCredentials(OAuth2Token):
   def revoke(self, *args, **kwargs): raise NotImplementedError
   def _extract_tokens(self, *args, **kwargs): raise NotImplementedError
 
+  def _now(self):
+    # oauth2client records token_expiry in UTC.
+    return datetime.datetime.utcnow()
+
   def _refresh(self, unused_request):
     """Refresh the access_token using the Credentials object.
 
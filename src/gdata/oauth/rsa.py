@@ -11,6 +11,7 @@ from tlslite.utils import keyfactory
 
 # XXX andy: ugly local import due to module name, oauth.oauth
 import gdata.oauth as oauth
+import gdata.gauth
 
 class OAuthSignatureMethod_RSA_SHA1(oauth.OAuthSignatureMethod):
   def get_name(self):
@@ -50,8 +51,8 @@ class OAuthSignatureMethod_RSA_SHA1(oauth.OAuthSignatureMethod):
     # Fetch the private key cert based on the request
     cert = self._fetch_private_cert(oauth_request)
 
-    # Pull the private key from the certificate
-    privatekey = keyfactory.parsePrivateKey(cert)
+    # Pull the private key from the certificate, parsed keys are cached
+    privatekey = gdata.gauth.parse_rsa_private_key(cert)
     
     # Convert base_string to bytes
     #base_string_bytes = cryptomath.createByteArraySequence(base_string)
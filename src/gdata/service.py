@@ -182,6 +182,33 @@ class RanOutOfTries(Error):
   pass
 
 
+class TreeConverter(object):
+  """Converts the XML of a response into an instance of target_class.
+
+  GDataService.Get passes converters which have a FromElementTree method the
+  ElementTree it has already parsed from the response body, so the body is
+  only parsed once. Can also be called with a string like the other
+  converters (such as gdata.GDataFeedFromString).
+  """
+
+  def __init__(self, target_class):
+    self.target_class = target_class
+
+  def __call__(self, xml_string):
+    return atom.CreateClassFromXMLString(self.target_class, xml_string)
+
+  def FromElementTree(self, tree):
+    """Returns an instance of target_class, or None if the root differs."""
+    return atom._CreateClassFromElementTree(self.target_class, tree)
+
+
+# The classes which GDataService.Get converts responses into when no
+# converter is given, keyed by the qname of the root element.
+ROOT_CLASSES = {
+    '{%s}feed' % atom.ATOM_NAMESPACE: gdata.GDataFeed,
+    '{%s}entry' % atom.ATOM_NAMESPACE: gdata.GDataEntry}
+
+
 class GDataService(atom.service.AtomService):
   """Contains elements needed for GData login and CRUD request headers.
 
@@ -318,8 +345,9 @@ class GDataService(atom.service.AtomService):
     yield link_finder
     next = link_finder.GetNextLink()
     while next is not None:
-      next_feed = func(str(self.GetWithRetries(
-            next.href, num_retries=num_retries, delay=delay, backoff=backoff)))
+      next_feed = self.GetWithRetries(
+          next.href, converter=func, num_retries=num_retries, delay=delay,
+          backoff=backoff)
       yield next_feed
       next = next_feed.GetNextLink()
 
@@ -327,11 +355,13 @@ class GDataService(atom.service.AtomService):
                                         num_retries=DEFAULT_NUM_RETRIES,
                                         delay=DEFAULT_DELAY,
                                         backoff=DEFAULT_BACKOFF):
-    for element in self.GetGeneratorFromLinkFinder(link_finder, func,
-                                                   num_retries=num_retries,
-                                                   delay=delay,
-                                                   backoff=backoff).entry:
-      yield element
+    """Yields the entries from every page, one page at a time."""
+    for page in self.GetGeneratorFromLinkFinder(link_finder, func,
+                                                num_retries=num_retries,
+                                                delay=delay,
+                                                backoff=backoff):
+      for element in page.entry:
+        yield element
 
   def GetOAuthInputParameters(self):
     return self._oauth_input_params
@@ -1044,7 +1074,8 @@ class GDataService(atom.service.AtomService):
       converter: func (optional) A function which will transform
           the server's results before it is returned. Example: use 
           GDataFeedFromString to parse the server response as if it
-          were a GDataFeed.
+          were a GDataFeed. If the converter is a TreeConverter (or has
+          a FromElementTree method), it is given the parsed XML instead.
 
     Returns:
       If there is no ResultsTransformer specified in the call, a GDataFeed 
@@ -1069,21 +1100,22 @@ class GDataService(atom.service.AtomService):
     result_body = server_response.read()
 
     if server_response.status == 200:
-      if converter:
+      if converter and not hasattr(converter, 'FromElementTree'):
         return converter(result_body)
-      # There was no ResultsTransformer specified, so try to convert the
-      # server's response into a GDataFeed.
-      feed = gdata.GDataFeedFromString(result_body)
-      if not feed:
-        # If conversion to a GDataFeed failed, try to convert the server's
-        # response to a GDataEntry.
-        entry = gdata.GDataEntryFromString(result_body)
-        if not entry:
-          # The server's response wasn't a feed, or an entry, so return the
-          # response body as a string.
-          return result_body
-        return entry
-      return feed
+      # Parse the body once and convert the tree.
+      if isinstance(result_body, unicode):
+        result_body = result_body.encode(atom.XML_STRING_ENCODING)
+      tree = ElementTree.fromstring(result_body)
+      if converter:
+        return converter.FromElementTree(tree)
+      # There was no ResultsTransformer specified, so convert the server's
+      # response into a GDataFeed or GDataEntry depending on the root.
+      target_class = ROOT_CLASSES.get(tree.tag)
+      if target_class is None:
+        # The server's response wasn't a feed, or an entry, so return the
+        # response body as a string.
+        return result_body
+      return atom._CreateClassFromElementTree(target_class, tree)
     elif server_response.status in (301, 302):
       if redirects_remaining > 0:
         location = (server_response.getheader('Location')
@@ -1135,14 +1167,14 @@ class GDataService(atom.service.AtomService):
     """
 
     result = GDataService.Get(self, uri, extra_headers, 
-        converter=atom.EntryFromString)
+        converter=TreeConverter(atom.Entry))
     if isinstance(result, atom.Entry):
       return result
     else:
       raise UnexpectedReturnType, 'Server did not send an entry' 
 
   def GetFeed(self, uri, extra_headers=None, 
-              converter=gdata.GDataFeedFromString):
+              converter=TreeConverter(gdata.GDataFeed)):
     """Query the GData API with the given URI and receive a Feed.
 
     See also documentation for gdata.service.Get
@@ -1183,15 +1215,11 @@ class GDataService(atom.service.AtomService):
       The type of this feed will match that of the feed argument.
     """
     next_link = feed.GetNextLink()
-    # Create a closure which will convert an XML string to the class of
-    # the feed object passed in.
-    def ConvertToFeedClass(xml_string):
-      return atom.CreateClassFromXMLString(feed.__class__, xml_string)
-    # Make a GET request on the next link and use the above closure for the
-    # converted which processes the XML string from the server.
+    # Make a GET request on the next link and convert the XML from the
+    # server to the class of the feed object passed in.
     if next_link and next_link.href:
       return GDataService.Get(self, next_link.href, 
-          converter=ConvertToFeedClass)
+          converter=TreeConverter(feed.__class__))
     else:
       return None
 
@@ -97,6 +97,26 @@ class SitesClient(gdata.client.GDClient):
     Returns:
       The binary file content.
 
+    Raises:
+      gdata.client.RequestError: on error response from server.
+    """
+    return self._open_file_content(uri).read()
+
+  _GetFileContent = _get_file_content
+
+  def _open_file_content(self, uri, chunk_size=None, progress=None):
+    """Requests the file content from the specified URI without reading it.
+
+    Args:
+      uri: string The full URL to fetch the file contents from.
+      chunk_size: int (optional) The number of bytes to read at a time when
+          iterating over the content.
+      progress: function (optional) Called as progress(bytes_read,
+          total_bytes) as the content is read.
+
+    Returns:
+      A gdata.client.DownloadStream from which the content can be read.
+
     Raises:
       gdata.client.RequestError: on error response from server.
     """
@@ -105,9 +125,10 @@ class SitesClient(gdata.client.GDClient):
       raise  gdata.client.RequestError, {'status': server_response.status,
                                          'reason': server_response.reason,
                                          'body': server_response.read()}
-    return server_response.read()
+    return gdata.client.DownloadStream(server_response, chunk_size=chunk_size,
+                                       progress=progress)
 
-  _GetFileContent = _get_file_content
+  _OpenFileContent = _open_file_content
 
   def make_content_feed_uri(self):
     return CONTENT_FEED_TEMPLATE % (self.domain, self.site)
@@ -454,12 +475,45 @@ class SitesClient(gdata.client.GDClient):
 
   UploadAttachment = upload_attachment
 
-  def download_attachment(self, uri_or_entry, file_path):
+  def download_attachment(self, uri_or_entry, file_path, chunk_size=None,
+                          progress=None):
     """Downloads an attachment file to disk.
 
+    The file is written a chunk at a time as it arrives.
+
     Args:
       uri_or_entry: string The full URL to download the file from.
       file_path: string The full path to save the file to.
+      chunk_size: int (optional) The number of bytes to read and write at a
+          time.
+      progress: function (optional) Called as progress(bytes_read,
+          total_bytes) after each chunk.
+
+    Returns:
+      The number of bytes written.
+
+    Raises:
+      gdata.client.RequestError: on error response from server.
+    """
+    return self.open_attachment(uri_or_entry, chunk_size=chunk_size,
+                                progress=progress).save(file_path)
+
+  DownloadAttachment = download_attachment
+
+  def open_attachment(self, uri_or_entry, chunk_size=None, progress=None):
+    """Opens an attachment file for reading.
+
+    Args:
+      uri_or_entry: string The full URL to download the file from, or the
+          attachment's gdata.sites.data.ContentEntry.
+      chunk_size: int (optional) The number of bytes to read at a time when
+          iterating over the file.
+      progress: function (optional) Called as progress(bytes_read,
+          total_bytes) as the file is read.
+
+    Returns:
+      A gdata.client.DownloadStream, which should be closed if it is not read
+      to the end.
 
     Raises:
       gdata.client.RequestError: on error response from server.
@@ -467,14 +521,7 @@ class SitesClient(gdata.client.GDClient):
     uri = uri_or_entry
     if isinstance(uri_or_entry, gdata.sites.data.ContentEntry):
       uri = uri_or_entry.content.src
+    return self._open_file_content(uri, chunk_size=chunk_size,
+                                   progress=progress)
 
-    f = open(file_path, 'wb')
-    try:
-      f.write(self._get_file_content(uri))
-    except gdata.client.RequestError, e:
-      f.close()
-      raise e
-    f.flush()
-    f.close()
-
-  DownloadAttachment = download_attachment
+  OpenAttachment = open_attachment
@@ -28,6 +28,10 @@ import atom_tests.http_core_test
 import atom_tests.auth_test
 import atom_tests.mock_http_core_test
 import atom_tests.client_test
+import atom_tests.http_async_test
+import atom_tests.instrumentation_test
+import atom_tests.http_cache_test
+import atom_tests.rate_limit_test
 import gdata_tests.client_test
 import gdata_tests.core_test
 import gdata_tests.data_test
@@ -65,6 +69,10 @@ def suite():
       atom_tests.auth_test.suite(),
       atom_tests.mock_http_core_test.suite(),
       atom_tests.client_test.suite(),
+      atom_tests.http_async_test.suite(),
+      atom_tests.instrumentation_test.suite(),
+      atom_tests.http_cache_test.suite(),
+      atom_tests.rate_limit_test.suite(),
       gdata_tests.client_test.suite(),
       gdata_tests.core_test.suite(),
       gdata_tests.data_test.suite(),
@@ -22,6 +22,7 @@ __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
 import unittest
+import StringIO
 try:
   from xml.etree import cElementTree as ElementTree
 except ImportError:
@@ -33,6 +34,9 @@ except ImportError:
     except ImportError:
       from elementtree import ElementTree
 import atom.core
+import atom.data
+import copy
+import pickle
 import gdata.test_config as conf 
 
 
@@ -119,6 +123,24 @@ class XmlElementTest(unittest.TestCase):
     self.assert_(e.versioned_attr is None)
     self.assert_(e.foos == [])
     self.assert_(e.text is None)
+
+  def testMembersAreStoredWhenSet(self):
+    e = Example()
+    self.assertEqual(e.__dict__, {})
+    self.assert_(Example.child is Child)
+    self.assertEqual(Example.foos, [Foo])
+    e.foos.append(Foo('1'))
+    self.assertEqual(len(e.foos), 1)
+    self.assertEqual(e.to_string(),
+                     '<ns0:foo xmlns:ns0="http://example.com"><foo>1</foo>'
+                     '</ns0:foo>')
+    self.assertEqual(sorted(e.__dict__.keys()), ['foos'])
+    parsed = atom.core.parse(e.to_string(), Example)
+    self.assertEqual(sorted(parsed.__dict__.keys()), ['foos'])
+    self.assert_(parsed._other_elements == [])
+    copied = pickle.loads(pickle.dumps(parsed))
+    self.assert_(copied.child is None)
+    self.assertEqual(copied.foos[0].text, '1')
         
   def testGetRules(self):
     rules1 = Example._get_rules(1)
@@ -138,6 +160,36 @@ class XmlElementTest(unittest.TestCase):
     self.assert_(rules2[2]['tag'] == 'tag')
     self.assert_(rules2[2]['{http://new_ns}attr'] == 'versioned_attr')
     
+  def testGetParsePlan(self):
+    plan = atom.core._get_parse_plan(Example, 2)
+    self.assert_(plan is atom.core._get_parse_plan(Example, 2))
+    self.assertEqual(plan.qname, '{http://example.com}foo')
+    self.assertEqual(sorted(plan.handlers.keys()),
+                     ['foo', '{http://example.com/2}child'])
+    self.assertEqual(plan.attributes,
+                     {'tag': 'tag', '{http://new_ns}attr': 'versioned_attr'})
+    self.assertEqual(sorted(plan.element_members),
+                     [('child', False), ('foos', True)])
+    e = plan.new_instance()
+    self.assert_(isinstance(e, Example))
+    self.assert_(e.child is None)
+    self.assertEqual(e.foos, [])
+    self.assert_(e.foos is not plan.new_instance().foos)
+    self.assertEqual(e._other_elements, [])
+    self.assertEqual(e._other_attributes, {})
+
+  def testParsePlanUsesCustomConstructor(self):
+    class Custom(Example):
+      def __init__(self, *args, **kwargs):
+        Example.__init__(self, *args, **kwargs)
+        self.constructed = True
+
+    parsed = atom.core.parse(
+        '<foo xmlns="http://example.com" tag="x"><foo xmlns="">1</foo></foo>', Custom)
+    self.assert_(parsed.constructed)
+    self.assertEqual(parsed.tag, 'x')
+    self.assertEqual(parsed.foos[0].text, '1')
+
   def testGetElements(self):
     e = Example()
     e.child = Child()
@@ -452,9 +504,183 @@ class CharacterEncodingTest(unittest.TestCase):
     self.assert_(x.to_string(encoding='UTF-16').startswith('<x a="&#948;"'))
 
 
+class Title(atom.core.XmlElement):
+  _qname = '{http://example.com/xml/1}title'
+
+
+class Container(atom.core.XmlElement):
+  _qname = '{http://example.com/xml/1}outer'
+  title = Title
+  innards = [Inner]
+
+
+class IterParseTest(unittest.TestCase):
+
+  def testIterParseYieldsEntries(self):
+    feed_xml = ('<outer xmlns="http://example.com/xml/1" a="b">'
+                  '<title>Example</title>'
+                  '<inner x="1"/><other/><inner x="2"/><inner x="3"/>'
+                '</outer>')
+    entries = atom.core.iterparse(StringIO.StringIO(feed_xml), Container,
+                                  member_name='innards')
+    self.assert_(entries.feed is None)
+    found = []
+    for inner in entries:
+      self.assert_(isinstance(inner, Inner))
+      # Members which precede the entry are already available.
+      self.assertEqual(entries.feed.title.text, 'Example')
+      self.assertEqual(entries.feed._other_attributes, {'a': 'b'})
+      found.append(inner.my_x)
+    self.assertEqual(found, ['1', '2', '3'])
+    # The yielded entries are not kept in the feed.
+    self.assertEqual(entries.feed.innards, [])
+    self.assertEqual(len(entries.feed.get_elements('other')), 1)
+    self.assertRaises(ValueError, iter, entries)
+
+  def testIterParseWithoutSchema(self):
+    entries = list(atom.core.iterparse(StringIO.StringIO(SAMPLE_XML)))
+    self.assertEqual(len(entries), 4)
+    self.assertEqual(entries[1].get_attributes('y')[0].value, 'abc')
+    self.assertEqual(len(entries[2].get_elements('nested')), 2)
+
+  def testIterParseWrongRoot(self):
+    entries = atom.core.iterparse(StringIO.StringIO(NO_NAMESPACE_XML),
+                                  Container)
+    self.assertRaises(atom.core.UnexpectedRootElement, list, entries)
+
+
+LAZY_FEED = ('<feed xmlns="http://www.w3.org/2005/Atom">'
+               '<title>Feed</title>'
+               '<entry><id>1</id><title>One</title><x:y xmlns:x="urn:x"/>'
+               '<link rel="alternate" href="http://example.com/1"/></entry>'
+               '<entry><id>2</id><title>Two</title></entry>'
+             '</feed>')
+
+
+class LazyParseTest(unittest.TestCase):
+
+  def testMembersAreConvertedOnAccess(self):
+    feed = atom.core.parse(LAZY_FEED, atom.data.Feed, lazy=True)
+    self.assertEqual(feed.title.text, 'Feed')
+    entry = feed.entry[0]
+    self.assert_(isinstance(entry, atom.data.Entry))
+    self.assert_('id' not in entry.__dict__)
+    self.assertEqual(entry.id.text, '1')
+    self.assert_('title' not in entry.__dict__)
+    self.assertEqual(entry.get_alternate_link().href, 'http://example.com/1')
+    self.assertEqual(len(entry.get_elements('y', 'urn:x')), 1)
+    self.assertEqual(entry.title.text, 'One')
+    # Once every member is converted, the entry is a plain instance.
+    self.assert_(type(entry) is atom.data.Entry)
+
+  def testUntouchedEntriesAreNotExpanded(self):
+    feed = atom.core.parse(LAZY_FEED, atom.data.Feed, lazy=True)
+    xml = feed.to_string()
+    self.assert_('title' not in feed.entry[1].__dict__)
+    self.assertEqual(atom.core.parse(xml, atom.data.Feed).to_string(),
+                     atom.core.parse(LAZY_FEED, atom.data.Feed).to_string())
+    # Changed entries are serialized from their members.
+    feed.entry[1].title = atom.data.Title(text='Changed')
+    self.assert_('<ns0:title>Changed</ns0:title>' in feed.entry[1].to_string())
+    self.assert_('<ns0:id>2</ns0:id>' in feed.entry[1].to_string())
+
+  def testAppendingToAbsentMembers(self):
+    feed = atom.core.parse(LAZY_FEED, atom.data.Feed, lazy=True)
+    feed.entry[1].category.append(atom.data.Category(term='x'))
+    feed.entry[1].extension_elements.append(atom.core.XmlElement(text='y'))
+    feed.entry[1].extension_elements[0]._qname = '{urn:x}z'
+    entries = [atom.core.parse(feed.entry[1].to_string(), atom.data.Entry),
+               atom.core.parse(feed.to_string(), atom.data.Feed).entry[1],
+               atom.core.parse(''.join(feed.iter_string()),
+                               atom.data.Feed).entry[1]]
+    for entry in entries:
+      self.assertEqual(entry.category[0].term, 'x')
+      self.assertEqual(entry.get_elements('z', 'urn:x')[0].text, 'y')
+
+  def testCopyAndPickle(self):
+    feed = atom.core.parse(LAZY_FEED, atom.data.Feed, lazy=True)
+    copied = copy.deepcopy(feed.entry[0])
+    self.assert_(type(copied) is atom.data.Entry)
+    self.assertEqual(copied.id.text, '1')
+    unpickled = pickle.loads(pickle.dumps(feed.entry[1]))
+    self.assertEqual(unpickled.title.text, 'Two')
+
+
+class ProjectionTest(unittest.TestCase):
+
+  def testOnlyProjectedMembersAreConverted(self):
+    feed = atom.core.parse(LAZY_FEED, atom.data.Feed,
+                           projection=['entry.id', 'entry.link'])
+    self.assertEqual(feed.title, None)
+    self.assertEqual(len(feed.entry), 2)
+    entry = feed.entry[0]
+    self.assert_(type(entry) is atom.data.Entry)
+    self.assertEqual(entry.id.text, '1')
+    self.assertEqual(entry.title, None)
+    self.assertEqual(entry.get_alternate_link().href, 'http://example.com/1')
+    self.assertEqual(entry.get_elements('y', 'urn:x'), [])
+    self.assertEqual(feed.entry[1].id.text, '2')
+    # A path which ends at a member converts all of it.
+    feed = atom.core.parse(LAZY_FEED, atom.data.Feed,
+                           projection=['title', 'entry'])
+    self.assertEqual(feed.to_string(),
+                     atom.core.parse(LAZY_FEED, atom.data.Feed).to_string())
+
+  def testIterParseDiscardsOtherElements(self):
+    entries = atom.core.iterparse(StringIO.StringIO(LAZY_FEED), atom.data.Feed,
+                                  projection=['title', 'entry.title'])
+    titles = [entry.title.text for entry in entries]
+    self.assertEqual(titles, ['One', 'Two'])
+    self.assertEqual(entries.feed.title.text, 'Feed')
+    entries = atom.core.iterparse(StringIO.StringIO(LAZY_FEED), atom.data.Feed,
+                                  projection=['title'])
+    self.assertEqual(list(entries), [])
+    self.assertEqual(entries.feed.title.text, 'Feed')
+
+  def testUnknownMember(self):
+    self.assertRaises(atom.core.UnknownMember, atom.core.parse, LAZY_FEED,
+                      atom.data.Feed, projection=['entry.missing'])
+
+
+class IterStringTest(unittest.TestCase):
+
+  def testMatchesToString(self):
+    e = Example(text=u'caf\xe9 & <more>', child=Child('world'),
+                versioned_attr='1"\n2')
+    e.foos.extend([Foo(str(i)) for i in xrange(100)])
+    e._other_elements.append(atom.core.XmlElement(text='x'))
+    e._other_elements[0]._qname = '{urn:other}other'
+    e._other_attributes['{urn:attr}a'] = 'b'
+    chunks = list(e.iter_string(chunk_size=200))
+    self.assert_(len(chunks) > 5)
+    for chunk in chunks:
+      self.assert_(isinstance(chunk, str))
+    xml = ''.join(chunks)
+    self.assertEqual(atom.core.parse(xml, Example).to_string(), e.to_string())
+    for version in (1, 2):
+      self.assertEqual(
+          atom.core.parse(''.join(e.iter_string(version)), Example,
+                          version).to_string(version),
+          e.to_string(version))
+
+  def testLazyEntriesAreCopied(self):
+    feed = atom.core.parse(LAZY_FEED, atom.data.Feed, lazy=True)
+    feed.entry[0].title.text = 'Changed'
+    xml = ''.join(feed.iter_string())
+    self.assert_(type(feed.entry[1]) is not atom.data.Entry)
+    parsed = atom.core.parse(xml, atom.data.Feed)
+    self.assertEqual([entry.title.text for entry in parsed.entry],
+                     ['Changed', 'Two'])
+
+  def testXmlStreamCanBeRepeated(self):
+    stream = atom.core.XmlStream(Example(text='a'))
+    self.assertEqual(''.join(stream), ''.join(stream))
+
+
 def suite():
   return conf.build_suite([XmlElementTest, UtilityFunctionTest, 
-                           CharacterEncodingTest])
+                           CharacterEncodingTest, IterParseTest,
+                           LazyParseTest, ProjectionTest, IterStringTest])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import BaseHTTPServer
+import SocketServer
+import socket
+import threading
+import unittest
+import atom.http_async
+import atom.http_core
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+  def setup(self):
+    BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+    self.server.connections += 1
+
+  def do_GET(self):
+    if self.path == '/chunked':
+      self.send_response(200)
+      self.send_header('Transfer-Encoding', 'chunked')
+      self.end_headers()
+      for chunk in ('hello ', 'chunked ', 'world'):
+        self.wfile.write('%x\r\n%s\r\n' % (len(chunk), chunk))
+      self.wfile.write('0\r\n\r\n')
+    elif self.path == '/close':
+      self.send_response(200)
+      self.send_header('Connection', 'close')
+      self.end_headers()
+      self.wfile.write('until close')
+      self.close_connection = 1
+    else:
+      self.respond(200, 'path %s' % self.path)
+
+  def do_POST(self):
+    body = self.rfile.read(int(self.headers['Content-Length']))
+    self.respond(201, 'posted %s' % body)
+
+  def respond(self, status, body):
+    self.send_response(status)
+    self.send_header('Content-Type', 'text/plain')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+  daemon_threads = True
+  connections = 0
+
+  def handle_error(self, request, client_address):
+    pass
+
+
+class AsyncHttpClientTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = StubServer(('127.0.0.1', 0), StubHandler)
+    self.port = self.server.server_address[1]
+    thread = threading.Thread(target=self.server.serve_forever,
+                              kwargs={'poll_interval': 0.05})
+    thread.setDaemon(True)
+    thread.start()
+    self.client = atom.http_async.AsyncHttpClient(max_per_host=4, timeout=10)
+
+  def tearDown(self):
+    self.client.close()
+    self.server.shutdown()
+    self.server.server_close()
+
+  def make_request(self, path, method='GET'):
+    return atom.http_core.HttpRequest(
+        uri=atom.http_core.Uri('http', '127.0.0.1', self.port, path),
+        method=method)
+
+  def test_concurrent_requests_reuse_connections(self):
+    futures = [self.client.start_request(self.make_request('/%i' % i))
+               for i in xrange(40)]
+    self.client.run(futures)
+    for i, future in enumerate(futures):
+      response = future.result()
+      self.assertEqual(response.status, 200)
+      self.assertEqual(response.getheader('content-type'), 'text/plain')
+      self.assertEqual(response.read(), 'path /%i' % i)
+    self.assert_(self.server.connections <= 4)
+
+  def test_body_framing(self):
+    request = self.make_request('/form', 'POST')
+    request.add_body_part('a=1', 'application/x-www-form-urlencoded')
+    response = self.client.request(request)
+    self.assertEqual(response.status, 201)
+    self.assertEqual(response.read(), 'posted a=1')
+    self.assertEqual(self.client.request(self.make_request('/chunked')).read(),
+                     'hello chunked world')
+    self.assertEqual(self.client.request(self.make_request('/close')).read(),
+                     'until close')
+    self.assertEqual(self.client.request(self.make_request('/after')).read(),
+                     'path /after')
+
+  def test_chained_futures(self):
+    def fetch_next(response):
+      return self.client.start_request(self.make_request(
+          '/next' + response.read()[len('path '):]))
+    future = self.client.start_request(self.make_request('/a')).then(
+        fetch_next).then(lambda response: response.read())
+    self.assertEqual(future.result(), 'path /next/a')
+
+  def test_connection_refused(self):
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    future = self.client.start_request(atom.http_core.HttpRequest(
+        uri=atom.http_core.Uri('http', '127.0.0.1', port, '/'), method='GET'))
+    self.assertRaises(socket.error, future.result)
+    self.assert_(isinstance(future.exception(), socket.error))
+
+  def test_host_names_looked_up_off_the_event_loop(self):
+    real_getaddrinfo = socket.getaddrinfo
+    release = threading.Event()
+    lookup_threads = []
+    def getaddrinfo(host, port, *args):
+      if host == '127.0.0.1':
+        return real_getaddrinfo(host, port, *args)
+      if args[3:] and args[3] & socket.AI_NUMERICHOST:
+        raise socket.gaierror(socket.EAI_NONAME, 'not numeric')
+      lookup_threads.append(threading.currentThread())
+      release.wait(10)
+      if host != 'stub.example':
+        raise socket.gaierror(socket.EAI_NONAME, 'unknown host')
+      return real_getaddrinfo('127.0.0.1', port, *args)
+    socket.getaddrinfo = getaddrinfo
+    try:
+      named = self.client.start_request(atom.http_core.HttpRequest(
+          uri=atom.http_core.Uri('http', 'stub.example', self.port, '/named'),
+          method='GET'))
+      unknown = self.client.start_request(atom.http_core.HttpRequest(
+          uri=atom.http_core.Uri('http', 'unknown.example', self.port, '/'),
+          method='GET'))
+      # The lookups are still blocked, which must not stop other requests.
+      self.assertEqual(self.client.request(self.make_request('/numeric')).read(),
+                       'path /numeric')
+      self.assert_(not named.done())
+      release.set()
+      self.client.run([named, unknown])
+    finally:
+      socket.getaddrinfo = real_getaddrinfo
+    self.assertEqual(named.result().read(), 'path /named')
+    self.assertRaises(socket.gaierror, unknown.result)
+    self.assertEqual(len(lookup_threads), 2)
+    self.assert_(threading.currentThread() not in lookup_threads)
+
+
+def suite():
+  return unittest.TestSuite((unittest.makeSuite(AsyncHttpClientTest, 'test'),))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+import atom.auth
+import atom.client
+import atom.http_cache
+import atom.http_core
+
+
+class EtagHttpClient(object):
+  """Serves a resource whose body changes when its version is bumped."""
+
+  def __init__(self):
+    self.version = 1
+    self.requests = []
+
+  def request(self, http_request):
+    self.requests.append(http_request)
+    etag = '"v%d"' % self.version
+    if http_request.headers.get('If-None-Match') == etag:
+      return atom.http_core.HttpResponse(status=304, reason='Not Modified')
+    return atom.http_core.HttpResponse(
+        status=200, reason='OK',
+        headers={'ETag': etag, 'Content-Type': 'application/atom+xml'},
+        body='<feed>%s</feed>' % self.version)
+
+
+def make_entry(key, body='x'):
+  return atom.http_cache.CachedResponse(key, '"1"', body)
+
+
+class MemoryCacheTest(unittest.TestCase):
+
+  def test_evicts_least_recently_used(self):
+    cache = atom.http_cache.MemoryCache(max_entries=2)
+    cache.set('a', make_entry('a'))
+    cache.set('b', make_entry('b'))
+    self.assertEqual(cache.get('a').key, 'a')
+    cache.set('c', make_entry('c'))
+    self.assert_(cache.get('b') is None)
+    self.assertEqual(cache.get('a').key, 'a')
+    self.assertEqual(cache.get('c').key, 'c')
+    self.assertEqual(len(cache), 2)
+
+  def test_size_limit(self):
+    cache = atom.http_cache.MemoryCache(max_bytes=10)
+    self.assert_(cache.set('a', make_entry('a', '123456')))
+    self.assert_(cache.set('b', make_entry('b', '1234')))
+    self.assertEqual(cache.get_size(), 10)
+    cache.set('c', make_entry('c', '12'))
+    self.assert_(cache.get('a') is None)
+    self.assertEqual(cache.get_size(), 6)
+    self.assert_(not cache.set('d', make_entry('d', '12345678901')))
+    self.assert_(cache.get('d') is None)
+    cache.delete('b')
+    self.assertEqual(cache.get_size(), 2)
+    cache.clear()
+    self.assertEqual(len(cache), 0)
+
+
+class FileCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def test_store_and_evict(self):
+    cache = atom.http_cache.FileCache(self.directory, max_entries=2)
+    entry = make_entry('a', 'body')
+    entry.tree = object()
+    cache.set('a', entry)
+    loaded = cache.get('a')
+    self.assertEqual(loaded.body, 'body')
+    self.assertEqual(loaded.tree, None)
+    # Make the first file the least recently used.
+    os.utime(cache._path('a'), (1, 1))
+    cache.set('b', make_entry('b'))
+    cache.set('c', make_entry('c'))
+    self.assert_(cache.get('a') is None)
+    self.assertEqual(cache.get('c').key, 'c')
+    self.assertEqual(len(cache), 2)
+    cache.clear()
+    self.assertEqual(len(cache), 0)
+
+  def test_survives_new_instance(self):
+    atom.http_cache.FileCache(self.directory).set('a', make_entry('a', 'abc'))
+    self.assertEqual(
+        atom.http_cache.FileCache(self.directory).get('a').body, 'abc')
+
+
+class CachedRequestTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = EtagHttpClient()
+    self.client = atom.client.AtomPubClient(
+        self.server, response_cache=atom.http_cache.MemoryCache())
+
+  def test_revalidates_with_etag(self):
+    response = self.client.get('http://example.com/feed')
+    self.assertEqual(response.read(), '<feed>1</feed>')
+    self.assert_(not response.cache_hit)
+    response = self.client.get('http://example.com/feed')
+    self.assertEqual(self.server.requests[-1].headers['If-None-Match'],
+                     '"v1"')
+    self.assertEqual(response.status, 200)
+    self.assert_(response.cache_hit)
+    self.assertEqual(response.read(), '<feed>1</feed>')
+    self.server.version = 2
+    response = self.client.get('http://example.com/feed')
+    self.assert_(not response.cache_hit)
+    self.assertEqual(response.read(), '<feed>2</feed>')
+
+  def test_keyed_by_auth_identity(self):
+    self.client.get('http://example.com/feed',
+                    auth_token=atom.auth.BasicAuth('a', '1'))
+    self.client.get('http://example.com/feed',
+                    auth_token=atom.auth.BasicAuth('b', '1'))
+    self.assert_('If-None-Match' not in self.server.requests[-1].headers)
+    self.client.get('http://example.com/feed',
+                    auth_token=atom.auth.BasicAuth('a', '1'))
+    self.assert_('If-None-Match' in self.server.requests[-1].headers)
+
+  def test_caller_revalidation_is_not_intercepted(self):
+    self.client.get('http://example.com/feed')
+    response = self.client.get('http://example.com/feed',
+        custom_headers=atom.client.CustomHeaders(**{'If-None-Match': '"v1"'}))
+    self.assertEqual(response.status, 304)
+
+  def test_other_methods_are_not_cached(self):
+    self.client.request('POST', 'http://example.com/feed')
+    self.client.get('http://example.com/feed')
+    self.assert_('If-None-Match' not in self.server.requests[-1].headers)
+
+
+def suite():
+  return unittest.TestSuite((
+      unittest.makeSuite(MemoryCacheTest, 'test'),
+      unittest.makeSuite(FileCacheTest, 'test'),
+      unittest.makeSuite(CachedRequestTest, 'test')))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -23,7 +23,11 @@ __author__ = 'j.s@google.com (Jeff Scudder)'
 
 import unittest
 import atom.http_core
+import BaseHTTPServer
+import httplib
 import StringIO
+import threading
+import zlib
 
 
 class UriTest(unittest.TestCase):
@@ -149,9 +153,225 @@ class HttpRequestTest(unittest.TestCase):
     self.assert_(request._body_parts != copied._body_parts)
 
 
+class KeepAliveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+  def setup(self):
+    BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+    self.server.connections += 1
+
+  def do_GET(self):
+    body = 'connection %i' % self.server.connections
+    self.send_response(200)
+    self.send_header('Content-Type', 'text/plain')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+    # Simulate a server which drops keep-alive connections without warning.
+    if self.path == '/drop':
+      self.close_connection = 1
+
+  def log_message(self, *args):
+    pass
+
+
+class LocalServer(BaseHTTPServer.HTTPServer):
+  connections = 0
+
+  def handle_error(self, request, client_address):
+    # Connections closed by the client are expected in these tests.
+    pass
+
+
+class PooledHttpClientTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = LocalServer(('127.0.0.1', 0), KeepAliveHandler)
+    self.port = self.server.server_address[1]
+    self.thread = threading.Thread(target=self.server.serve_forever,
+                                   kwargs={'poll_interval': 0.05})
+    self.thread.setDaemon(True)
+    self.thread.start()
+    self.client = atom.http_core.PooledHttpClient()
+
+  def tearDown(self):
+    self.client.close()
+    self.server.shutdown()
+    self.server.server_close()
+
+  def get(self, path):
+    request = atom.http_core.HttpRequest(
+        uri=atom.http_core.Uri(host='127.0.0.1', port=self.port, path=path),
+        method='GET')
+    return self.client.request(request)
+
+  def test_reuses_connection(self):
+    for i in range(3):
+      response = self.get('/')
+      self.assertEqual(response.status, 200)
+      self.assertEqual(response.read(), 'connection 1')
+    self.assertEqual(self.server.connections, 1)
+    self.assertEqual(len(self.client._idle[('http', '127.0.0.1', self.port)]),
+                     1)
+
+  def test_replaces_stale_connection(self):
+    self.assertEqual(self.get('/drop').read(), 'connection 1')
+    self.assertEqual(self.get('/').read(), 'connection 2')
+    self.assertEqual(self.get('/').read(), 'connection 2')
+
+  def test_unread_response_is_not_reused(self):
+    response = self.get('/')
+    response.close()
+    self.assertEqual(self.get('/').read(), 'connection 2')
+    self.assertEqual(self.client._active[('http', '127.0.0.1', self.port)], 0)
+
+  def test_only_idempotent_requests_are_replayed(self):
+    self.get('/').read()
+    sent = []
+    def fail(connection, method, *args):
+      sent.append(method)
+      raise httplib.BadStatusLine('')
+    self.client._send_request = fail
+    for method, headers, attempts in (('POST', {}, 1), ('PUT', {}, 1),
+                                      ('PUT', {'If-Match': '"1"'}, 2),
+                                      ('GET', {}, 2), ('DELETE', {}, 2)):
+      # Each request starts on the reused connection.
+      self.client._acquire = lambda key, uri, headers: (
+          self.client._get_connection(uri, headers), True)
+      request = atom.http_core.HttpRequest(
+          uri=atom.http_core.Uri(host='127.0.0.1', port=self.port, path='/'),
+          method=method, headers=headers)
+      request.add_body_part('data', 'text/plain')
+      del sent[:]
+      self.assertRaises(httplib.BadStatusLine, self.client.request, request)
+      self.assertEqual(sent, [method] * attempts)
+
+
+class GzipHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+  body = '<feed>%s</feed>' % ('<entry/>' * 10000)
+
+  def _respond(self, body):
+    self.send_response(200)
+    self.send_header('Content-Type', 'application/atom+xml')
+    if ('gzip' in self.headers.get('Accept-Encoding', '')
+        and 'gzip' in self.headers.get('User-Agent', '')):
+      compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+      body = compressor.compress(body) + compressor.flush()
+      self.send_header('Content-Encoding', 'gzip')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_GET(self):
+    self._respond(self.body)
+
+  def do_POST(self):
+    if self.headers.get('Transfer-Encoding') == 'chunked':
+      chunks = []
+      size = int(self.rfile.readline(), 16)
+      while size:
+        chunks.append(self.rfile.read(size))
+        self.rfile.readline()
+        size = int(self.rfile.readline(), 16)
+      self.rfile.readline()
+      self._respond('chunked %d %s' % (len(chunks), ''.join(chunks)))
+      return
+    body = self.rfile.read(int(self.headers['Content-Length']))
+    if self.headers.get('Content-Encoding') == 'gzip':
+      body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+      self._respond('gzip %d' % len(body))
+    else:
+      self._respond('identity %d' % len(body))
+
+  def log_message(self, *args):
+    pass
+
+
+class LocalServerTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.server = LocalServer(('127.0.0.1', 0), GzipHandler)
+    self.port = self.server.server_address[1]
+    self.thread = threading.Thread(target=self.server.serve_forever,
+                                   kwargs={'poll_interval': 0.05})
+    self.thread.setDaemon(True)
+    self.thread.start()
+
+  def tearDown(self):
+    self.server.shutdown()
+    self.server.server_close()
+
+  def request(self, client, method='GET', body=None):
+    request = atom.http_core.HttpRequest(
+        uri=atom.http_core.Uri(host='127.0.0.1', port=self.port, path='/'),
+        method=method, headers={'User-Agent': 'test'})
+    if body is not None:
+      request.add_body_part(body, 'application/atom+xml')
+    return client.request(request)
+
+
+class GzipTest(LocalServerTestCase):
+
+  def test_decompresses_response(self):
+    response = self.request(atom.http_core.HttpClient(accept_gzip=True))
+    self.assert_(response.getheader('Content-Encoding') is None)
+    self.assertEqual(response.read(), GzipHandler.body)
+
+  def test_streaming_read(self):
+    client = atom.http_core.PooledHttpClient(accept_gzip=True)
+    response = self.request(client)
+    chunks = []
+    chunk = response.read(1000)
+    while chunk:
+      self.assert_(len(chunk) <= 1000)
+      chunks.append(chunk)
+      chunk = response.read(1000)
+    self.assertEqual(''.join(chunks), GzipHandler.body)
+    self.assertEqual(client._active[('http', '127.0.0.1', self.port)], 0)
+    client.close()
+
+  def test_not_requested_by_default(self):
+    response = self.request(atom.http_core.HttpClient())
+    self.assert_(response.getheader('Content-Encoding') is None)
+    self.assertEqual(response.read(), GzipHandler.body)
+
+  def test_compresses_large_request_bodies(self):
+    client = atom.http_core.HttpClient(compress_requests_over=1000)
+    self.assertEqual(self.request(client, 'POST', 'x' * 999).read(),
+                     'identity 999')
+    self.assertEqual(self.request(client, 'POST', 'x' * 5000).read(),
+                     'gzip 5000')
+
+
+class ChunkedRequestTest(LocalServerTestCase):
+
+  def test_iterable_body_is_chunked(self):
+    request = atom.http_core.HttpRequest()
+    request.add_body_part(iter(['a', 'b']), 'text/plain')
+    self.assertEqual(request.headers['Transfer-Encoding'], 'chunked')
+    self.assert_('Content-Length' not in request.headers)
+    self.assertEqual(
+        self.request(atom.http_core.HttpClient(), 'POST',
+                     (chunk for chunk in ['<feed>', '', u'<entry/>', '</feed>'])
+                     ).read(),
+        'chunked 3 <feed><entry/></feed>')
+
+  def test_pooled_client_reuses_connection(self):
+    client = atom.http_core.PooledHttpClient()
+    for i in xrange(2):
+      self.assertEqual(self.request(client, 'POST', ['x' * 10, 'y']).read(),
+                       'chunked 2 %sy' % ('x' * 10))
+    self.assertEqual(len(client._idle[('http', '127.0.0.1', self.port)]), 1)
+    client.close()
+
+
 def suite():
   return unittest.TestSuite((unittest.makeSuite(UriTest,'test'),
-                             unittest.makeSuite(HttpRequestTest,'test')))
+                             unittest.makeSuite(HttpRequestTest,'test'),
+                             unittest.makeSuite(PooledHttpClientTest,'test'),
+                             unittest.makeSuite(GzipTest,'test'),
+                             unittest.makeSuite(ChunkedRequestTest,'test')))
 
  
 if __name__ == '__main__':
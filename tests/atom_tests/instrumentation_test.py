@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import BaseHTTPServer
+import socket
+import threading
+import unittest
+import atom.client
+import atom.http_core
+import atom.instrumentation
+
+
+class RecordingHook(atom.instrumentation.RequestHook):
+
+  def __init__(self):
+    self.calls = []
+
+  def before_send(self, event):
+    self.calls.append(('before_send', event.status))
+
+  def after_headers(self, event):
+    self.calls.append(('after_headers', event.status))
+
+  def after_body(self, event):
+    self.calls.append(('after_body', event.bytes_in))
+
+
+class StatusHttpClient(object):
+
+  def __init__(self, status=200, body='hello'):
+    self.status = status
+    self.body = body
+
+  def request(self, http_request):
+    if self.status is None:
+      raise socket.error('refused')
+    return atom.http_core.HttpResponse(status=self.status, reason='',
+                                       body=self.body)
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+  def do_GET(self):
+    self.send_response(200)
+    self.send_header('Content-Length', '4')
+    self.end_headers()
+    self.wfile.write('body')
+
+  def log_message(self, *args):
+    pass
+
+
+class PathTemplateTest(unittest.TestCase):
+
+  def test_replaces_ids(self):
+    self.assertEqual(atom.instrumentation.path_template(
+        '/m8/feeds/contacts/joe%40example.com/full/5a1c'),
+        '/m8/feeds/contacts/{id}/full/5a1c')
+    self.assertEqual(atom.instrumentation.path_template('/feeds/1234/private'),
+                     '/feeds/{id}/private')
+    self.assertEqual(atom.instrumentation.path_template(
+        '/feeds/documents/private/full/document%3A0Abc123XyZ890def'),
+        '/feeds/documents/private/full/{id}')
+    self.assertEqual(atom.instrumentation.path_template(
+        '/calendar/feeds/default/allcalendars/full'),
+        '/calendar/feeds/default/allcalendars/full')
+
+
+class HistogramTest(unittest.TestCase):
+
+  def test_buckets_and_percentiles(self):
+    histogram = atom.instrumentation.Histogram((0.1, 1))
+    for value in (0.05, 0.05, 0.5, 2):
+      histogram.add(value)
+    self.assertEqual(histogram.counts, [2, 1, 1])
+    self.assertEqual(histogram.percentile(0.5), 0.1)
+    self.assertEqual(histogram.percentile(0.75), 1)
+    self.assertEqual(histogram.percentile(0.99), float('inf'))
+    self.assertEqual(atom.instrumentation.Histogram().percentile(0.5), None)
+
+
+class HooksTest(unittest.TestCase):
+
+  def test_client_events(self):
+    hook = RecordingHook()
+    client = atom.client.AtomPubClient(StatusHttpClient(), hooks=[hook])
+    response = client.get('http://example.com/feeds/1')
+    self.assertEqual(hook.calls, [('before_send', None),
+                                  ('after_headers', 200)])
+    self.assertEqual(response.read(), 'hello')
+    self.assertEqual(response.status, 200)
+    self.assertEqual(hook.calls[-1], ('after_body', 5))
+    self.assertEqual(response.event.get_endpoint(),
+                     'GET example.com/feeds/{id}')
+
+  def test_collector(self):
+    metrics = atom.instrumentation.MetricsCollector()
+    http_client = StatusHttpClient()
+    client = atom.client.AtomPubClient(http_client, hooks=[metrics])
+    for i in xrange(3):
+      client.get('http://example.com/feeds/%i' % i).read()
+    http_client.status = 500
+    client.get('http://example.com/feeds/4').read()
+    http_client.status = None
+    self.assertRaises(socket.error, client.get, 'http://example.com/feeds/5')
+    stats = metrics.endpoints['GET example.com/feeds/{id}']
+    self.assertEqual(stats.requests, 5)
+    self.assertEqual(stats.errors, 2)
+    self.assertEqual(stats.get_error_rate(), 0.4)
+    self.assertEqual(stats.bytes_in, 20)
+    self.assertEqual(stats.timings['ttfb'].count, 4)
+    self.assertEqual(stats.timings['download_time'].count, 4)
+    exported = metrics.export()
+    self.assert_('gdata_requests_total{endpoint="GET example.com/feeds/{id}"}'
+                 ' 5\n' in exported)
+    self.assert_('gdata_ttfb_seconds_bucket{endpoint="GET example.com/feeds/'
+                 '{id}",le="+Inf"} 4\n' in exported)
+    self.assert_('gdata_parse_seconds' not in exported)
+
+  def test_http_client_hooks(self):
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=server.handle_request)
+    thread.setDaemon(True)
+    thread.start()
+    metrics = atom.instrumentation.MetricsCollector()
+    http_client = atom.http_core.HttpClient(hooks=[metrics])
+    client = atom.client.AtomPubClient(http_client, hooks=[metrics])
+    try:
+      response = client.get(
+          'http://127.0.0.1:%i/feed' % server.server_address[1])
+      self.assertEqual(response.read(), 'body')
+    finally:
+      thread.join()
+      server.server_close()
+    stats = metrics.endpoints['GET 127.0.0.1/feed']
+    # The hook shared by both is told about the request once.
+    self.assertEqual(stats.requests, 1)
+    self.assertEqual(stats.bytes_in, 4)
+    self.assertEqual(stats.timings['connect_time'].count, 1)
+
+
+def suite():
+  return unittest.TestSuite((
+      unittest.makeSuite(PathTemplateTest, 'test'),
+      unittest.makeSuite(HistogramTest, 'test'),
+      unittest.makeSuite(HooksTest, 'test')))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+import time
+import unittest
+import atom.auth
+import atom.client
+import atom.http_core
+import atom.rate_limit
+
+
+class StatusHttpClient(object):
+
+  def __init__(self, status=200):
+    self.status = status
+    self.sent = []
+
+  def request(self, http_request):
+    self.sent.append(time.time())
+    return atom.http_core.HttpResponse(status=self.status, reason='',
+                                       body='')
+
+
+def make_request(method='GET', uri='http://example.com/feed'):
+  return atom.http_core.HttpRequest(uri=uri, method=method)
+
+
+class TokenBucketTest(unittest.TestCase):
+
+  def test_paces_after_burst(self):
+    bucket = atom.rate_limit.TokenBucket(50, burst=2)
+    start = time.time()
+    waits = [bucket.acquire() for i in xrange(7)]
+    self.assertEqual(waits[:2], [0, 0])
+    self.assert_(time.time() - start >= 0.09)
+
+  def test_shared_between_threads(self):
+    bucket = atom.rate_limit.TokenBucket(100, burst=1)
+    start = time.time()
+    threads = [threading.Thread(target=bucket.acquire) for i in xrange(10)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assert_(time.time() - start >= 0.08)
+
+
+class RateLimiterTest(unittest.TestCase):
+
+  def test_separate_budgets(self):
+    limiter = atom.rate_limit.RateLimiter(read_rate=10, write_rate=2)
+    self.assertEqual(limiter.get_rate(make_request('GET')), 10)
+    self.assertEqual(limiter.get_rate(make_request('POST')), 2)
+    limiter.record(make_request('POST'), None,
+                   atom.http_core.HttpResponse(status=503))
+    self.assertEqual(limiter.get_rate(make_request('POST')), 1)
+    self.assertEqual(limiter.get_rate(make_request('GET')), 10)
+    token = atom.auth.BasicAuth('a', 'b')
+    self.assertEqual(limiter.get_rate(make_request('POST'), token), 2)
+    self.assertEqual(
+        limiter.get_rate(make_request('POST', 'http://example.org/')), 2)
+
+  def test_adapts_to_quota_errors(self):
+    limiter = atom.rate_limit.RateLimiter(read_rate=10)
+    request = make_request()
+    limiter.record(request, None, atom.http_core.HttpResponse(status=403))
+    # Errors from requests already in flight do not cut the rate again.
+    limiter.record(request, None, atom.http_core.HttpResponse(status=403))
+    self.assertEqual(limiter.get_rate(request), 5)
+    for i in xrange(10):
+      limiter.record(request, None, atom.http_core.HttpResponse(status=200))
+    self.assertAlmostEqual(limiter.get_rate(request), 7)
+    for i in xrange(100):
+      limiter.record(request, None, atom.http_core.HttpResponse(status=200))
+    self.assertEqual(limiter.get_rate(request), 10)
+
+  def test_client_is_paced(self):
+    http_client = StatusHttpClient()
+    limiter = atom.rate_limit.RateLimiter(read_rate=50, burst=1)
+    clients = [atom.client.AtomPubClient(http_client, rate_limiter=limiter)
+               for i in xrange(2)]
+    for i in xrange(3):
+      for client in clients:
+        client.get('http://example.com/feed')
+    self.assert_(http_client.sent[-1] - http_client.sent[0] >= 0.09)
+
+
+def suite():
+  return unittest.TestSuite((
+      unittest.makeSuite(TokenBucketTest, 'test'),
+      unittest.makeSuite(RateLimiterTest, 'test')))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -18,12 +18,20 @@
 __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
+import threading
 import unittest
 import atom.token_store
 import atom.http_interface
 import atom.service
 import atom.url
 
+
+class ExpiredToken(atom.service.BasicAuthToken):
+
+  def valid_for_scope(self, url):
+    return False
+
+
 class TokenStoreTest(unittest.TestCase):
 
   def setUp(self):
@@ -69,6 +77,85 @@ class TokenStoreTest(unittest.TestCase):
     self.assert_(isinstance(token_store.find_token('http://example.org/'), 
         atom.http_interface.GenericToken))
 
+  def testFindMostSpecificToken(self):
+    general = atom.service.BasicAuthToken('general',
+        scopes=['http://www.example.com/feeds'])
+    specific = atom.service.BasicAuthToken('specific',
+        scopes=['http://www.example.com/feeds/private'])
+    everything = atom.service.BasicAuthToken('everything',
+        scopes=[atom.token_store.SCOPE_ALL])
+    token_store = atom.token_store.TokenStore()
+    token_store.add_token(everything)
+    token_store.add_token(general)
+    token_store.add_token(specific)
+    self.assert_(token_store.find_token(
+        'http://www.example.com/feeds/private/full') == specific)
+    self.assert_(token_store.find_token(
+        'http://www.example.com/feeds/public') == general)
+    self.assert_(token_store.find_token(
+        'http://www.example.com/') == everything)
+    self.assert_(token_store.find_token(
+        'http://www.example.org/feeds') == everything)
+
+    self.assert_(token_store.remove_token(specific))
+    self.assert_(not token_store.remove_token(specific))
+    self.assert_(token_store.find_token(
+        'http://www.example.com/feeds/private/full') == general)
+    token_store.remove_all_tokens()
+    self.assert_(isinstance(token_store.find_token(
+            'http://www.example.com/feeds/private/full'),
+        atom.http_interface.GenericToken))
+
+  def testReplaceTokenWithSameScope(self):
+    replacement = atom.service.BasicAuthToken('aaa2',
+        scopes=['http://example.com/'])
+    self.tokens.add_token(replacement)
+    self.assert_(self.tokens.find_token('http://example.com/') == replacement)
+    self.assert_(self.tokens.find_token('http://example.org/') == self.token)
+    self.assert_(self.tokens.remove_token(self.token))
+    self.assert_(self.tokens.find_token('http://example.com/x') == replacement)
+    self.assert_(isinstance(self.tokens.find_token('http://example.org/'),
+        atom.http_interface.GenericToken))
+
+  def testInvalidTokenForExactUrlIsRemoved(self):
+    expired = ExpiredToken('expired', scopes=['http://example.com/private'])
+    self.tokens.add_token(expired)
+    self.assert_(self.tokens.find_token('http://example.com/private/x') ==
+        self.token)
+    self.assert_(self.tokens.remove_token(expired))
+    self.tokens.add_token(expired)
+    self.assert_(self.tokens.find_token('http://example.com/private') ==
+        self.token)
+    self.assert_(not self.tokens.remove_token(expired))
+    self.assert_(self.tokens.find_token('http://example.com/') == self.token)
+
+  def testScopedTokensInConstructor(self):
+    token_store = atom.token_store.TokenStore(
+        {'http://example.com/': self.token})
+    self.assert_(token_store.find_token('http://example.com/a') == self.token)
+
+  def testConcurrentAccess(self):
+    errors = []
+    def add_find_remove(i):
+      try:
+        token = atom.service.BasicAuthToken(str(i),
+            scopes=['http://example.com/%d/' % i])
+        for j in xrange(50):
+          self.tokens.add_token(token)
+          if self.tokens.find_token('http://example.com/%d/x' % i) != token:
+            errors.append(i)
+          self.tokens.remove_token(token)
+      except Exception, e:
+        errors.append(e)
+    threads = [threading.Thread(target=add_find_remove, args=(i,))
+               for i in xrange(8)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual(errors, [])
+    self.assert_(self.tokens.find_token('http://example.com/5/x') == self.token)
+
 
 def suite():
   return unittest.TestSuite((unittest.makeSuite(TokenStoreTest,'test'),))
@@ -21,10 +21,24 @@
 __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
+import datetime
+import gc
+import os
+import tempfile
+import threading
+import time
 import unittest
+import weakref
 import gdata.client
+import gdata.core
 import gdata.gauth
 import gdata.data
+import atom.data
+import atom.client
+import atom.http_async
+import atom.http_cache
+import atom.http_core
+import atom.instrumentation
 import atom.mock_http_core
 import StringIO
 
@@ -370,6 +384,895 @@ class UpdateTest(unittest.TestCase):
                      'https://example.com/test')
 
 
+def make_page(number, entries, next_page=None):
+  feed = gdata.data.GDFeed()
+  feed.link.append(atom.data.Link(
+      rel='self', href='http://example.com/page%i' % number))
+  if next_page is not None:
+    feed.link.append(atom.data.Link(
+        rel='next', href='http://example.com/page%i' % next_page))
+  for entry_id in entries:
+    feed.entry.append(gdata.data.GDEntry(id=atom.data.Id(entry_id)))
+  return feed.to_string()
+
+
+class IterEntriesTest(unittest.TestCase):
+
+  def setUp(self):
+    self.client = gdata.client.GDClient()
+    self.client.http_client = atom.mock_http_core.MockHttpClient()
+    pages = [(1, ['a', 'b'], 2), (2, [], 3), (3, ['c', 'd'], 4),
+             (4, ['e'], None)]
+    for number, entries, next_page in pages:
+      self.client.http_client.add_response(
+          atom.http_core.HttpRequest('http://example.com/page%i' % number,
+                                     'GET'),
+          200, 'OK', body=make_page(number, entries, next_page))
+
+  def ids(self, entries):
+    return [entry.id.text for entry in entries]
+
+  def test_iterate_all_pages(self):
+    entries = self.client.iter_entries('http://example.com/page1')
+    self.assertEqual(self.ids(entries), ['a', 'b', 'c', 'd', 'e'])
+    self.assert_(entries.resume_token is None)
+
+  def test_start_from_feed(self):
+    feed = self.client.get_feed('http://example.com/page3')
+    self.assertEqual(self.ids(self.client.iter_entries(feed)),
+                     ['c', 'd', 'e'])
+
+  def test_limit_and_resume(self):
+    entries = self.client.iter_entries('http://example.com/page1', limit=3)
+    self.assertEqual(self.ids(entries), ['a', 'b', 'c'])
+    token = entries.resume_token
+    self.assertEqual(token, ('http://example.com/page3', 1))
+    resumed = self.client.iter_entries(None, resume_token=token)
+    self.assertEqual(self.ids(resumed), ['d', 'e'])
+
+  def test_resume_at_page_boundary(self):
+    entries = self.client.iter_entries('http://example.com/page1', limit=2)
+    self.assertEqual(self.ids(entries), ['a', 'b'])
+    self.assertEqual(entries.resume_token, ('http://example.com/page2', 0))
+    resumed = self.client.iter_entries(None,
+                                       resume_token=entries.resume_token)
+    self.assertEqual(self.ids(resumed), ['c', 'd', 'e'])
+
+  def test_prefetch(self):
+    for depth in (1, 2, 5):
+      entries = self.client.iter_entries('http://example.com/page1',
+                                         prefetch=depth)
+      self.assertEqual(self.ids(entries), ['a', 'b', 'c', 'd', 'e'])
+      self.assert_(entries.resume_token is None)
+
+  def test_prefetch_limit_and_resume(self):
+    entries = self.client.iter_entries('http://example.com/page1', limit=3,
+                                       prefetch=2)
+    self.assertEqual(self.ids(entries), ['a', 'b', 'c'])
+    self.assertEqual(entries.resume_token, ('http://example.com/page3', 1))
+
+  def test_prefetch_error(self):
+    entries = self.client.iter_entries('http://example.com/page1',
+                                       prefetch=1)
+    self.client.http_client._recordings.pop(1)
+    self.assertEqual(entries.next().id.text, 'a')
+    self.assertEqual(entries.next().id.text, 'b')
+    self.assertRaises(atom.mock_http_core.NoRecordingFound, entries.next)
+
+  def test_abandoned_prefetch_stops(self):
+    entries = self.client.iter_entries('http://example.com/page1',
+                                       prefetch=1)
+    for entry in entries:
+      break
+    thread = entries._prefetcher._thread
+    collected = weakref.ref(entries)
+    del entries, entry
+    gc.collect()
+    self.assert_(collected() is None)
+    thread.join(5)
+    self.assert_(not thread.isAlive())
+
+
+class StartIndexHttpClient(object):
+  """Serves a feed whose pages are selected by start-index."""
+
+  def __init__(self, total=10, per_page=3):
+    self.total = total
+    self.per_page = per_page
+    self.requests = []
+
+  def request(self, http_request):
+    self.requests.append(http_request)
+    start = int(http_request.uri.query.get('start-index', 1))
+    per_page = int(http_request.uri.query.get('max-results', self.per_page))
+    feed = gdata.data.GDFeed()
+    feed.total_results = gdata.data.TotalResults(text=str(self.total))
+    feed.start_index = gdata.data.StartIndex(text=str(start))
+    feed.items_per_page = gdata.data.ItemsPerPage(text=str(per_page))
+    for i in xrange(start, min(start + per_page, self.total + 1)):
+      feed.entry.append(gdata.data.GDEntry(id=atom.data.Id(str(i))))
+    return atom.mock_http_core.MockHttpResponse(200, 'OK',
+                                                body=feed.to_string())
+
+
+class IterShardedEntriesTest(unittest.TestCase):
+
+  def setUp(self):
+    self.client = gdata.client.GDClient()
+    self.client.http_client = StartIndexHttpClient()
+
+  def ids(self, entries):
+    return [entry.id.text for entry in entries]
+
+  def test_ordered(self):
+    entries = self.client.iter_sharded_entries(
+        'http://example.com/feed', workers=3)
+    self.assertEqual(self.ids(entries), [str(i) for i in xrange(1, 11)])
+    starts = sorted(
+        [int(r.uri.query.get('start-index', 1))
+         for r in self.client.http_client.requests])
+    self.assertEqual(starts, [1, 4, 7, 10])
+
+  def test_unordered(self):
+    entries = self.client.iter_sharded_entries(
+        'http://example.com/feed', workers=2, ordered=False)
+    self.assertEqual(sorted(self.ids(entries), key=int),
+                     [str(i) for i in xrange(1, 11)])
+
+  def test_query_range_is_replaced(self):
+    query = gdata.client.Query(text_query='x', max_results=4)
+    entries = self.client.iter_sharded_entries(
+        'http://example.com/feed', q=query)
+    self.assertEqual(self.ids(entries), [str(i) for i in xrange(1, 11)])
+    for request in self.client.http_client.requests:
+      self.assertEqual(request.uri.query['q'], 'x')
+      self.assertEqual(request.uri.query['max-results'], '4')
+    self.assert_(query.start_index is None)
+
+
+class BatchHttpClient(object):
+  """Answers batch requests, failing chosen entries once with a 503."""
+
+  def __init__(self, flaky_titles=()):
+    self.flaky_titles = set(flaky_titles)
+    self.requests = []
+    self.lock = threading.Lock()
+
+  def request(self, http_request):
+    # Streamed bodies are iterables of strs.
+    body = ''.join([part if isinstance(part, str) else ''.join(part)
+                    for part in http_request._body_parts])
+    self.headers = http_request.headers
+    request_feed = atom.core.parse(body, gdata.data.BatchFeed)
+    response_feed = gdata.data.BatchFeed()
+    self.lock.acquire()
+    try:
+      self.requests.append(request_feed)
+      for entry in request_feed.entry:
+        result = gdata.data.BatchEntry(title=atom.data.Title(entry.title.text),
+                                       batch_id=entry.batch_id)
+        if entry.title.text in self.flaky_titles:
+          self.flaky_titles.remove(entry.title.text)
+          result.batch_status = gdata.data.BatchStatus(code='503')
+        else:
+          result.batch_status = gdata.data.BatchStatus(code='201')
+        response_feed.entry.append(result)
+    finally:
+      self.lock.release()
+    return atom.mock_http_core.MockHttpResponse(
+        200, 'OK', body=response_feed.to_string())
+
+
+class BatchExecutorTest(unittest.TestCase):
+
+  def setUp(self):
+    self.client = gdata.client.GDClient()
+
+  def make_executor(self, count, **kwargs):
+    executor = gdata.client.BatchExecutor(
+        self.client, 'http://example.com/batch', **kwargs)
+    executor.retry_delay = 0
+    for i in xrange(count):
+      entry = gdata.data.BatchEntry(title=atom.data.Title('e%i' % i))
+      if i == 0:
+        entry.batch_id = gdata.data.BatchId(text='first')
+      executor.add_insert(entry)
+    return executor
+
+  def test_streamed_batches(self):
+    self.client.http_client = BatchHttpClient()
+    self.client.stream_xml = True
+    results = self.make_executor(3).execute()
+    self.assertEqual([result.title.text for result in results],
+                     ['e0', 'e1', 'e2'])
+    self.assertEqual(self.client.http_client.headers['Transfer-Encoding'],
+                     'chunked')
+
+  def test_split_and_merge(self):
+    self.client.http_client = BatchHttpClient()
+    executor = self.make_executor(25, max_entries=10, workers=3)
+    results = executor.execute()
+    self.assertEqual(sorted([len(feed.entry)
+                             for feed in self.client.http_client.requests]),
+                     [5, 10, 10])
+    self.assertEqual([result.title.text for result in results],
+                     ['e%i' % i for i in xrange(25)])
+    self.assertEqual(results[0].batch_id.text, 'first')
+    self.assert_(results[1].batch_id is None)
+    self.assertEqual(executor.operations[0][0].batch_id.text, 'first')
+    for feed in self.client.http_client.requests:
+      for entry in feed.entry:
+        self.assertEqual(entry.batch_operation.type, 'insert')
+
+  def test_byte_limit(self):
+    self.client.http_client = BatchHttpClient()
+    executor = self.make_executor(6, max_bytes=1)
+    executor.execute()
+    self.assertEqual(len(self.client.http_client.requests), 6)
+
+  def test_retry(self):
+    self.client.http_client = BatchHttpClient(['e3', 'e7'])
+    results = self.make_executor(10, max_entries=4).execute()
+    self.assertEqual([result.batch_status.code for result in results],
+                     ['201'] * 10)
+    self.assertEqual(len(self.client.http_client.requests), 4)
+    self.assertEqual([entry.title.text
+                      for entry in self.client.http_client.requests[-1].entry],
+                     ['e3', 'e7'])
+
+  def test_retries_exhausted(self):
+    self.client.http_client = BatchHttpClient(['e1'])
+    results = self.make_executor(3, max_attempts=1).execute()
+    self.assertEqual([result.batch_status.code for result in results],
+                     ['201', '503', '201'])
+
+  def test_entries_unchanged_and_serialized_once(self):
+    self.client.http_client = BatchHttpClient(['e1'])
+    executor = self.make_executor(3)
+    serializations = []
+    for entry, operation in executor.operations:
+      def to_string(version=1, encoding=None, pretty_print=None,
+                    entry=entry):
+        serializations.append(entry.title.text)
+        return gdata.data.BatchEntry.to_string(entry, version, encoding,
+                                               pretty_print)
+      entry.to_string = to_string
+    results = executor.execute()
+    self.assertEqual([result.batch_status.code for result in results],
+                     ['201'] * 3)
+    self.assertEqual(len(self.client.http_client.requests), 2)
+    self.assertEqual(sorted(serializations), ['e0', 'e1', 'e2'])
+    self.assertEqual(executor.operations[0][0].batch_id.text, 'first')
+    for entry, operation in executor.operations:
+      self.assert_(entry.batch_operation is None)
+    for entry, operation in executor.operations[1:]:
+      self.assert_(entry.batch_id is None)
+
+
+class DownloadTest(unittest.TestCase):
+
+  def setUp(self):
+    self.body = ''.join([chr(i % 256) for i in xrange(10000)])
+    self.client = gdata.client.GDClient()
+    self.client.http_client = atom.mock_http_core.MockHttpClient()
+    self.client.http_client.add_response(
+        atom.http_core.HttpRequest('http://example.com/file', 'GET'),
+        200, 'OK', body=self.body,
+        headers={'Content-Length': str(len(self.body))})
+    self.client.http_client.add_response(
+        atom.http_core.HttpRequest('http://example.com/missing', 'GET'),
+        404, 'Not Found', body='gone')
+
+  def test_iterate_chunks(self):
+    stream = self.client.open_stream('http://example.com/file',
+                                     chunk_size=4096)
+    chunks = list(stream)
+    self.assertEqual([len(chunk) for chunk in chunks], [4096, 4096, 1808])
+    self.assertEqual(''.join(chunks), self.body)
+
+  def test_download_to_file(self):
+    progress = []
+    handle, path = tempfile.mkstemp()
+    os.close(handle)
+    try:
+      written = self.client.download_to_file(
+          'http://example.com/file', path, chunk_size=3000,
+          progress=lambda done, total: progress.append((done, total)))
+      self.assertEqual(written, 10000)
+      self.assertEqual(open(path, 'rb').read(), self.body)
+    finally:
+      os.remove(path)
+    self.assertEqual(progress, [(3000, 10000), (6000, 10000), (9000, 10000),
+                                (10000, 10000)])
+
+  def test_error(self):
+    try:
+      self.client.open_stream('http://example.com/missing')
+      self.fail('Expected a RequestError')
+    except gdata.client.RequestError, error:
+      self.assertEqual(error.status, 404)
+      self.assertEqual(error.body, 'gone')
+
+
+class ResumableUploadServer(object):
+  """Implements the server side of the resumable upload protocol.
+
+  failures lists what to do with the PUT requests which carry data, in
+  order: 'error' responds with a 503 and 'half' keeps only half of the
+  chunk. Other requests are handled normally. Requests which carry data
+  take delay seconds, and the first query_failures status queries are
+  answered with a 503.
+  """
+
+  def __init__(self, total, failures=(), delay=0, query_failures=0):
+    self.total = total
+    self.failures = list(failures)
+    self.delay = delay
+    self.query_failures = query_failures
+    self.received = ''
+    self.chunk_sizes = []
+
+  def request(self, http_request):
+    if (http_request.method == 'POST'
+        and 'Content-Range' not in http_request.headers):
+      return atom.mock_http_core.MockHttpResponse(
+          200, 'OK', headers={'Location': 'http://example.com/session'})
+    data = ''.join(http_request._body_parts)
+    if not data and self.query_failures:
+      self.query_failures -= 1
+      return atom.mock_http_core.MockHttpResponse(503, 'Unavailable',
+                                                  body='')
+    if data:
+      time.sleep(self.delay)
+      failure = self.failures and self.failures.pop(0)
+      if failure == 'error':
+        return atom.mock_http_core.MockHttpResponse(503, 'Unavailable',
+                                                    body='')
+      start = int(http_request.headers['Content-Range'].split()[1]
+                  .split('-')[0])
+      assert start == len(self.received)
+      self.chunk_sizes.append(len(data))
+      if failure == 'half':
+        data = data[:len(data) // 2]
+      self.received += data
+    if len(self.received) == self.total:
+      entry = gdata.data.GDEntry(id=atom.data.Id('done'))
+      return atom.mock_http_core.MockHttpResponse(201, 'Created',
+                                                  body=entry.to_string())
+    headers = {}
+    if self.received:
+      headers['Range'] = 'bytes=0-%i' % (len(self.received) - 1)
+    return atom.mock_http_core.MockHttpResponse(308, 'Resume Incomplete',
+                                                headers=headers, body='')
+
+
+class PipelinedResumableUploaderTest(unittest.TestCase):
+
+  def setUp(self):
+    self.content = ''.join([chr(i % 251) for i in xrange(1000000)])
+    self.client = gdata.client.GDClient()
+
+  def upload(self, failures=(), adaptive=True, server=None, **kwargs):
+    if server is None:
+      server = ResumableUploadServer(len(self.content), failures)
+    self.client.http_client = server
+    uploader = gdata.client.PipelinedResumableUploader(
+        self.client, StringIO.StringIO(self.content), 'text/plain',
+        len(self.content), chunk_size=262144, **kwargs)
+    uploader.retry_delay = 0
+    uploader.adaptive = adaptive
+    uploader.target_chunk_seconds = 0.06
+    entry = uploader.upload_file('http://example.com/upload')
+    self.assertEqual(entry.id.text, 'done')
+    self.assertEqual(server.received, self.content)
+    return uploader, server
+
+  def test_upload(self):
+    uploader, server = self.upload()
+    self.assertEqual(sum(server.chunk_sizes), len(self.content))
+
+  def test_resume_after_errors(self):
+    uploader, server = self.upload(['half', 'error', 'error'])
+    self.assertEqual(server.chunk_sizes[:2], [262144, 262144])
+
+  def test_adaptive_chunk_size(self):
+    uploader, server = self.upload()
+    # The mock server answers at once, so the chunk size keeps doubling.
+    self.assertEqual(server.chunk_sizes, [262144, 524288, 213568])
+
+  def test_fixed_chunk_size(self):
+    uploader, server = self.upload(adaptive=False)
+    self.assertEqual(server.chunk_sizes, [262144, 262144, 262144, 213568])
+
+  def test_chunk_size_follows_throughput(self):
+    # Each chunk takes about the target time, so the size stays put.
+    server = ResumableUploadServer(len(self.content), delay=0.05)
+    uploader, server = self.upload(server=server)
+    self.assertEqual(server.chunk_sizes, [262144, 262144, 262144, 213568])
+
+  def test_retry_after_status_query_error(self):
+    server = ResumableUploadServer(len(self.content), ['error'],
+                                   query_failures=1)
+    uploader, server = self.upload(server=server)
+    self.assertEqual(sum(server.chunk_sizes), len(self.content))
+
+  def test_retry_deadline(self):
+    server = ResumableUploadServer(len(self.content), ['error'] * 50,
+                                   delay=0.05)
+    self.client.http_client = server
+    policy = gdata.client.RetryPolicy(max_attempts=50, initial_delay=0,
+                                      jitter=0, deadline=0.3)
+    uploader = gdata.client.PipelinedResumableUploader(
+        self.client, StringIO.StringIO(self.content), 'text/plain',
+        len(self.content), chunk_size=262144, retry_policy=policy)
+    self.assertRaises(gdata.client.RequestError, uploader.upload_file,
+                      'http://example.com/upload')
+    # The deadline counts from the first failed attempt.
+    self.assert_(len(server.failures) > 40)
+
+
+class MultiSessionUploadServer(object):
+  """Serves resumable upload sessions, one per started upload.
+
+  A chunk PUT to a session listed in fail_once is answered with a 500 the
+  first time. Of the first chunk PUT to a session listed in truncate_once,
+  only half is kept.
+  """
+
+  def __init__(self, fail_once=(), truncate_once=()):
+    self.fail_once = set(fail_once)
+    self.truncate_once = set(truncate_once)
+    self.sessions = {}
+    self.started = []
+    self.lock = threading.Lock()
+
+  def request(self, http_request):
+    self.lock.acquire()
+    try:
+      return self._respond(http_request)
+    finally:
+      self.lock.release()
+
+  def _respond(self, http_request):
+    path = http_request.uri.path
+    content_range = http_request.headers.get('Content-Range', '')
+    if path == '/upload':
+      name = http_request.headers['Slug']
+      self.sessions[name] = ''
+      self.started.append(name)
+      return atom.mock_http_core.MockHttpResponse(
+          200, 'OK', headers={'Location': 'http://example.com/s/' + name})
+    name = path.split('/')[-1]
+    total = int(content_range.split('/')[-1])
+    if not content_range.startswith('bytes */'):
+      if name in self.fail_once and self.sessions[name]:
+        self.fail_once.remove(name)
+        return atom.mock_http_core.MockHttpResponse(500, 'Error', body='')
+      start = int(content_range.split()[1].split('-')[0])
+      assert start == len(self.sessions[name])
+      data = ''.join(http_request._body_parts)
+      if name in self.truncate_once:
+        self.truncate_once.remove(name)
+        data = data[:len(data) // 2]
+      self.sessions[name] += data
+    received = len(self.sessions[name])
+    if received == total:
+      entry = gdata.data.GDEntry(id=atom.data.Id(name))
+      return atom.mock_http_core.MockHttpResponse(201, 'Created',
+                                                  body=entry.to_string())
+    return atom.mock_http_core.MockHttpResponse(
+        308, 'Resume Incomplete', headers={'Range': 'bytes=0-%i' % (
+            received - 1)}, body='')
+
+
+class UploadSchedulerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.state_path = os.path.join(self.directory, 'state')
+    self.files = {}
+    for i in xrange(5):
+      name = 'file%i' % i
+      path = os.path.join(self.directory, name)
+      content = name * (100000 * (i + 1))
+      f = open(path, 'wb')
+      f.write(content)
+      f.close()
+      self.files[name] = (path, content)
+    self.client = gdata.client.GDClient()
+
+  def tearDown(self):
+    for name in os.listdir(self.directory):
+      os.remove(os.path.join(self.directory, name))
+    os.rmdir(self.directory)
+
+  def make_scheduler(self, **kwargs):
+    scheduler = gdata.client.UploadScheduler(
+        self.client, self.state_path, chunk_size=262144, **kwargs)
+    for name in sorted(self.files):
+      scheduler.add(name, 'http://example.com/upload', self.files[name][0],
+                    'text/plain', headers={'Slug': name})
+    return scheduler
+
+  def test_upload_all(self):
+    server = MultiSessionUploadServer()
+    self.client.http_client = server
+    results = self.make_scheduler(workers=3).run()
+    self.assertEqual(sorted(results), sorted(self.files))
+    for name, (path, content) in self.files.iteritems():
+      self.assertEqual(server.sessions[name], content)
+      self.assertEqual(results[name].id.text, name)
+
+  def test_resume_after_failure(self):
+    server = MultiSessionUploadServer(fail_once=['file2', 'file4'])
+    self.client.http_client = server
+    scheduler = self.make_scheduler()
+    results = scheduler.run()
+    self.assertEqual(sorted(scheduler.errors), ['file2', 'file4'])
+    self.assertEqual(sorted(results), ['file0', 'file1', 'file3'])
+    # A new scheduler picks the partial sessions up from the state file.
+    results = self.make_scheduler().run()
+    self.assertEqual(sorted(results), ['file2', 'file4'])
+    self.assertEqual(sorted(server.started), sorted(self.files))
+    for name, (path, content) in self.files.iteritems():
+      self.assertEqual(server.sessions[name], content)
+    self.assertEqual(self.make_scheduler().run(), {})
+
+  def test_partial_chunk_and_retry(self):
+    server = MultiSessionUploadServer(fail_once=['file2'],
+                                      truncate_once=['file1', 'file3'])
+    self.client.http_client = server
+    self.client.retry_policy = gdata.client.RetryPolicy(initial_delay=0)
+    scheduler = self.make_scheduler()
+    results = scheduler.run()
+    self.assertEqual(scheduler.errors, {})
+    self.assertEqual(sorted(results), sorted(self.files))
+    for name, (path, content) in self.files.iteritems():
+      self.assertEqual(server.sessions[name], content)
+
+  def test_changed_file_uploaded_again(self):
+    server = MultiSessionUploadServer(fail_once=['file2'])
+    self.client.http_client = server
+    self.make_scheduler().run()
+    path, content = self.files['file2']
+    content = content[:300000]
+    f = open(path, 'wb')
+    f.write(content)
+    f.close()
+    self.files['file2'] = (path, content)
+    results = self.make_scheduler().run()
+    self.assertEqual(sorted(results), ['file2'])
+    self.assertEqual(server.started.count('file2'), 2)
+    self.assertEqual(server.sessions['file2'], content)
+
+  def test_bandwidth_limit(self):
+    limiter = gdata.client._BandwidthLimiter(1000)
+    start = time.time()
+    for i in xrange(3):
+      limiter.consume(100)
+    self.assert_(time.time() - start >= 0.2)
+
+
+class FeedCacheHttpClient(object):
+
+  def __init__(self):
+    self.requests = []
+
+  def request(self, http_request):
+    self.requests.append(http_request)
+    if http_request.headers.get('If-None-Match') == 'W/"feed1"':
+      return atom.http_core.HttpResponse(status=304, reason='Not Modified')
+    return atom.http_core.HttpResponse(
+        status=200, reason='OK',
+        headers={'ETag': 'W/"feed1"', 'Content-Type': 'application/atom+xml'},
+        body='<feed xmlns="http://www.w3.org/2005/Atom"><entry>'
+             '<title>a</title></entry></feed>')
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+  def test_cached_feed_on_not_modified(self):
+    http_client = FeedCacheHttpClient()
+    client = gdata.client.GDClient(
+        http_client, response_cache=atom.http_cache.MemoryCache())
+    feed = client.get_feed('http://example.com/feed')
+    self.assertEqual(feed.entry[0].title.text, 'a')
+    # Changes to a returned feed are not seen by later requests.
+    feed.entry[0].title.text = 'changed'
+    feed.entry.append(gdata.data.GDEntry())
+    cached = client.get_feed('http://example.com/feed')
+    self.assert_(cached is not feed)
+    self.assertEqual(len(cached.entry), 1)
+    self.assertEqual(cached.entry[0].title.text, 'a')
+    self.assertEqual(http_client.requests[-1].headers['If-None-Match'],
+                     'W/"feed1"')
+    self.assertEqual(len(http_client.requests), 2)
+    # A caller's own conditional request still sees NotModified.
+    self.assertRaises(gdata.client.NotModified, client.get_entry,
+                      'http://example.com/feed',
+                      desired_class=gdata.data.GDFeed, etag='W/"feed1"')
+
+
+class JsoncHttpClient(object):
+
+  def request(self, http_request):
+    self.last_request = http_request
+    return atom.http_core.HttpResponse(
+        status=200, reason='OK', headers={'Content-Type': 'application/json'},
+        body='{"apiVersion": "2.0", "data": {"totalItems": 800}}')
+
+
+class JsoncTest(unittest.TestCase):
+
+  def test_get_jsonc(self):
+    http_client = JsoncHttpClient()
+    client = gdata.client.GDClient(http_client)
+    feed = client.get_jsonc('http://example.com/feeds?v=2')
+    self.assert_(isinstance(feed, gdata.core.Jsonc))
+    self.assertEqual(feed.data.total_items, 800)
+    self.assertEqual(http_client.last_request.uri.query,
+                     {'alt': 'jsonc', 'v': '2'})
+
+class FlakyHttpClient(object):
+  """Fails with the queued statuses or exceptions before succeeding."""
+
+  def __init__(self, failures, headers=None):
+    self.failures = list(failures)
+    self.headers = headers or {}
+    self.requests = []
+
+  def request(self, http_request):
+    self.requests.append(http_request)
+    if self.failures:
+      failure = self.failures.pop(0)
+      if isinstance(failure, Exception):
+        raise failure
+      return atom.http_core.HttpResponse(status=failure, reason='Error',
+                                         headers=self.headers, body='error')
+    return atom.http_core.HttpResponse(status=200, reason='OK', body='ok')
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+  def setUp(self):
+    self.retries = []
+    self.policy = gdata.client.RetryPolicy(
+        initial_delay=0.001, on_retry=self.record_retry)
+
+  def record_retry(self, method, uri, attempt, delay, cause):
+    self.retries.append((method, uri, attempt, cause))
+
+  def make_client(self, http_client):
+    client = gdata.client.GDClient(http_client)
+    client.retry_policy = self.policy
+    return client
+
+  def test_retries_transient_errors(self):
+    import socket
+    error = socket.error('reset')
+    http_client = FlakyHttpClient([503, error, 500])
+    client = self.make_client(http_client)
+    self.assertEqual(client.get('http://example.com/feed').read(), 'ok')
+    self.assertEqual(len(http_client.requests), 4)
+    self.assertEqual(self.retries, [
+        ('GET', 'http://example.com/feed', 1, 503),
+        ('GET', 'http://example.com/feed', 2, error),
+        ('GET', 'http://example.com/feed', 3, 500)])
+
+  def test_gives_up_after_max_attempts(self):
+    http_client = FlakyHttpClient([503] * 5)
+    client = self.make_client(http_client)
+    try:
+      client.get('http://example.com/feed')
+      self.fail('Expected a RequestError')
+    except gdata.client.RequestError, error:
+      self.assertEqual(error.status, 503)
+    self.assertEqual(len(http_client.requests), 4)
+
+  def test_does_not_retry_post_or_client_errors(self):
+    http_client = FlakyHttpClient([503, 400])
+    client = self.make_client(http_client)
+    self.assertRaises(gdata.client.RequestError, client.post,
+                      gdata.data.GDEntry(), 'http://example.com/feed')
+    self.assertRaises(gdata.client.RequestError, client.get,
+                      'http://example.com/feed')
+    self.assertEqual(len(http_client.requests), 2)
+    self.assertEqual(self.retries, [])
+
+  def test_only_conditional_puts_retried(self):
+    http_client = FlakyHttpClient([503, 503])
+    client = self.make_client(http_client)
+    self.assertRaises(gdata.client.RequestError, client.request, 'PUT',
+                      'http://example.com/entry')
+    self.assertEqual(self.retries, [])
+    http_request = atom.http_core.HttpRequest(headers={'If-Match': '*'})
+    self.assertEqual(client.request('PUT', 'http://example.com/entry',
+                                    http_request=http_request).read(), 'ok')
+    self.assertEqual(self.retries, [('PUT', 'http://example.com/entry', 1,
+                                     503)])
+    for put in (None, {}, {'If-Match': 'W/"etag"'}):
+      self.assertEqual(self.policy.is_idempotent('PUT', put),
+                       atom.http_core._is_idempotent('PUT', put))
+
+  def test_request_policy_overrides_client(self):
+    http_client = FlakyHttpClient([503])
+    client = self.make_client(http_client)
+    self.assertRaises(gdata.client.RequestError, client.get,
+                      'http://example.com/feed',
+                      retry_policy=gdata.client.NO_RETRIES)
+
+  def test_retry_after_and_deadline(self):
+    self.assertEqual(self.policy.get_delay('GET', 1, time.time(), 503,
+                                           {'Retry-After': '7'}), 7)
+    self.policy.deadline = 5
+    self.assert_(self.policy.get_delay('GET', 1, time.time(), 503,
+                                       [('retry-after', '7')]) is None)
+    self.assert_(self.policy.get_delay('GET', 1, time.time(), 503) < 5)
+
+  def test_backoff_with_jitter(self):
+    policy = gdata.client.RetryPolicy(initial_delay=1, backoff=2, max_delay=5,
+                                      max_attempts=10)
+    for attempt, longest in ((1, 1), (2, 2), (3, 4), (4, 5), (8, 5)):
+      delay = policy.get_delay('GET', attempt, time.time(), 503)
+      self.assert_(longest / 2.0 <= delay <= longest)
+
+  def test_resumable_upload_resumes_after_error(self):
+    server = ResumableUploadServer(1000000, ['ok', 'error'])
+    client = gdata.client.GDClient(server)
+    client.retry_policy = self.policy
+    content = ''.join([chr(i % 251) for i in xrange(1000000)])
+    uploader = gdata.client.ResumableUploader(
+        client, StringIO.StringIO(content), 'application/octet-stream',
+        len(content), chunk_size=262144, desired_class=gdata.data.GDEntry)
+    uploader.upload_file('http://example.com/upload')
+    self.assertEqual(server.received, content)
+    self.assertEqual(len(self.retries), 1)
+
+
+class ImmediateHttpClient(object):
+  """Answers start_request with futures which are already done."""
+
+  entries = 0
+
+  def __init__(self):
+    self.paths = []
+
+  def start_request(self, http_request):
+    self.paths.append(http_request.uri.path)
+    future = atom.http_async.Future(self)
+    if http_request.uri.path == '/old':
+      future.set_result(atom.http_core.HttpResponse(
+          status=302, reason='Found',
+          headers={'Location': 'http://example.com/new'}, body=''))
+    elif http_request.uri.path == '/missing':
+      future.set_result(atom.http_core.HttpResponse(
+          status=404, reason='Not Found', body='missing'))
+    else:
+      future.set_result(atom.http_core.HttpResponse(
+          status=200, reason='OK',
+          body='<feed xmlns="http://www.w3.org/2005/Atom"><title>%s</title>'
+               '%s</feed>' % (http_request.uri.path, ''.join([
+                   '<entry><title>entry %i</title></entry>' % i
+                   for i in xrange(self.entries)]))))
+    return future
+
+  def request(self, http_request):
+    return self.start_request(http_request).result()
+
+
+class OAuth2HttpClient(ImmediateHttpClient):
+  """Accepts only the access token handed out by its token endpoint."""
+
+  def start_request(self, http_request):
+    if http_request.uri.path == '/o/oauth2/token':
+      self.paths.append(http_request.uri.path)
+      future = atom.http_async.Future(self)
+      future.set_result(atom.http_core.HttpResponse(
+          status=200, reason='OK',
+          body='{"access_token": "fresh", "expires_in": 3600}'))
+      return future
+    if http_request.headers.get('Authorization') != 'Bearer fresh':
+      self.paths.append(http_request.uri.path)
+      future = atom.http_async.Future(self)
+      future.set_result(atom.http_core.HttpResponse(
+          status=401, reason='Unauthorized', body=''))
+      return future
+    return ImmediateHttpClient.start_request(self, http_request)
+
+  def request(self, http_request):
+    raise AssertionError('Blocking request on the event loop')
+
+
+class AsyncGDClientTest(unittest.TestCase):
+
+  def setUp(self):
+    self.client = gdata.client.AsyncGDClient(
+        http_client=ImmediateHttpClient())
+
+  def test_default_http_client(self):
+    self.assert_(isinstance(gdata.client.AsyncGDClient().http_client,
+                            atom.http_async.AsyncHttpClient))
+
+  def test_get_feed(self):
+    future = self.client.get_feed('http://example.com/a')
+    self.assert_(isinstance(future, atom.http_async.Future))
+    feed = future.result()
+    self.assert_(isinstance(feed, gdata.data.GDFeed))
+    self.assertEqual(feed.title.text, '/a')
+
+  def test_redirect_and_errors(self):
+    self.assertEqual(
+        self.client.get_feed('http://example.com/old').result().title.text,
+        '/new')
+    self.assertEqual(self.client.http_client.paths, ['/old', '/new'])
+    future = self.client.get_entry('http://example.com/missing')
+    self.assertRaises(gdata.client.RequestError, future.result)
+    self.assertEqual(future.exception().status, 404)
+    future = self.client.get_feed('/no/host')
+    self.assertRaises(atom.client.MissingHost, future.result)
+
+  def test_oauth2_refresh_after_401(self):
+    self.client.http_client = OAuth2HttpClient()
+    token = gdata.gauth.OAuth2Token('id', 'secret', 'scope', 'agent',
+                                    access_token='stale', refresh_token='r')
+    self.client.auth_token = token
+    self.assertEqual(self.client.get_feed('http://example.com/a').result(
+        ).title.text, '/a')
+    self.assertEqual(self.client.get_feed('http://example.com/b').result(
+        ).title.text, '/b')
+    self.assertEqual(token.access_token, 'fresh')
+    self.assertEqual(self.client.http_client.paths,
+                     ['/a', '/o/oauth2/token', '/a', '/b'])
+
+  def test_oauth2_refresh_before_expiry(self):
+    self.client.http_client = OAuth2HttpClient()
+    token = gdata.gauth.OAuth2Token('id', 'secret', 'scope', 'agent',
+                                    access_token='stale', refresh_token='r')
+    token.token_expiry = datetime.datetime.now()
+    self.client.auth_token = token
+    self.assertEqual(self.client.get_feed('http://example.com/a').result(
+        ).title.text, '/a')
+    self.assertEqual(self.client.http_client.paths, ['/o/oauth2/token', '/a'])
+
+
+class LazyFeedTest(unittest.TestCase):
+
+  def test_get_feed_lazily(self):
+    client = gdata.client.GDClient(http_client=ImmediateHttpClient())
+    client.http_client.entries = 3
+    feed = client.get_feed('http://example.com/a', lazy=True)
+    self.assert_(isinstance(feed, gdata.data.GDFeed))
+    self.assertEqual(len(feed.entry), 3)
+    self.assert_(isinstance(feed.entry[0], gdata.data.GDEntry))
+    self.assert_('title' not in feed.entry[0].__dict__)
+    self.assertEqual(feed.entry[0].title.text, 'entry 0')
+
+  def test_get_feed_projection(self):
+    client = gdata.client.GDClient(http_client=ImmediateHttpClient())
+    client.http_client.entries = 2
+    feed = client.get_feed('http://example.com/a',
+                           projection=['entry.title'])
+    self.assertEqual(feed.title, None)
+    self.assertEqual([entry.title.text for entry in feed.entry],
+                     ['entry 0', 'entry 1'])
+
+
+class InstrumentationTest(unittest.TestCase):
+
+  def test_parse_timing(self):
+    metrics = atom.instrumentation.MetricsCollector()
+    client = gdata.client.GDClient(http_client=ImmediateHttpClient(),
+                                   hooks=[metrics])
+    feed = client.get_feed('http://example.com/a')
+    self.assertEqual(feed.title.text, '/a')
+    client.get('http://example.com/b').read()
+    stats = metrics.endpoints['GET example.com/a']
+    self.assertEqual(stats.timings['download_time'].count, 1)
+    self.assertEqual(stats.timings['parse_time'].count, 1)
+    self.assertEqual(
+        metrics.endpoints['GET example.com/b'].timings['parse_time'].count, 0)
+
+
 def suite():
   return unittest.TestSuite((unittest.makeSuite(ClientLoginTest, 'test'),
                              unittest.makeSuite(AuthSubTest, 'test'),
@@ -377,7 +1280,21 @@ def suite():
                              unittest.makeSuite(RequestTest, 'test'),
                              unittest.makeSuite(VersionConversionTest, 'test'),
                              unittest.makeSuite(QueryTest, 'test'),
-                             unittest.makeSuite(UpdateTest, 'test')))
+                             unittest.makeSuite(UpdateTest, 'test'),
+                             unittest.makeSuite(IterEntriesTest, 'test'),
+                             unittest.makeSuite(IterShardedEntriesTest,
+                                                'test'),
+                             unittest.makeSuite(BatchExecutorTest, 'test'),
+                             unittest.makeSuite(DownloadTest, 'test'),
+                             unittest.makeSuite(PipelinedResumableUploaderTest,
+                                                'test'),
+                             unittest.makeSuite(UploadSchedulerTest, 'test'),
+                             unittest.makeSuite(ResponseCacheTest, 'test'),
+                             unittest.makeSuite(JsoncTest, 'test'),
+                             unittest.makeSuite(RetryPolicyTest, 'test'),
+                             unittest.makeSuite(AsyncGDClientTest, 'test'),
+                             unittest.makeSuite(InstrumentationTest, 'test'),
+                             unittest.makeSuite(LazyFeedTest, 'test')))
 
 
 if __name__ == '__main__':
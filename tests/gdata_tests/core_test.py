@@ -363,9 +363,67 @@ class JsoncObjectTest(unittest.TestCase):
       pass
 
 
+class LazyWrappingTest(unittest.TestCase):
+
+  def test_members_wrapped_on_first_access(self):
+    x = gdata.core.parse_json(VIDEO_EXAMPLE)
+    self.assert_(not isinstance(dict.get(x._dict, 'data'), gdata.core.Jsonc))
+    data = x.data
+    self.assert_(isinstance(data, gdata.core.Jsonc))
+    self.assert_(x.data is data)
+    self.assert_(not isinstance(dict.get(data._dict['items'][0]._dict,
+                                         'thumbnail'), gdata.core.Jsonc))
+    self.assertEqual(data.items[0].thumbnail.hq_default,
+                     'http://i.ytimg.com/vi/hYB0mn5zh2c/hqdefault.jpg')
+    self.assertEqual(data.items[0].tags, ['GDD07', 'GDD07US', 'Maps'])
+    # Changes to wrapped members are kept.
+    data.items[0].view_count = 5
+    self.assertEqual(x.data.items[0].view_count, 5)
+
+  def test_unaccessed_members_converted_to_string(self):
+    x = gdata.core.parse_json(PLAYLIST_EXAMPLE)
+    x.api_version = '2.1'
+    plain = gdata.core._convert_to_object(x)
+    self.assertEqual(plain['apiVersion'], '2.1')
+    self.assertEqual(plain['data']['items'][1]['tags'][0], 'android')
+    self.assertEqual(gdata.core.parse_json(gdata.core.jsonc_to_string(x))
+                     .data.items[1].size, 32)
+
+  def test_name_conversion_is_cached(self):
+    self.assertEqual(gdata.core._to_jsonc_name('spam_and_eggs_cached'),
+                     'spamAndEggsCached')
+    self.assertEqual(gdata.core._jsonc_names['spam_and_eggs_cached'],
+                     'spamAndEggsCached')
+
+  def test_name_cache_is_bounded(self):
+    cached = gdata.core._jsonc_names.copy()
+    try:
+      for i in xrange(gdata.core._MAX_JSONC_NAMES + 10):
+        self.assertEqual(gdata.core._to_jsonc_name('name_%i' % i),
+                         'name%i' % i)
+        self.assert_(len(gdata.core._jsonc_names) <=
+                     gdata.core._MAX_JSONC_NAMES)
+      self.assertEqual(gdata.core._jsonc_names['name_%i' % i], 'name%i' % i)
+    finally:
+      gdata.core._jsonc_names.clear()
+      gdata.core._jsonc_names.update(cached)
+
+  def test_parse_with_object_hook(self):
+    # The fallback for json modules without object_pairs_hook.
+    hook_args = gdata.core._OBJECT_HOOK_ARGS
+    gdata.core._OBJECT_HOOK_ARGS = {'object_hook': gdata.core._JsoncDict}
+    try:
+      x = gdata.core.parse_json(VIDEO_EXAMPLE)
+    finally:
+      gdata.core._OBJECT_HOOK_ARGS = hook_args
+    self.assert_(not isinstance(dict.get(x._dict, 'data'), gdata.core.Jsonc))
+    self.assertEqual(x.data.items[0].thumbnail.hq_default,
+                     'http://i.ytimg.com/vi/hYB0mn5zh2c/hqdefault.jpg')
+
+
 def suite():
   return conf.build_suite([JsoncConversionTest, MemberNameConversionTest,
-                           JsoncObjectTest])
+                           JsoncObjectTest, LazyWrappingTest])
 
 
 if __name__ == '__main__':
@@ -21,7 +21,12 @@
 __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
+import datetime
+import pickle
+import StringIO
 import sys
+import threading
+import time
 import types
 import unittest
 
@@ -490,6 +495,12 @@ class OAuthHmacTokenTests(unittest.TestCase):
 
 class OAuthRsaTokenTests(unittest.TestCase):
 
+  def test_parsed_rsa_key_is_cached(self):
+    key = gdata.gauth.parse_rsa_private_key(PRIVATE_TEST_KEY)
+    self.assert_(gdata.gauth.parse_rsa_private_key(PRIVATE_TEST_KEY) is key)
+    self.assert_(len(gdata.gauth._rsa_key_cache)
+                 <= gdata.gauth.RSA_KEY_CACHE_SIZE)
+
   def test_generate_rsa_signature(self):
     request = atom.http_core.HttpRequest(
         'https://www.google.com/accounts/OAuthGetRequestToken?'
@@ -543,6 +554,124 @@ class OAuth2TokenTests(unittest.TestCase):
     self.assertEqual(request.headers['Authorization'], 'Bearer accessToken')
 
 
+class TokenServer(object):
+  """Answers OAuth 2.0 refresh requests and records API requests.
+
+  API requests made with an access token other than the latest one are
+  answered with a 401.
+  """
+
+  def __init__(self, refresh_delay=0):
+    self.refresh_delay = refresh_delay
+    self.refreshes = 0
+    self.sent_tokens = []
+    self.lock = threading.Lock()
+
+  def request(self, http_request):
+    if str(http_request.uri) == 'https://accounts.google.com/o/oauth2/token':
+      time.sleep(self.refresh_delay)
+      self.lock.acquire()
+      self.refreshes += 1
+      body = '{"access_token": "token%i", "expires_in": 3600}' % (
+          self.refreshes)
+      self.lock.release()
+      return atom.http_core.HttpResponse(200, 'OK',
+                                         body=StringIO.StringIO(body))
+    header = http_request.headers.get('Authorization')
+    self.sent_tokens.append(header)
+    if header != 'Bearer token%i' % self.refreshes:
+      return atom.http_core.HttpResponse(401, 'Unauthorized',
+                                         body=StringIO.StringIO(''))
+    return atom.http_core.HttpResponse(200, 'OK', body=StringIO.StringIO(''))
+
+
+class FakeClient(object):
+
+  def __init__(self, http_client):
+    self.http_client = http_client
+
+
+class OAuth2RefreshTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = TokenServer()
+    self.token = gdata.gauth.OAuth2Token(
+        'clientId', 'clientSecret', 'https://www.google.com/calendar/feeds',
+        'userAgent', access_token='token0', refresh_token='refresh')
+    self.client = self.token.authorize(FakeClient(self.server))
+
+  def send(self):
+    request = atom.http_core.HttpRequest(
+        uri=atom.http_core.Uri.parse_uri('https://www.google.com/feeds'),
+        method='GET')
+    self.token.modify_request(request)
+    return self.client.http_client.request(request)
+
+  def test_refresh_before_expiry(self):
+    self.token.token_expiry = (datetime.datetime.now()
+                               + datetime.timedelta(seconds=30))
+    self.assertEqual(self.send().status, 200)
+    self.assertEqual(self.server.refreshes, 1)
+    self.assertEqual(self.server.sent_tokens, ['Bearer token1'])
+    # The new token is good for an hour, so no more refreshes are needed.
+    self.assertEqual(self.send().status, 200)
+    self.assertEqual(self.server.refreshes, 1)
+
+  def test_refresh_after_401(self):
+    self.server.refreshes = 1
+    self.assertEqual(self.send().status, 200)
+    self.assertEqual(self.server.refreshes, 2)
+    self.assertEqual(self.server.sent_tokens,
+                     ['Bearer token0', 'Bearer token2'])
+
+  def test_token_refreshed_after_request_was_prepared(self):
+    request = atom.http_core.HttpRequest(
+        uri=atom.http_core.Uri.parse_uri('https://www.google.com/feeds'),
+        method='GET')
+    self.token.modify_request(request)
+    # Another thread refreshes the token before the request is sent.
+    self.token._refresh(self.server.request)
+    self.assertEqual(self.client.http_client.request(request).status, 200)
+    self.assertEqual(self.server.refreshes, 1)
+    self.assertEqual(self.server.sent_tokens, ['Bearer token1'])
+
+  def test_request_authorized_by_another_token(self):
+    self.token.access_token = 'tokenA'
+    self.token.token_expiry = datetime.datetime.now()
+    for access_token, status in (('token0', 200), ('stale', 401)):
+      other = gdata.gauth.OAuth2Token(
+          'clientId', 'clientSecret', 'https://www.google.com/calendar/feeds',
+          'userAgent', access_token=access_token, refresh_token='refresh')
+      request = atom.http_core.HttpRequest(
+          uri=atom.http_core.Uri.parse_uri('https://www.google.com/feeds'),
+          method='GET')
+      other.modify_request(request)
+      self.assertEqual(self.client.http_client.request(request).status,
+                       status)
+    self.assertEqual(self.server.sent_tokens, ['Bearer token0', 'Bearer stale'])
+    self.assertEqual(self.server.refreshes, 0)
+    self.assertEqual(self.token.access_token, 'tokenA')
+
+  def test_single_refresh_across_threads(self):
+    self.server.refresh_delay = 0.05
+    self.token.token_expiry = datetime.datetime.now()
+    statuses = []
+    threads = [threading.Thread(target=lambda: statuses.append(
+        self.send().status)) for i in xrange(5)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual(statuses, [200] * 5)
+    self.assertEqual(self.server.refreshes, 1)
+
+  def test_pickle(self):
+    self.token.token_expiry = datetime.datetime.now()
+    self.send()
+    copy = pickle.loads(pickle.dumps(self.token))
+    self.assertEqual(copy.access_token, 'token1')
+
+
 class OAuth2TokenFromCredentialsTest(unittest.TestCase):
   class DummyCredentials(object):
     def __init__(self, *args, **kwargs):
@@ -789,7 +918,8 @@ def suite():
   return conf.build_suite([AuthSubTest, TokensToAndFromBlobsTest,
                            OAuthHmacTokenTests, OAuthRsaTokenTests,
                            OAuthHeaderTest, OAuthGetRequestToken,
-                           OAuthAuthorizeToken, FindScopesForService])
+                           OAuthAuthorizeToken, FindScopesForService,
+                           OAuth2RefreshTest])
 
 
 if __name__ == '__main__':
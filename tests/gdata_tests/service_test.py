@@ -417,6 +417,38 @@ class DeleteWithUrlParamsTest(unittest.TestCase):
         'urlParam2': 'test', 'gsessionid': 'test_session_id'})
       
 
+class GetConversionTest(unittest.TestCase):
+
+  def setUp(self):
+    self.gd_client = gdata.service.GDataService()
+    self.http_client = atom.mock_http_core.SettableHttpClient(
+        200, 'OK', '', {})
+    self.gd_client.http_client.v2_http_client = self.http_client
+
+  def testDispatchesOnRootElement(self):
+    self.http_client.set_response(200, 'OK', test_data.NICK_FEED, {})
+    feed = self.gd_client.Get('http://example.com/feed')
+    self.assert_(isinstance(feed, gdata.GDataFeed))
+    self.assert_(len(feed.entry) > 0)
+    self.http_client.set_response(200, 'OK', test_data.NICK_ENTRY, {})
+    entry = self.gd_client.Get('http://example.com/entry')
+    self.assert_(isinstance(entry, gdata.GDataEntry))
+    self.http_client.set_response(200, 'OK', '<other/>', {})
+    self.assertEqual(self.gd_client.Get('http://example.com/other'),
+                     '<other/>')
+
+  def testTreeConverter(self):
+    self.http_client.set_response(200, 'OK', test_data.NICK_ENTRY, {})
+    entry = self.gd_client.GetEntry('http://example.com/entry')
+    self.assert_(isinstance(entry, atom.Entry))
+    self.http_client.set_response(200, 'OK', test_data.NICK_ENTRY, {})
+    self.assertRaises(gdata.service.UnexpectedReturnType,
+                      self.gd_client.GetFeed, 'http://example.com/entry')
+    converter = gdata.service.TreeConverter(gdata.GDataEntry)
+    self.assertEqual(converter(test_data.NICK_ENTRY).id.text,
+                     entry.id.text)
+
+
 class QueryTest(unittest.TestCase):
 
   def setUp(self):
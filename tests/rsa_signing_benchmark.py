@@ -0,0 +1,68 @@
+#!/usr/bin/python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Compares RSA-SHA1 request signing with and without the parsed key cache.
+
+Requires tlslite. Run from the tests directory with src on the PYTHONPATH:
+
+  PYTHONPATH=../src python rsa_signing_benchmark.py [iterations]
+"""
+
+
+import sys
+import time
+import atom.http_core
+import gdata.gauth
+import gdata.oauth.rsa
+
+
+def sign(rsa_key):
+  request = atom.http_core.HttpRequest(
+      'https://www.google.com/m8/feeds/contacts/default/full', 'GET')
+  return gdata.gauth.generate_rsa_signature(
+      request, 'example.com', rsa_key, '1246491360',
+      'c0155b3f28697c029e7a62efff44bd46', '1.0')
+
+
+def clear_cache():
+  gdata.gauth._rsa_key_cache.clear()
+  del gdata.gauth._rsa_key_cache_order[:]
+
+
+def measure(iterations, cached):
+  rsa_key = gdata.oauth.rsa.TestOAuthSignatureMethod_RSA_SHA1(
+      )._fetch_private_cert(None)
+  clear_cache()
+  start = time.time()
+  for i in xrange(iterations):
+    if not cached:
+      clear_cache()
+    sign(rsa_key)
+  return (time.time() - start) / iterations
+
+
+def main():
+  iterations = 200
+  if len(sys.argv) > 1:
+    iterations = int(sys.argv[1])
+  uncached = measure(iterations, False)
+  cached = measure(iterations, True)
+  print 'parse and sign: %.3f ms per request' % (uncached * 1000)
+  print 'cached key:     %.3f ms per request' % (cached * 1000)
+  print 'speedup:        %.1fx' % (uncached / cached)
+
+
+if __name__ == '__main__':
+  main()